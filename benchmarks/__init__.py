@@ -0,0 +1,12 @@
+"""
+Benchmarks for the shop API. Run from the project root against a real Postgres database, e.g.
+
+    python -m benchmarks.bench_search --rows 1000000
+"""
+import os
+
+
+def setup_django():
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shop.settings')
+    django.setup()
@@ -0,0 +1,464 @@
+"""
+Throughput and latency of the API under a mixed load, driving the WSGI or ASGI
+application in-process (no sockets, no server): `--concurrency` threads calling
+shop.wsgi.application, as many greenlets in a gevent-patched process (`--mode gevent`,
+as served by shop/gevent_wsgi.py), or as many asyncio tasks calling shop.asgi.application.
+
+Scenarios and their default weights (`--mix list=60,detail=25,stock=10,signup=3,login=2`):
+
+    list     GET  /api/products/?page_size=20 (first page, or a later one via its cursor)
+    detail   GET  /api/products/<id>/
+    stock    POST /api/products/reserve/ or release/ (one unit of a random product)
+    signup   POST /api/users/
+    login    POST /api/token/
+
+Reported per scenario: requests/s, p50/p95/p99 latency and queries per request (from
+the Server-Timing header of PerformanceMiddleware, which is sampling every request
+here). Results can be saved as a JSON baseline and later runs compared against it;
+a scenario is flagged when its requests/s falls, or its p95 or queries per request
+rise, by more than `--threshold`, and the exit status is then 1.
+
+Rate limits and load shedding are off unless `--limits` is given: the seeded users and the
+one client address would otherwise be throttled long before the server is saturated.
+
+    python -m benchmarks.bench_api --concurrency 16 --duration 20 --save baseline.json
+    python -m benchmarks.bench_api --concurrency 16 --duration 20 --compare baseline.json
+    python -m benchmarks.bench_api --mode asgi --async-views --concurrency 200
+    python -m benchmarks.bench_api --mode gevent --concurrency 500   # also prints the pool stats
+    python -m benchmarks.bench_api --cleanup
+
+Seeded products use the SKU prefix BENCH-API-, users the username prefix bench_api_.
+Run it against a real Postgres database (see use_threadsafe_engine for the engine).
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import platform
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from benchmarks import setup_django
+
+SKU_PREFIX = 'BENCH-API-'
+USER_PREFIX = 'bench_api_'
+PASSWORD = 'Bench@12345'
+DEFAULT_MIX = 'list=60,detail=25,stock=10,signup=3,login=2'
+HOST = 'testserver'
+QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def seed(products, users, batch_size=10000):
+    from django.contrib.auth.hashers import make_password
+    from shop_app.models import Product, User
+
+    rng = random.Random(42)
+    existing = Product.objects.filter(sku__startswith=SKU_PREFIX).count()
+    for start in range(existing, products, batch_size):
+        Product.objects.bulk_create([
+            Product(
+                name=f"Product {i}",
+                description="Benchmark row " * rng.randint(1, 10),
+                price=f"{rng.randint(1, 999999) / 100:.2f}",
+                stock=1000000,  # reserve/release move it by one unit either way
+                sku=f"{SKU_PREFIX}{i}",
+            )
+            for i in range(start, min(start + batch_size, products))
+        ])
+        print(f"seeded {min(start + batch_size, products)}/{products} products", flush=True)
+
+    existing = User.objects.filter(username__startswith=f'{USER_PREFIX}user_').count()
+    if existing < users:
+        password = make_password(PASSWORD)  # hashed once: one PBKDF2 run per user would take minutes
+        User.objects.bulk_create([
+            User(username=f'{USER_PREFIX}user_{i}', email=f'{USER_PREFIX}user_{i}@example.com', password=password)
+            for i in range(existing, users)
+        ])
+        print(f"seeded {users} users", flush=True)
+    if not User.objects.filter(username=f'{USER_PREFIX}staff').exists():
+        User.objects.create_user(username=f'{USER_PREFIX}staff', email=f'{USER_PREFIX}staff@example.com',
+                                 password=PASSWORD, role='staff')
+
+
+GEVENT_POOL_ENGINES = ('shop_app.dbpool', 'django_db_geventpool.backends.postgresql_psycopg2')
+
+
+def use_threadsafe_engine(settings):
+    """
+    The geventpool engine guards its pool with gevent locks, which deadlock between
+    native threads unless gevent has patched threading. Benchmark threads (and the
+    ASGI handler's per-request threads) then use Django's own PostgreSQL backend.
+    """
+    try:
+        from gevent import monkey
+        patched = monkey.is_module_patched('threading')
+    except ImportError:
+        patched = False
+    databases = {}
+    for alias, database in settings.DATABASES.items():
+        if database['ENGINE'] in GEVENT_POOL_ENGINES and not patched:
+            options = {k: v for k, v in database.get('OPTIONS', {}).items() if k not in ('MAX_CONNS', 'REUSE_CONNS', 'CHECKOUT_TIMEOUT')}
+            database = {**database, 'ENGINE': 'django.db.backends.postgresql', 'OPTIONS': options}
+            print(f"database {alias!r}: geventpool engine without gevent patching, using django.db.backends.postgresql")
+        databases[alias] = database
+    settings.DATABASES = databases
+
+
+def cleanup():
+    from shop_app.models import Product, User
+
+    products, _ = Product.objects.filter(sku__startswith=SKU_PREFIX).delete()
+    users, _ = User.objects.filter(username__startswith=USER_PREFIX).delete()
+    print(f"deleted {products} products and {users} users")
+
+
+class WSGIClient:
+    """Calls the WSGI application directly, one request per call, from any thread."""
+
+    def __init__(self):
+        from shop.wsgi import application
+        self.application = application
+
+    def request(self, method, path, body=None, token=None):
+        path, _, query = path.partition('?')
+        data = json.dumps(body).encode() if body is not None else b''
+        environ = {
+            'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+            'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': HOST,
+            'REMOTE_ADDR': '127.0.0.1', 'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(data)),
+            'HTTP_ACCEPT': 'application/json', 'wsgi.input': io.BytesIO(data), 'wsgi.errors': sys.stderr,
+            'wsgi.url_scheme': 'http', 'wsgi.version': (1, 0), 'wsgi.multithread': True,
+            'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        if token:
+            environ['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = {name.lower(): value for name, value in headers}
+
+        result = self.application(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()  # request_finished: connections go back, as under a real server
+        return response['status'], response['headers'], content
+
+
+class ASGIClient:
+    """Calls the ASGI application directly, one request per call, on the running event loop."""
+
+    def __init__(self):
+        from shop.asgi import application
+        self.application = application
+
+    async def request(self, method, path, body=None, token=None):
+        path, _, query = path.partition('?')
+        data = json.dumps(body).encode() if body is not None else b''
+        headers = [(b'host', HOST.encode()), (b'content-type', b'application/json'),
+                   (b'content-length', str(len(data)).encode()), (b'accept', b'application/json')]
+        if token:
+            headers.append((b'authorization', f'Bearer {token}'.encode()))
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'root_path': '', 'headers': headers, 'client': ('127.0.0.1', 50000), 'server': (HOST, 80),
+        }
+        done = asyncio.Event()
+        received = False
+        response = {'body': []}
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': data, 'more_body': False}
+            await done.wait()  # Django listens for a disconnect while the view runs
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = {name.decode().lower(): value.decode() for name, value in message['headers']}
+            elif message['type'] == 'http.response.body':
+                response['body'].append(message.get('body', b''))
+                if not message.get('more_body', False):
+                    done.set()
+
+        await self.application(scope, receive, send)
+        done.set()
+        return response['status'], response['headers'], b''.join(response['body'])
+
+
+class Scenarios:
+    """Builds each scenario's request. One instance per client, so the random choices do not contend."""
+    expected = {'list': 200, 'detail': 200, 'stock': 200, 'signup': 201, 'login': 200}
+
+    def __init__(self, context, seed):
+        self.context = context
+        self.rng = random.Random(seed)
+
+    def build(self, name):
+        return getattr(self, name)()
+
+    def list(self):
+        # Half the reads start at the first page (cached), the rest follow a later cursor
+        cursors = self.context['cursors']
+        path = self.rng.choice(cursors) if cursors and self.rng.random() < 0.5 else '/api/products/?page_size=20'
+        return 'GET', path, None, self.context['user_token']
+
+    def detail(self):
+        return 'GET', f"/api/products/{self.rng.choice(self.context['product_ids'])}/", None, self.context['user_token']
+
+    def stock(self):
+        action = self.rng.choice(('reserve', 'release'))
+        body = {'items': [{'product': self.rng.choice(self.context['product_ids']), 'quantity': 1}]}
+        return 'POST', f'/api/products/{action}/', body, self.context['staff_token']
+
+    def signup(self):
+        name = f'{USER_PREFIX}signup_{uuid.uuid4().hex[:12]}'
+        return 'POST', '/api/users/', {'username': name, 'email': f'{name}@example.com', 'password': PASSWORD}, None
+
+    def login(self):
+        username = f"{USER_PREFIX}user_{self.rng.randrange(self.context['users'])}"
+        return 'POST', '/api/token/', {'username': username, 'password': PASSWORD}, None
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in Scenarios.expected:
+            raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(Scenarios.expected)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)  # scenario -> [(seconds, queries, ok)]
+        self.recording = False
+
+    def add(self, name, seconds, status, headers):
+        if not self.recording:
+            return
+        match = QUERIES.search(headers.get('server-timing', ''))
+        sample = (seconds, int(match.group(1)) if match else 0, status == Scenarios.expected[name])
+        with self.lock:
+            self.samples[name].append(sample)
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000 if values else 0.0
+
+
+def summarize(samples, duration):
+    latencies = sorted(seconds for seconds, _, _ in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, _, ok in samples if not ok),
+        'rps': len(samples) / duration,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'queries': sum(queries for _, queries, _ in samples) / len(samples) if samples else 0.0,
+    }
+
+
+def run_wsgi(context, mix, concurrency, warmup, duration, recorder):
+    client = WSGIClient()
+    names, weights = list(mix), list(mix.values())
+    stop = threading.Event()
+
+    def worker(number):
+        scenarios = Scenarios(context, number)
+        while not stop.is_set():
+            name = scenarios.rng.choices(names, weights)[0]
+            method, path, body, token = scenarios.build(name)
+            started = time.perf_counter()
+            status, headers, _ = client.request(method, path, body, token)
+            recorder.add(name, time.perf_counter() - started, status, headers)
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    time.sleep(warmup)
+    recorder.recording = True
+    time.sleep(duration)
+    recorder.recording = False
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+
+def run_asgi(context, mix, concurrency, warmup, duration, recorder):
+    client = ASGIClient()
+    names, weights = list(mix), list(mix.values())
+
+    async def worker(number, stop):
+        scenarios = Scenarios(context, number)
+        while not stop.is_set():
+            name = scenarios.rng.choices(names, weights)[0]
+            method, path, body, token = scenarios.build(name)
+            started = time.perf_counter()
+            status, headers, _ = await client.request(method, path, body, token)
+            recorder.add(name, time.perf_counter() - started, status, headers)
+
+    async def main():
+        stop = asyncio.Event()
+        tasks = [asyncio.create_task(worker(number, stop)) for number in range(concurrency)]
+        await asyncio.sleep(warmup)
+        recorder.recording = True
+        await asyncio.sleep(duration)
+        recorder.recording = False
+        stop.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+
+
+def prepare(users):
+    """Tokens, product ids and a few list cursors, fetched through the WSGI app before the run."""
+    from shop_app.models import Product
+
+    client = WSGIClient()
+
+    def token(username):
+        status, _, content = client.request('POST', '/api/token/', {'username': username, 'password': PASSWORD})
+        if status != 200:
+            raise SystemExit(f"Login as {username} failed ({status}): {content[:200]!r}")
+        return json.loads(content)['access']
+
+    context = {
+        'users': users,
+        'user_token': token(f'{USER_PREFIX}user_0'),
+        'staff_token': token(f'{USER_PREFIX}staff'),
+        'product_ids': list(Product.objects.filter(sku__startswith=SKU_PREFIX).values_list('id', flat=True)),
+        'cursors': [],
+    }
+    path = '/api/products/?page_size=20'
+    for _ in range(20):
+        _, _, content = client.request('GET', path, token=context['user_token'])
+        path = json.loads(content).get('next')
+        if not path:
+            break
+        path = path.split(HOST, 1)[-1]
+        context['cursors'].append(path)
+    return context
+
+
+def compare(results, baseline, threshold):
+    """Print the change against `baseline` per scenario; returns the flagged scenarios."""
+    regressions = []
+    print(f"\nvs. {baseline['meta']['saved_at']} ({baseline['meta']['mode']}, concurrency {baseline['meta']['concurrency']}),"
+          f" threshold {threshold:.0%}")
+    print(f"{'scenario':>9}  {'req/s':>15}  {'p95 ms':>15}  {'queries':>13}")
+    for name, current in results['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+        flags = []
+        if current['rps'] < before['rps'] * (1 - threshold):
+            flags.append('req/s')
+        if current['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            flags.append('p95')
+        if current['queries'] > before['queries'] * (1 + threshold) + 0.01:
+            flags.append('queries')
+        if flags:
+            regressions.append(name)
+        print(f"{name:>9}  {before['rps']:>6.1f} -> {current['rps']:>6.1f}  {before['p95_ms']:>6.1f} -> {current['p95_ms']:>6.1f}  "
+              f"{before['queries']:>4.1f} -> {current['queries']:>4.1f}  {'REGRESSED: ' + ', '.join(flags) if flags else 'ok'}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['wsgi', 'gevent', 'asgi'], default='wsgi')
+    parser.add_argument('--async-views', action='store_true', help="Serve with ASYNC_VIEWS = True (ASGI mode).")
+    parser.add_argument('--concurrency', type=int, default=8, help="Threads (WSGI), greenlets (gevent) or tasks (ASGI) sending requests.")
+    parser.add_argument('--duration', type=float, default=20, help="Seconds measured.")
+    parser.add_argument('--warmup', type=float, default=3, help="Seconds run before measuring.")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="Scenario weights, e.g. list=80,detail=20.")
+    parser.add_argument('--products', type=int, default=50000, help="Products seeded.")
+    parser.add_argument('--users', type=int, default=5000, help="Users seeded.")
+    parser.add_argument('--save', help="Write the results to this JSON file (a baseline).")
+    parser.add_argument('--compare', help="Compare with a saved baseline; exit status 1 on a regression.")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Allowed change before flagging (0.10 = 10%%).")
+    parser.add_argument('--log', action='store_true', help="Keep the application's INFO logging (off by default).")
+    parser.add_argument('--limits', action='store_true', help="Keep RATE_LIMITS and LOAD_SHEDDING on (off by default).")
+    parser.add_argument('--cleanup', action='store_true', help="Delete the seeded products and users and exit.")
+    args = parser.parse_args()
+
+    if args.mode == 'gevent':
+        from shop.gevent_patch import patch
+        patch()  # before Django is imported; the worker threads below become greenlets
+    from django.conf import settings
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shop.settings')
+    # Measure what production runs: no DEBUG query log, every request timed
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = [HOST]
+    settings.ASYNC_VIEWS = args.async_views
+    settings.PERFORMANCE = {**settings.PERFORMANCE, 'SAMPLE_RATE': 1.0, 'SERVER_TIMING': True}
+    settings.RATE_LIMITS = {**settings.RATE_LIMITS, 'ENABLED': args.limits}
+    settings.LOAD_SHEDDING = {**settings.LOAD_SHEDDING, 'ENABLED': args.limits}
+    use_threadsafe_engine(settings)
+    setup_django()
+
+    if args.cleanup:
+        cleanup()
+        return
+    mix = parse_mix(args.mix)
+    if not args.log:
+        logging.disable(logging.INFO)  # one line per request would be measuring the terminal
+    seed(args.products, args.users)
+    context = prepare(args.users)
+
+    print(f"{args.mode}{' + async views' if args.async_views else ''}, concurrency {args.concurrency}, "
+          f"{args.duration:.0f}s (+{args.warmup:.0f}s warmup), {len(context['product_ids'])} products, {args.users} users")
+    recorder = Recorder()
+    run = run_asgi if args.mode == 'asgi' else run_wsgi  # gevent: the threads of run_wsgi are greenlets
+    run(context, mix, args.concurrency, args.warmup, args.duration, recorder)
+
+    results = {
+        'meta': {
+            'saved_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'mode': args.mode, 'async_views': args.async_views,
+            'concurrency': args.concurrency, 'duration': args.duration, 'mix': mix,
+            'products': len(context['product_ids']), 'users': args.users, 'python': platform.python_version(),
+        },
+        'scenarios': {name: summarize(recorder.samples[name], args.duration) for name in mix},
+        'total': summarize([sample for samples in recorder.samples.values() for sample in samples], args.duration),
+    }
+    print(f"{'scenario':>9}  {'requests':>8}  {'errors':>6}  {'req/s':>7}  {'p50 ms':>7}  {'p95 ms':>7}  {'p99 ms':>7}  queries/req")
+    for name, stats in [*results['scenarios'].items(), ('total', results['total'])]:
+        print(f"{name:>9}  {stats['requests']:>8}  {stats['errors']:>6}  {stats['rps']:>7.1f}  {stats['p50_ms']:>7.1f}  "
+              f"{stats['p95_ms']:>7.1f}  {stats['p99_ms']:>7.1f}  {stats['queries']:>11.1f}")
+    if args.mode == 'gevent':
+        from shop_app.dbpool.base import pool_stats
+        for alias, stats in pool_stats().items():
+            wait = stats['wait']
+            print(f"pool {alias!r}: {stats['open']}/{stats['max']} open, {stats['checkouts']} checkouts, {stats['waited']} waited "
+                  f"(p95 {wait['p95'] * 1000:.1f} ms, max {wait['max'] * 1000:.1f} ms), {stats['timeouts']} timeouts")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"saved {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Per-request cost of logging on the request thread: the same requests (product list and
+detail, through the in-process WSGI app of bench_api) with
+
+    off        logging disabled (the floor)
+    sync       the old setup: basicConfig-style FileHandler + StreamHandler on the request thread
+    pipeline   shop_app/logs.py: JSON lines via the queue listener, every record kept
+    sampled    pipeline with the REQUEST_LOGGING sampling and rate limits from settings
+
+Console output goes to a file in the temporary directory in every mode, as it would to a
+pipe under a process manager. Overhead is reported against `off`.
+
+    python -m benchmarks.bench_logging --requests 3000
+    python -m benchmarks.bench_api --cleanup
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.bench_api import HOST, WSGIClient, prepare, seed, use_threadsafe_engine
+
+MODES = ('off', 'sync', 'pipeline', 'sampled')
+
+
+def configure(mode, directory, settings, request_logging):
+    from shop_app.logs import CompressedRotatingFileHandler, JSONFormatter, log_pipeline
+
+    log_pipeline.stop()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    logging.disable(logging.NOTSET)
+    settings.REQUEST_LOGGING = request_logging
+    if mode == 'off':
+        logging.disable(logging.CRITICAL)
+        return
+
+    console = logging.StreamHandler(open(f'{directory}/console-{mode}.log', 'a'))
+    console.setFormatter(logging.Formatter('[%(levelname)s] %(message)s'))
+    if mode == 'sync':
+        settings.REQUEST_LOGGING = {**request_logging, 'ACCESS_LOG': False}
+        file = logging.FileHandler(f'{directory}/worker-{mode}.log')
+        file.setFormatter(logging.Formatter('[%(levelname)s] %(message)s'))
+        root.addHandler(file)
+        root.addHandler(console)
+        return
+
+    if mode == 'pipeline':
+        settings.REQUEST_LOGGING = {**request_logging, 'SAMPLE_RATES': {}, 'RATE_LIMITS': {}}
+    file = CompressedRotatingFileHandler(f'{directory}/shop-{mode}.log', maxBytes=50 * 1024 * 1024)
+    file.setFormatter(JSONFormatter())
+    root.addHandler(file)
+    root.addHandler(console)
+    log_pipeline.install()
+
+
+def run(client, context, requests, rng):
+    started = time.perf_counter()
+    for _ in range(requests):
+        if rng.random() < 0.5:
+            path = '/api/products/?page_size=20'
+        else:
+            path = f"/api/products/{rng.choice(context['product_ids'][:200])}/"
+        status, _, _ = client.request('GET', path, token=context['user_token'])
+        assert status == 200, status
+    return (time.perf_counter() - started) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=3000, help="Requests per mode and round.")
+    parser.add_argument('--rounds', type=int, default=3, help="Rounds (modes interleaved); the fastest is reported.")
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shop.settings')
+    from django.conf import settings
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = [HOST]
+    settings.PERFORMANCE = {**settings.PERFORMANCE, 'SAMPLE_RATE': 0.0}
+    use_threadsafe_engine(settings)
+    from benchmarks import setup_django
+    setup_django()
+
+    request_logging = dict(settings.REQUEST_LOGGING)
+    seed(2000, 1)
+    context = prepare(1)
+    client = WSGIClient()
+    best = {mode: float('inf') for mode in MODES}
+    with tempfile.TemporaryDirectory() as directory:
+        for _ in range(args.rounds):
+            for mode in MODES:
+                configure(mode, directory, settings, request_logging)
+                run(client, context, 200, random.Random(0))  # warm the caches
+                best[mode] = min(best[mode], run(client, context, args.requests, random.Random(1)))
+        configure('off', directory, settings, request_logging)
+
+    print(f"{args.requests} requests x {args.rounds} rounds (product list/detail, in-process WSGI)")
+    print(f"{'mode':>9}  {'us/request':>10}  {'logging us/request':>18}")
+    for mode in MODES:
+        print(f"{mode:>9}  {best[mode] * 1e6:>10.0f}  {(best[mode] - best['off']) * 1e6:>18.0f}")
+
+
+if __name__ == '__main__':
+    main()
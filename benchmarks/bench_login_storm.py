@@ -0,0 +1,163 @@
+"""
+Catalog read latency during a login storm, with password hashing inline in the request
+threads vs. on the bounded pool (PASSWORD_HASHING, shop_app/hashing.py).
+
+For every executor a `runserver` process is started with that setting; catalog clients
+page through /api/products/ while login clients hammer /api/token/, first without and
+then with the logins running.
+
+    python -m benchmarks.bench_login_storm --logins 32 --catalog 4 --duration 10
+    python -m benchmarks.bench_login_storm --cleanup
+
+The benchmark user is `bench_login_storm`; seeded products use the SKU prefix BENCH-LOGIN-.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+from benchmarks import setup_django
+
+USERNAME = 'bench_login_storm'
+PASSWORD = 'Bench@12345'
+SKU_PREFIX = 'BENCH-LOGIN-'
+
+SERVER = """
+import os
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shop.settings')
+from django.conf import settings
+settings.PASSWORD_HASHING = {executor!r}
+from benchmarks import setup_django
+setup_django()
+from django.core.management import call_command
+call_command('runserver', {addr!r}, use_reloader=False)
+"""
+
+
+def seed():
+    from shop_app.models import Product, User
+
+    if not User.objects.filter(username=USERNAME).exists():
+        User.objects.create_user(username=USERNAME, password=PASSWORD, email=f'{USERNAME}@example.com')
+    if not Product.objects.filter(sku__startswith=SKU_PREFIX).exists():
+        Product.objects.bulk_create([
+            Product(name=f"Product {i}", description="Benchmark row", price='9.99', stock=10, sku=f'{SKU_PREFIX}{i}')
+            for i in range(500)
+        ])
+
+
+def request(url, data=None, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    req = urllib.request.Request(url, data=json.dumps(data).encode() if data else None, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def start_server(addr, settings_value):
+    server = subprocess.Popen([sys.executable, '-c', SERVER.format(executor=settings_value, addr=addr)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(300):
+        if server.poll() is not None:
+            raise SystemExit(f"runserver exited (is {addr} in use?)")
+        try:
+            request(f'http://{addr}/api/products/')
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise SystemExit("runserver did not start")
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000 if values else 0.0
+
+
+def run_phase(base, token, catalog_clients, login_clients, duration):
+    stop = threading.Event()
+    latencies, logins = [], Counter()
+
+    def catalog():
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                request(f'{base}/api/products/?page_size=20', token=token)
+            except OSError:  # timed out: counted with the time it took
+                pass
+            latencies.append(time.perf_counter() - started)
+
+    def login():
+        while not stop.is_set():
+            try:
+                status, _ = request(f'{base}/api/token/', {'username': USERNAME, 'password': PASSWORD})
+            except OSError:
+                status = 'timeout'
+            logins[status] += 1
+            if status == 503:
+                stop.wait(1)  # Retry-After
+
+    threads = [threading.Thread(target=catalog) for _ in range(catalog_clients)]
+    threads += [threading.Thread(target=login) for _ in range(login_clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, logins
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=32, help="Concurrent login clients.")
+    parser.add_argument('--catalog', type=int, default=4, help="Concurrent catalog clients.")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds per phase.")
+    parser.add_argument('--workers', type=int, default=1, help="PASSWORD_HASHING['WORKERS'] for the pooled runs.")
+    parser.add_argument('--executors', nargs='+', default=['inline', 'process'], choices=['inline', 'thread', 'process'])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--cleanup', action='store_true', help="Delete the benchmark user and products and exit.")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from shop_app.models import Product, User
+
+    if args.cleanup:
+        deleted, _ = Product.objects.filter(sku__startswith=SKU_PREFIX).delete()
+        User.objects.filter(username=USERNAME).delete()
+        print(f"deleted {deleted} products")
+        return
+    seed()
+
+    addr = f'127.0.0.1:{args.port}'
+    base = f'http://{addr}'
+    print(f"{args.catalog} catalog clients, {args.logins} login clients, {args.duration:.0f}s per phase")
+    print(f"{'executor':>8}  {'phase':>6}  {'catalog req/s':>13}  {'p50 ms':>7}  {'p95 ms':>7}  {'p99 ms':>7}  logins/s (200 / 503 / timeout)")
+    for executor in args.executors:
+        hashing = {**settings.PASSWORD_HASHING, 'EXECUTOR': executor, 'WORKERS': args.workers}
+        server = start_server(addr, hashing)
+        try:
+            _, body = request(f'{base}/api/token/', {'username': USERNAME, 'password': PASSWORD})
+            token = json.loads(body)['access']
+            for phase, login_clients in (('quiet', 0), ('storm', args.logins)):
+                latencies, logins = run_phase(base, token, args.catalog, login_clients, args.duration)
+                print(f"{executor:>8}  {phase:>6}  {len(latencies) / args.duration:>13.1f}  {percentile(latencies, 0.50):>7.1f}  "
+                      f"{percentile(latencies, 0.95):>7.1f}  {percentile(latencies, 0.99):>7.1f}  "
+                      f"{logins[200] / args.duration:.1f} ({logins[200]} / {logins[503]} / {logins['timeout']})")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
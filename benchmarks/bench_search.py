@@ -0,0 +1,107 @@
+"""
+Compare `?q=` catalog search (tsvector + GIN, pg_trgm) with the `icontains` scan it replaces.
+
+    python -m benchmarks.bench_search --rows 1000000 --queries 200
+    python -m benchmarks.bench_search --cleanup
+
+Seeded products use the SKU prefix BENCH-SEARCH- and are reused between runs.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks import setup_django
+
+WORDS = (
+    "washing machine refrigerator television laptop phone charger cable speaker headphones camera "
+    "lens tripod kettle toaster blender mixer vacuum cleaner fan heater lamp bulb router keyboard mouse "
+    "monitor printer scanner tablet watch battery drill hammer wrench saw ladder paint brush"
+).split()
+# Brand/model-like vocabulary so terms are about as selective as in a real catalog
+SYLLABLES = "ka lo mi ne ru sa to vi ze bo da fe gu hi jo".split()
+VOCABULARY = list(WORDS) + [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+SKU_PREFIX = 'BENCH-SEARCH-'
+
+
+def seed(rows, batch_size=10000):
+    from shop_app.models import Product
+
+    existing = Product.objects.filter(sku__startswith=SKU_PREFIX).count()
+    rng = random.Random(42)
+    for start in range(existing, rows, batch_size):
+        Product.objects.bulk_create([
+            Product(
+                name=' '.join(rng.sample(WORDS, 2) + rng.sample(VOCABULARY, 1)).title(),
+                description=' '.join(rng.choices(VOCABULARY, k=20)),
+                price=rng.randint(1, 99999),
+                stock=rng.randint(0, 500),
+                sku=f"{SKU_PREFIX}{i}",
+            )
+            for i in range(start, min(start + batch_size, rows))
+        ])
+        print(f"seeded {min(start + batch_size, rows)}/{rows}", flush=True)
+
+
+def timed_ms(fn, queries):
+    samples = []
+    for terms in queries:
+        started = time.perf_counter()
+        fn(terms)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {'p50': statistics.median(samples), 'p95': samples[int(len(samples) * 0.95) - 1], 'max': samples[-1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--cleanup', action='store_true', help="Delete the seeded products and exit.")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.db.models import Q
+    from django.test import RequestFactory
+    from rest_framework.request import Request
+    from shop_app.models import Product
+    from shop_app.search import CatalogSearchFilter, trigram_available
+    from shop_app.views import ProductViewSet
+
+    if args.cleanup:
+        deleted, _ = Product.objects.filter(sku__startswith=SKU_PREFIX).delete()
+        print(f"deleted {deleted} rows")
+        return
+
+    seed(args.rows)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE shop_app_product")
+
+    rng = random.Random(7)
+    queries = [' '.join(rng.sample(VOCABULARY, rng.choice((1, 2)))) for _ in range(args.queries)]
+    search_filter = CatalogSearchFilter()
+    view = ProductViewSet()
+
+    def full_text(terms):
+        request = Request(RequestFactory().get('/api/products/', {'q': terms}))
+        queryset = search_filter.filter_queryset(request, Product.objects.all(), view)
+        list(queryset.order_by('-search_rank', '-id')[:args.page_size])
+
+    def icontains(terms):
+        condition = Q()
+        for word in terms.split():
+            condition &= Q(name__icontains=word) | Q(description__icontains=word)
+        list(Product.objects.filter(condition).order_by('id')[:args.page_size])
+
+    print(f"rows={Product.objects.count()} queries={args.queries} page_size={args.page_size} "
+          f"pg_trgm={'yes' if trigram_available('default') else 'no'}")
+    for name, fn in (('full-text ?q=', full_text), ('icontains scan', icontains)):
+        fn(queries[0])  # warm up
+        result = timed_ms(fn, queries)
+        print(f"{name:16s} p50={result['p50']:8.2f} ms  p95={result['p95']:8.2f} ms  max={result['max']:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Rows/sec of the list read path: ProductSerializer + JSONRenderer (model instances,
+field-by-field to_representation) vs. the fast path (.values() rows, precompiled
+converter, orjson renderer; shop_app/fastread.py).
+
+    python -m benchmarks.bench_serialization --sizes 1000 10000 100000
+    python -m benchmarks.bench_serialization --cleanup
+
+Seeded products use the SKU prefix BENCH-SERIAL- and are reused between runs.
+"""
+import argparse
+import random
+import time
+
+from benchmarks import setup_django
+
+SKU_PREFIX = 'BENCH-SERIAL-'
+
+
+def seed(rows, batch_size=10000):
+    from shop_app.models import Product
+
+    existing = Product.objects.filter(sku__startswith=SKU_PREFIX).count()
+    rng = random.Random(42)
+    for start in range(existing, rows, batch_size):
+        Product.objects.bulk_create([
+            Product(
+                name=f"Product {i}",
+                description="Benchmark row " * rng.randint(1, 10),
+                price=f"{rng.randint(1, 999999) / 100:.2f}",
+                stock=rng.randint(0, 500),
+                sku=f"{SKU_PREFIX}{i}",
+            )
+            for i in range(start, min(start + batch_size, rows))
+        ])
+        print(f"seeded {min(start + batch_size, rows)}/{rows}", flush=True)
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per size; the fastest is reported.")
+    parser.add_argument('--cleanup', action='store_true', help="Delete the seeded products and exit.")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from rest_framework.renderers import JSONRenderer
+    from shop_app.fastread import get_row_converter
+    from shop_app.models import Product
+    from shop_app.renderers import FastJSONRenderer, orjson
+    from shop_app.serializers import ProductSerializer
+
+    if args.cleanup:
+        deleted, _ = Product.objects.filter(sku__startswith=SKU_PREFIX).delete()
+        print(f"deleted {deleted} rows")
+        return
+
+    seed(max(args.sizes))
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE shop_app_product")
+    queryset = Product.objects.filter(sku__startswith=SKU_PREFIX).order_by('id')
+    convert = get_row_converter(ProductSerializer)
+
+    def serializer_path(size):
+        return JSONRenderer().render(ProductSerializer(queryset[:size], many=True).data)
+
+    def fast_path(size):
+        return FastJSONRenderer().render([convert(row) for row in queryset.values(*convert.fields)[:size]])
+
+    print(f"orjson={'yes' if orjson else 'no (falls back to JSONRenderer)'} repeat={args.repeat}")
+    print(f"{'rows':>8}  {'serializer rows/s':>18}  {'fast path rows/s':>17}  speedup  same JSON")
+    for size in args.sizes:
+        slow, slow_body = best_of(lambda: serializer_path(size), args.repeat)
+        fast, fast_body = best_of(lambda: fast_path(size), args.repeat)
+        print(f"{size:>8}  {size / slow:>18,.0f}  {size / fast:>17,.0f}  {slow / fast:>6.1f}x  {slow_body == fast_body}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+"""
+gunicorn with gevent workers, for more than one serving process per host:
+
+    pip install gunicorn
+    gunicorn -c gunicorn.conf.py shop.gevent_wsgi:application
+
+Every worker process has its own database pool (DATABASES OPTIONS MAX_CONNS), so keep
+workers * MAX_CONNS below PostgreSQL's max_connections.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gevent'
+worker_connections = 5000   # concurrent clients per worker (GEVENT_SERVER['MAX_CONNECTIONS'] for the single-process server)
+keepalive = 75              # seconds an idle keep-alive connection is kept; above the load balancer's idle timeout
+timeout = 30                # seconds without a heartbeat before a worker is restarted
+graceful_timeout = 10       # seconds in-flight requests get on SIGTERM (GEVENT_SERVER['SHUTDOWN_TIMEOUT'])
+accesslog = None            # RequestLogMiddleware writes the access records
@@ -4,9 +4,19 @@ import os
 import sys
 
 
+def gevent_requested(argv):
+    """`runworkers --engine gevent` needs gevent's patching before Django is imported."""
+    return len(argv) > 1 and argv[1] == 'runworkers' and (
+        '--engine=gevent' in argv or any(a == '--engine' and b == 'gevent' for a, b in zip(argv, argv[1:]))
+    )
+
+
 def main():
     """Run administrative tasks."""
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shop.settings')
+    if gevent_requested(sys.argv):
+        from shop.gevent_patch import patch
+        patch()
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
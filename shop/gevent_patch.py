@@ -0,0 +1,39 @@
+"""
+gevent monkey-patching for the gevent entry points (shop/gevent_wsgi.py and
+`manage.py runworkers --engine gevent`).
+
+patch() must run before Django, or anything else that imports socket, threading, ssl or
+select, is loaded: modules that already hold references to the blocking versions stay
+blocking. It also installs a psycopg2 wait callback so queries yield to other greenlets
+while waiting on PostgreSQL. In that mode psycopg2 cannot run COPY, so the catalog
+import commands run unpatched.
+"""
+import psycopg2
+import psycopg2.extensions
+from gevent import monkey
+from gevent.socket import wait_read, wait_write
+
+
+def patch():
+    if is_patched():
+        return
+    monkey.patch_all()
+    psycopg2.extensions.set_wait_callback(gevent_wait_callback)
+
+
+def is_patched():
+    return monkey.is_module_patched('threading') and psycopg2.extensions.get_wait_callback() is gevent_wait_callback
+
+
+def gevent_wait_callback(conn, timeout=None):
+    """psycopg2 wait callback: wait for the connection's socket through the gevent hub."""
+    while True:
+        state = conn.poll()
+        if state == psycopg2.extensions.POLL_OK:
+            return
+        elif state == psycopg2.extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == psycopg2.extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
@@ -0,0 +1,58 @@
+"""
+gevent entry point: one process serves thousands of concurrent keep-alive clients, each
+on its own greenlet, while database work is bounded by the connection pool
+(DATABASES OPTIONS MAX_CONNS / CHECKOUT_TIMEOUT; statistics at /api/metrics/requests/).
+
+    python -m shop.gevent_wsgi                      # gevent's WSGI server, GEVENT_SERVER settings
+    python -m shop.gevent_wsgi --bind 0.0.0.0:8000
+    gunicorn -c gunicorn.conf.py shop.gevent_wsgi:application   # several processes
+
+Patching happens on import, before Django is loaded.
+"""
+from shop.gevent_patch import patch
+
+patch()
+
+import argparse  # noqa: E402
+import logging  # noqa: E402
+import os  # noqa: E402
+import signal  # noqa: E402
+
+import gevent  # noqa: E402
+from django.core.wsgi import get_wsgi_application  # noqa: E402
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shop.settings')
+
+application = get_wsgi_application()
+
+logger = logging.getLogger('shop.gevent')
+
+
+def main():
+    from django.conf import settings
+    from gevent.pool import Pool
+    from gevent.pywsgi import WSGIServer
+
+    config = getattr(settings, 'GEVENT_SERVER', {})
+    parser = argparse.ArgumentParser(description="Serve the shop API with gevent.")
+    parser.add_argument('--bind', default=config.get('BIND', '127.0.0.1:8000'), help="HOST:PORT to listen on.")
+    parser.add_argument('--max-connections', type=int, default=config.get('MAX_CONNECTIONS', 5000),
+                        help="Concurrent client connections (greenlets) before new ones wait in the backlog.")
+    args = parser.parse_args()
+
+    host, _, port = args.bind.rpartition(':')
+    # Access records come from RequestLogMiddleware; the server only logs its own errors
+    server = WSGIServer((host, int(port)), application, spawn=Pool(args.max_connections), log=None, error_log=logger)
+
+    def stop():
+        logger.info("Stopping, in-flight requests get %ss", config.get('SHUTDOWN_TIMEOUT', 10))
+        server.stop(timeout=config.get('SHUTDOWN_TIMEOUT', 10))
+
+    gevent.signal_handler(signal.SIGTERM, stop)
+    gevent.signal_handler(signal.SIGINT, stop)
+    logger.info("Serving on http://%s (gevent, %s connections)", args.bind, args.max_connections)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -38,12 +38,16 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'shop_app',
     'drf_yasg',
     'rest_framework_simplejwt.token_blacklist',
 ]
 
 MIDDLEWARE = [
+    'shop_app.perf.PerformanceMiddleware',   # first, so its total covers the whole stack
+    'shop_app.logs.RequestLogMiddleware',    # request ids and the access log
+    'shop_app.throttling.LoadMonitorMiddleware',  # response times for load shedding, RateLimit-* headers
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,6 +76,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'shop.wsgi.application'
 
+# Under ASGI (shop/asgi.py), serve list/retrieve/create/update of books, products and
+# users from the native async views in shop_app/async_views.py (same URLs and responses)
+ASYNC_VIEWS = False
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -79,7 +87,8 @@ WSGI_APPLICATION = 'shop.wsgi.application'
 DATABASES = {
     'default': {
         #'ENGINE': 'django.db.backends.postgresql',
-        'ENGINE' : 'django_db_geventpool.backends.postgresql_psycopg2',
+        # django_db_geventpool's pool plus checkout timeouts and pool statistics (shop_app/dbpool)
+        'ENGINE' : 'shop_app.dbpool',
         'NAME': 'shopdb',
         'USER': 'username',
         'PASSWORD': 'password',
@@ -89,19 +98,238 @@ DATABASES = {
         'OPTIONS': {
             'MAX_CONNS': 20,        # Max concurrent connections
             'REUSE_CONNS': 10,      # Number of persistent connections to reuse
+            'CHECKOUT_TIMEOUT': 5,  # seconds a request waits for a free connection, then 503
+        }
+    },
+    # Read replicas: same schema, listed in DATABASE_REPLICAS['ALIASES'] below
+    # 'replica1': {
+    #     'ENGINE': 'django.db.backends.postgresql',
+    #     'NAME': 'shopdb',
+    #     'USER': 'username',
+    #     'PASSWORD': 'password',
+    #     'HOST': 'replica1.local',
+    #     'PORT': '5432',
+    #     'TEST': {'MIRROR': 'default'},
+    # },
+}
+
+# gevent serving: `python -m shop.gevent_wsgi` (or gunicorn -c gunicorn.conf.py with gevent
+# workers). One process holds thousands of keep-alive clients, each on a greenlet; the
+# pool above bounds how many of them use the database at once.
+GEVENT_SERVER = {
+    'BIND': '127.0.0.1:8000',
+    'MAX_CONNECTIONS': 5000,      # concurrent client connections per process
+    'SHUTDOWN_TIMEOUT': 10,       # seconds in-flight requests get on SIGTERM
+}
+
+# Safe requests on the book, product and user endpoints read from a replica, writes go
+# to the primary (shop_app/replicas.py). No aliases: everything runs on 'default'.
+DATABASE_ROUTERS = ['shop_app.replicas.ReplicaRouter']
+DATABASE_REPLICAS = {
+    'ALIASES': [],                # e.g. ['replica1'], each also defined in DATABASES
+    'STRATEGY': 'round_robin',    # or 'least_lag'
+    'MAX_LAG': 5,                 # seconds behind the primary before a replica is skipped
+    'CHECK_INTERVAL': 5,          # seconds between health/lag probes, per process
+    'STICKY_SECONDS': 5,          # after a user's write, their reads use the primary this long
+}
+
+
+# Cache
+# Local memory by default; point 'default' at a shared backend (e.g.
+# django.core.cache.backends.redis.RedisCache) to share entries between processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shop-catalog',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,   # LRU bound, least recently used entries are culled first
         }
     }
 }
 
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TIMEOUT = 300   # seconds a serialized product/book payload is kept
+
 
 REST_FRAMEWORK = {
     'EXCEPTION_HANDLER': 'shop_app.exceptions.custom_exception_handler',
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'shop_app.auth.ClaimsJWTAuthentication',   # JWT without a User query per request
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',  # Secure all by default
-    ]
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'shop_app.throttling.LoadSheddingThrottle',  # first: a shed request takes no rate-limit token
+        'shop_app.throttling.RoleRateThrottle',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'shop_app.pagination.ShopCursorPagination',
+    'PAGE_SIZE': 50,
+    # Proxies in front of the app: the client address for rate limits is the one this many
+    # hops from the right of X-Forwarded-For. 0 = REMOTE_ADDR; never leave it unset (None),
+    # which trusts whatever X-Forwarded-For the client sends.
+    'NUM_PROXIES': 0,
+}
+
+# Hard cap for the `?page_size=` query parameter on list endpoints
+PAGINATION_MAX_PAGE_SIZE = 500
+
+# `?q=` search ranks at most this many matches (the newest); broader queries are cut off
+# there instead of ranking the whole catalog on every page
+SEARCH_MAX_CANDIDATES = 1000
+
+# Bulk endpoints (/api/products/bulk/, /api/books/bulk/)
+BULK_BATCH_SIZE = 500     # rows per INSERT/UPDATE statement
+BULK_MAX_ROWS = 5000      # rows accepted in one request
+
+# Streaming exports (/api/products/export/, /api/books/export/)
+EXPORT_CHUNK_SIZE = 2000            # rows fetched per round trip
+EXPORT_SERVER_SIDE_CURSORS = True   # False: keyset batches on id (e.g. PgBouncer in transaction mode)
+EXPORT_GZIP_LEVEL = 6               # used when the client sends Accept-Encoding: gzip
+
+# Rate limits (shop_app/throttling.py): a token bucket per client (user, or IP address when
+# anonymous) and route (URL name). Budgets are (requests per second, burst) by role, from
+# ROUTES, else DEFAULT; a role missing from both is not limited.
+RATE_LIMITS = {
+    'ENABLED': True,
+    'STORE': 'memory',         # 'memory': per process, no I/O; 'cache': shared through CACHE_ALIAS (e.g. Redis)
+    'CACHE_ALIAS': 'default',
+    'MAX_CLIENTS': 100000,     # memory store: buckets kept, least recently used dropped first
+    'DEFAULT': {'staff': (50, 100), 'user': (20, 40), 'anonymous': (10, 20)},
+    'ROUTES': {
+        'product-list': {'user': (10, 20), 'anonymous': (5, 10)},
+        'book-list': {'user': (10, 20), 'anonymous': (5, 10)},
+        'user-list': {'anonymous': (2, 20)},           # sign-up: a password hash each
+        'token_obtain_pair': {'anonymous': (2, 20)},   # a password check each
+        'token_refresh': {'anonymous': (2, 20)},
+    },
+}
+
+# Load shedding (shop_app/throttling.py): while any threshold is crossed, requests of ROLES
+# get a 503 with Retry-After; admin and staff keep being served.
+LOAD_SHEDDING = {
+    'ENABLED': True,
+    'ROLES': ('anonymous', 'user'),
+    'QUEUE_TIME': 1.0,    # seconds the request waited before Django (X-Request-Start from the proxy)
+    'LATENCY': 2.0,       # seconds, recent average response time
+    'POOL_WAIT': 0.5,     # seconds, recent average database pool checkout wait
+    'SMOOTHING': 0.1,     # weight of each response in the average
+    'DECAY': 5,           # seconds; the average decays while no responses are measured
+    'RETRY_AFTER': 2,     # seconds
+}
+
+# Idempotency-Key on POST /api/products/, /api/books/, /api/users/ (shop_app/idempotency.py)
+IDEMPOTENCY = {
+    'TTL': 24 * 3600,       # seconds a stored response is replayed
+    'LOCK_TIMEOUT': 10,     # seconds a duplicate waits for the request in flight before a 409
+    'PURGE_INTERVAL': 60,   # seconds between deletes of expired keys, per process
+    'PURGE_BATCH': 5000,    # expired keys deleted per run
+}
+
+# manage.py import_products / import_books
+IMPORT_BATCH_SIZE = 20000           # rows per COPY + upsert transaction
+
+# Background task queue (shop_app/task.py)
+# Workers run in their own process (`python manage.py runworkers`); web processes only
+# enqueue, so the shared 'shop_app.task.DatabaseQueueBackend' is the default.
+# 'shop_app.task.MemoryQueueBackend' keeps tasks in a process-local queue.Queue.
+TASK_QUEUE = {
+    'BACKEND': 'shop_app.task.DatabaseQueueBackend',
+    'QUEUE': 'default',
+    'WORKERS': 3,               # threads per queue when `runworkers` is given no --threads/--queue
+    'ASYNC_CONCURRENCY': 1000,  # concurrent tasks per queue for `runworkers --engine asyncio` / `--engine gevent`
+    'ASYNC_SYNC_THREADS': 10,   # thread pool for plain (non-async) task functions in the asyncio engine
+    'TASK_TIMEOUT': 300,        # seconds, asyncio and gevent engines only
+    'SHUTDOWN_GRACE': 5,        # seconds running asyncio/gevent tasks get before they are cancelled
+    'BATCH_SIZE': 1,            # tasks leased per dequeue
+    'POLL_INTERVAL': 1,         # seconds to wait when the queue is empty
+    'VISIBILITY_TIMEOUT': 60,   # seconds before the task of a dead worker is handed to another (renewed while it runs)
+    'MAX_ATTEMPTS': 5,          # then the task is moved to DEAD
+    'RETRY_BACKOFF': 2,         # seconds, doubled on every attempt
+    'RETRY_BACKOFF_MAX': 300,
+    'DONE_RETENTION': 3600,     # seconds finished tasks are kept before they are deleted
+    'PURGE_INTERVAL': 60,       # seconds between deletes of finished tasks, per process
+    'PURGE_BATCH': 5000,        # finished tasks deleted per purge
+}
+
+# Task queue metrics (shop_app/task_metrics.py), served at /api/metrics/tasks/
+TASK_METRICS = {
+    'WINDOW': 300,              # seconds covered by the wait/run percentiles and throughput
+    'MAX_SAMPLES': 10000,       # per task type and window
+    'PUBLISH_INTERVAL': 10,     # seconds between worker snapshots written to the database
+}
+
+# Per-request instrumentation (shop_app/perf.py), queried at /api/metrics/requests/
+PERFORMANCE = {
+    'SAMPLE_RATE': 1.0,         # fraction of requests measured; lower it in production (e.g. 0.05)
+    'SERVER_TIMING': True,      # add a Server-Timing header to sampled responses
+    'BUFFER_SIZE': 1000,        # recent samples kept per route
+}
+
+# Logging (shop_app/logs.py): the root logger's handlers run on a queue listener thread,
+# so requests never wait on disk. JSON lines with request ids go to logs/shop.<pid>.log (one
+# file per process: web workers and `runworkers --processes` children each rotate their
+# own), rotated daily or at 50 MB and gzipped; the console keeps the short format.
+LOGGING_CONFIG = 'shop_app.logs.configure_logging'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'shop_app.logs.JSONFormatter'},
+        'console': {'format': '[%(levelname)s] %(message)s'},
+    },
+    'handlers': {
+        'file': {
+            'class': 'shop_app.logs.CompressedRotatingFileHandler',
+            'filename': BASE_DIR / 'logs' / 'shop.log',
+            'maxBytes': 50 * 1024 * 1024,
+            'interval': 86400,
+            'backupCount': 14,         # rotated files of all processes together
+            'per_process': True,
+            'formatter': 'json',
+        },
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'console'},
+    },
+    'root': {'handlers': ['file', 'console'], 'level': 'INFO'},
+    'loggers': {
+        'django': {'handlers': [], 'level': 'INFO', 'propagate': True},
+    },
+}
+
+# Success records (below WARNING) of hot routes are sampled per request and rate limited
+# per route; warnings and errors are always written
+REQUEST_LOGGING = {
+    'QUEUE_SIZE': 10000,        # records waiting for the listener; success records are dropped beyond it
+    'ACCESS_LOG': True,         # one shop_app.access record per request
+    'SAMPLE_RATES': {           # fraction of requests (by URL name) whose success records are kept
+        'product-list': 0.1,
+        'product-detail': 0.1,
+        'book-list': 0.1,
+        'book-detail': 0.1,
+    },
+    'RATE_LIMITS': {            # success records per second per URL name
+        'product-list': 20,
+        'product-detail': 20,
+        'book-list': 20,
+        'book-detail': 20,
+    },
+}
+
+# Addresses allowed to scrape the metrics endpoints without a JWT (e.g. Prometheus).
+# Empty by default: behind a reverse proxy on the same host every client is 127.0.0.1.
+METRICS_ALLOWED_IPS = []
+
+# Password hashing for signup and token issue (shop_app/hashing.py): at most WORKERS
+# hashes run at once per server process, QUEUE_SIZE more may wait; beyond that a request
+# gets 503 + Retry-After after ACQUIRE_TIMEOUT seconds
+AUTHENTICATION_BACKENDS = ['shop_app.hashing.PooledModelBackend']
+
+PASSWORD_HASHING = {
+    'EXECUTOR': 'process',      # 'process', 'thread' (gevent workers) or 'inline' (no pool)
+    'WORKERS': 2,
+    'QUEUE_SIZE': 16,
+    'ACQUIRE_TIMEOUT': 0.05,
 }
 
 # Password validation
@@ -158,6 +386,14 @@ SWAGGER_SETTINGS = {
     },
 }
 
+# Precomputed OpenAPI schema served at /openapi.json and read by /swagger/ and /redoc/
+# (shop_app/openapi.py). Write it at deploy with `manage.py openapi_schema`.
+OPENAPI_SCHEMA = {
+    'DIR': BASE_DIR / 'openapi',   # artifacts, one per format and code version
+    'VERSION': None,               # code version (e.g. the release id); None: a hash of the shop and shop_app sources
+    'MAX_AGE': 300,                # seconds the docs pages and the unversioned schema URL may be cached
+}
+
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),  # 👈 Set access token expiry here
@@ -165,4 +401,14 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # Embed username/role/version claims so requests authenticate without a User query
+    'TOKEN_OBTAIN_SERIALIZER': 'shop_app.auth.ShopTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'shop_app.auth.ShopTokenRefreshSerializer',
+}
+
+# Verified-token cache and revocation sync for shop_app.auth.ClaimsJWTAuthentication
+AUTH_TOKENS = {
+    'CACHE_MAX_ENTRIES': 10000,      # LRU bound
+    'CACHE_TTL': 300,                # seconds; never longer than the token's own expiry
+    'REVOCATION_SYNC_INTERVAL': 2,   # seconds until revocations from other processes apply
 }
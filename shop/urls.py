@@ -15,20 +15,15 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
+from django.urls import path, include, re_path
 from drf_yasg import openapi
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from shop_app.openapi import docs_view, schema_file
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Shop API",
-      default_version='v1',
-      description="API documentation with JWT authentication",
-   ),
-   public=True,
-   permission_classes=[permissions.AllowAny],
+api_info = openapi.Info(
+   title="Shop API",
+   default_version='v1',
+   description="API documentation with JWT authentication",
 )
 
 urlpatterns = [
@@ -38,7 +33,8 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     
     
-     # Swagger routes
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+     # Swagger routes: the schema is precomputed (shop_app/openapi.py, manage.py openapi_schema)
+    re_path(r'^openapi\.(?P<fmt>json|yaml)$', schema_file, name='openapi-schema'),
+    path('swagger/', docs_view('swagger'), name='schema-swagger-ui'),
+    path('redoc/', docs_view('redoc'), name='schema-redoc'),
 ]
@@ -6,6 +6,7 @@ class ShopAppConfig(AppConfig):
     name = 'shop_app'
      
     def ready(self):
-        from .task import start_worker_pool, setup_signal_handlers
-        start_worker_pool(num_workers=3)
-        setup_signal_handlers()
\ No newline at end of file
+        from .cache import register_cache_invalidation
+        from .models import Book, Product
+        register_cache_invalidation(Book, 'book')
+        register_cache_invalidation(Product, 'product')
\ No newline at end of file
@@ -0,0 +1,373 @@
+# async_views.py
+import asyncio
+import logging
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, connections, transaction
+from django.http import HttpResponse
+from django.urls import re_path
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound, ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.renderers import JSONRenderer
+
+from .auth import TOKEN_USER_FIELDS, revoke_user_tokens
+from .cache import CachedReadMixin, catalog_cache, etag_matches
+from .exceptions import HashingPoolSaturated, custom_exception_handler
+from .fastread import FastReadMixin
+from .hashing import ahash_password
+from .idempotency import HEADER as IDEMPOTENCY_HEADER
+from .perf import timed
+from .renderers import FastJSONRenderer
+from .replicas import _read_alias, is_connection_error, replicas
+from .search import CatalogSearchFilter, atrigram_available
+from .views import BookViewSet, ProductViewSet, UserViewSet
+
+logger = logging.getLogger(__name__)
+
+ASYNC_METHODS = ('GET', 'POST', 'PUT', 'PATCH')
+
+_database_slots = weakref.WeakKeyDictionary()
+
+
+def database_slots():
+    """
+    This event loop's semaphore bounding the requests that hold a database connection.
+
+    Every request runs its ORM calls on its own thread, with its own connection, so
+    without a bound the pool (`MAX_CONNS`) runs dry at a few dozen concurrent clients.
+    Requests beyond it wait here, on the event loop, rather than failing.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _database_slots:
+        options = settings.DATABASES['default'].get('OPTIONS', {})
+        _database_slots[loop] = asyncio.Semaphore(options.get('MAX_CONNS', 20))
+    return _database_slots[loop]
+
+
+def release_connections():
+    """Hand this thread's connections back (to the pool) before the next request takes its slot."""
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close_if_unusable_or_obsolete()
+
+
+class AsyncModelViewSet:
+    """
+    Native async list / retrieve / create / update for one of the ModelViewSets, served
+    under ASGI when `ASYNC_VIEWS = True` (same URLs, see `urlpatterns` below).
+
+    A bound instance of `viewset_class` supplies everything that does not wait on the
+    database - authenticators, permissions, throttles, filters, paginator, serializers,
+    cache namespace - so the responses are the sync views' responses. Queries go through
+    the async ORM (`async for`, `afirst`, `aget`, `acreate`, `asave`) and password hashing
+    awaits the hashing pool. Two steps still hop to a thread: serializer validation (the
+    unique validators query the database) and a user update that revokes tokens, which
+    must share a transaction with the save.
+
+    DELETE, HEAD and OPTIONS, creates with an `Idempotency-Key` (their advisory lock needs
+    one transaction around the create) and clients asking for the browsable API are handed
+    to the sync viewset.
+    """
+    viewset_class = None
+    basename = None
+    resource = None          # "Book", as in the sync views' error messages
+    conflict_message = None  # IntegrityError on a unique constraint
+
+    def __init__(self, actions, sync_view):
+        self.sync_view = sync_view
+        self.viewset = self.viewset_class(basename=self.basename)
+        self.viewset.action_map = {'head': actions['get'], **actions} if 'get' in actions else dict(actions)
+        for method, action in self.viewset.action_map.items():
+            setattr(self.viewset, method, getattr(self.viewset, action))
+
+    @classmethod
+    def as_view(cls, actions):
+        sync_view = cls.viewset_class.as_view(dict(actions), basename=cls.basename)
+
+        async def view(request, *args, **kwargs):
+            async with database_slots():
+                try:
+                    if request.method not in ASYNC_METHODS or (request.method == 'POST' and IDEMPOTENCY_HEADER in request.headers):
+                        return await sync_to_async(sync_view)(request, *args, **kwargs)
+                    return await cls(actions, sync_view).dispatch(request, args, kwargs)
+                finally:
+                    await sync_to_async(release_connections)()
+
+        # drf_yasg documents the route as the sync viewset
+        view.cls = cls.viewset_class
+        view.initkwargs = {'basename': cls.basename}
+        view.actions = actions
+        return csrf_exempt(view)
+
+    async def dispatch(self, request, args, kwargs):
+        viewset = self.viewset
+        viewset.args, viewset.kwargs = args, kwargs
+        viewset.request = viewset.initialize_request(request, *args, **kwargs)
+        viewset.headers = viewset.default_response_headers
+        try:
+            viewset.format_kwarg = viewset.get_format_suffix(**kwargs)
+            renderer, media_type = viewset.perform_content_negotiation(viewset.request)
+            viewset.request.accepted_renderer, viewset.request.accepted_media_type = renderer, media_type
+            if not isinstance(renderer, JSONRenderer):
+                return await sync_to_async(self.sync_view)(request, *args, **kwargs)  # browsable API
+            viewset.request.version, viewset.request.versioning_scheme = viewset.determine_version(viewset.request, *args, **kwargs)
+
+            await self.perform_authentication()
+            viewset.check_permissions(viewset.request)
+            viewset.check_throttles(viewset.request)
+            return await self.perform_action(args, kwargs)
+        except Exception as exc:
+            return self.handle_exception(exc)
+
+    async def perform_action(self, args, kwargs):
+        """The action, with ReplicaReadMixin's routing: safe reads on a replica (again on the primary if it is lost)."""
+        request, user = self.viewset.request, self.viewset.request.user
+        token = _read_alias.set(await replicas.aread_alias(user) if request.method in SAFE_METHODS else None)
+        try:
+            try:
+                response = await getattr(self, self.viewset.action)(*args, **kwargs)
+            except Exception as exc:
+                alias = _read_alias.get()
+                if alias is None or not is_connection_error(exc):
+                    raise
+                replicas.mark_down(alias)
+                _read_alias.set(None)
+                response = await getattr(self, self.viewset.action)(*args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            replicas.stick(user)
+        return response
+
+    async def perform_authentication(self):
+        request = self.viewset.request
+        with timed('auth'):
+            for authenticator in request.authenticators:
+                try:
+                    if hasattr(authenticator, 'aauthenticate'):
+                        result = await authenticator.aauthenticate(request)
+                    else:
+                        result = await sync_to_async(authenticator.authenticate)(request)
+                except APIException:
+                    request._not_authenticated()
+                    raise
+                if result is not None:
+                    request._authenticator = authenticator
+                    request.user, request.auth = result
+                    return
+            request._not_authenticated()
+
+    def handle_exception(self, exc):
+        viewset = self.viewset
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            auth_header = viewset.get_authenticate_header(viewset.request)
+            if auth_header:
+                exc.auth_header = auth_header
+            else:
+                exc.status_code = status.HTTP_403_FORBIDDEN
+        elif not isinstance(exc, APIException):
+            logger.error("Unhandled error in %s: %s", type(self).__name__, exc, exc_info=True)
+        response = custom_exception_handler(exc, viewset.get_exception_handler_context())
+        headers = {name: response[name] for name in ('Retry-After', 'WWW-Authenticate') if response.has_header(name)}
+        return self.respond(response.data, response.status_code, headers)
+
+    def respond(self, data=None, status_code=status.HTTP_200_OK, headers=None):
+        request = self.viewset.request
+        body = b'' if data is None else FastJSONRenderer().render(
+            data, getattr(request, 'accepted_media_type', None), {'request': request, 'view': self.viewset}
+        )
+        response = HttpResponse(body, status=status_code, content_type=FastJSONRenderer.media_type)
+        if not body:
+            del response['Content-Type']
+        for name, value in {**self.viewset.headers, **(headers or {})}.items():
+            response[name] = value
+        return response
+
+    async def cached_response(self, key, load):
+        entry = catalog_cache.get(key)
+        if entry is None:
+            entry = catalog_cache.fill(key, await load())
+        data, etag = entry
+        if etag_matches(self.viewset.request, etag):
+            return self.respond(None, status.HTTP_304_NOT_MODIFIED, {'ETag': etag})
+        return self.respond(data, headers={'ETag': etag})
+
+    async def prepare_filters(self):
+        if CatalogSearchFilter in self.viewset.filter_backends:
+            await atrigram_available(self.viewset.get_queryset().db)
+
+    async def aget_object(self):
+        viewset = self.viewset
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+        lookup_url_kwarg = viewset.lookup_url_kwarg or viewset.lookup_field
+        try:
+            instance = await queryset.aget(**{viewset.lookup_field: viewset.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, DjangoValidationError):
+            raise NotFound()
+        viewset.check_object_permissions(viewset.request, instance)
+        return instance
+
+    async def list(self, *args, **kwargs):
+        viewset = self.viewset
+        try:
+            await self.prepare_filters()
+            if isinstance(viewset, CachedReadMixin):
+                key = catalog_cache.make_key(viewset.cache_namespace, 'list', viewset.request.build_absolute_uri())
+                return await self.cached_response(key, self.list_data)
+            return self.respond(await self.list_data())
+        except APIException:
+            raise  # bad filter values or cursors are client errors (400/404)
+        except Exception as e:
+            logger.error("Error fetching %s list: %s", self.basename, str(e), exc_info=True)
+            raise APIException("Failed to retrieve records.")
+
+    async def list_data(self):
+        viewset = self.viewset
+        if isinstance(viewset, FastReadMixin):
+            convert, rows = viewset.get_fast_rows()
+        else:
+            convert, rows = None, viewset.filter_queryset(viewset.get_queryset())
+
+        paginator = viewset.paginator
+        if paginator is None:
+            page = [row async for row in rows]
+        else:
+            page = await paginator.apaginate_queryset(rows, viewset.request, view=viewset)
+        with timed('serializer'):
+            data = [convert(row) for row in page] if convert else viewset.get_serializer(page, many=True).data
+        return data if paginator is None else paginator.get_paginated_response(data).data
+
+    async def retrieve(self, *args, **kwargs):
+        viewset = self.viewset
+        try:
+            await self.prepare_filters()
+            if isinstance(viewset, CachedReadMixin):
+                key = catalog_cache.make_key(viewset.cache_namespace, 'detail', kwargs.get(viewset.lookup_field))
+                return await self.cached_response(key, self.retrieve_data)
+            return self.respond(await self.retrieve_data())
+        except Exception as e:
+            logger.error("Error fetching %s: %s", self.basename, str(e), exc_info=True)
+            raise NotFound(f"{self.resource} with the given ID does not exist.")
+
+    async def retrieve_data(self):
+        viewset = self.viewset
+        if not isinstance(viewset, FastReadMixin) or viewset.uses_object_permissions():
+            return viewset.get_serializer(await self.aget_object()).data
+
+        convert, rows = viewset.get_fast_rows()
+        lookup_url_kwarg = viewset.lookup_url_kwarg or viewset.lookup_field
+        row = await rows.filter(**{viewset.lookup_field: viewset.kwargs[lookup_url_kwarg]}).afirst()
+        if row is None:
+            raise NotFound()
+        with timed('serializer'):
+            return convert(row)
+
+    async def create(self, *args, **kwargs):
+        viewset = self.viewset
+        serializer = viewset.get_serializer(data=viewset.request.data)
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        try:
+            serializer.instance = await self.perform_create(dict(serializer.validated_data))
+        except IntegrityError as e:
+            if 'unique' in str(e).lower():
+                raise ValidationError(self.conflict_message)
+            raise ValidationError("An unexpected error occurred.")
+        logger.info("%s registered successfully: ID %s", self.resource, serializer.instance.pk)
+        return self.respond(serializer.data, status.HTTP_201_CREATED, viewset.get_success_headers(serializer.data))
+
+    async def perform_create(self, validated_data):
+        return await self.viewset.get_queryset().model._default_manager.acreate(**validated_data)
+
+    async def update(self, *args, partial=False, **kwargs):
+        viewset = self.viewset
+        try:
+            instance = await self.aget_object()
+            serializer = viewset.get_serializer(instance, data=viewset.request.data, partial=partial)
+            await sync_to_async(serializer.is_valid)(raise_exception=True)
+            serializer.instance = await self.perform_update(instance, dict(serializer.validated_data))
+            logger.info("%s updated successfully: ID %s", self.resource, instance.pk)
+            return self.respond(serializer.data)
+        except IntegrityError as e:
+            logger.error("Integrity error during update: %s", str(e), exc_info=True)
+            if 'unique' in str(e).lower():
+                raise ValidationError(self.conflict_message)
+            raise ValidationError(f"Failed to {'partially ' if partial else ''}update {self.basename} due to an internal error.")
+        except HashingPoolSaturated:
+            raise  # 503: retry later, not a missing row
+        except Exception as e:
+            logger.error("Error updating %s: %s", self.basename, str(e), exc_info=True)
+            raise NotFound(f"{self.resource} to {'partial update' if partial else 'update'} not found.")
+
+    async def partial_update(self, *args, **kwargs):
+        return await self.update(*args, partial=True, **kwargs)
+
+    async def perform_update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        await instance.asave()
+        return instance
+
+
+class AsyncBookViewSet(AsyncModelViewSet):
+    viewset_class = BookViewSet
+    basename = 'book'
+    resource = 'Book'
+    conflict_message = "A book with this title and author already exists."
+
+
+class AsyncProductViewSet(AsyncModelViewSet):
+    viewset_class = ProductViewSet
+    basename = 'product'
+    resource = 'Product'
+    conflict_message = "A product with this SKU already exists."
+
+
+class AsyncUserViewSet(AsyncModelViewSet):
+    viewset_class = UserViewSet
+    basename = 'user'
+    resource = 'User'
+    conflict_message = "A user with this email already exists."
+
+    async def perform_create(self, validated_data):
+        validated_data['password'] = await ahash_password(validated_data['password'])
+        return await super().perform_create(validated_data)
+
+    async def perform_update(self, instance, validated_data):
+        if 'password' in validated_data:
+            validated_data['password'] = await ahash_password(validated_data['password'])
+        before = [getattr(instance, field) for field in TOKEN_USER_FIELDS]
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        if before == [getattr(instance, field) for field in TOKEN_USER_FIELDS]:
+            await instance.asave()
+        else:
+            await sync_to_async(self.save_and_revoke)(instance)
+        return instance
+
+    @staticmethod
+    def save_and_revoke(user):
+        with transaction.atomic():
+            user.save()
+            revoke_user_tokens(user)  # outstanding access tokens carry the old role
+
+
+def async_routes(prefix, viewset):
+    # Numeric pks only: `<prefix>/export/`, `<prefix>/bulk/` etc. fall through to the router
+    return [
+        re_path(rf'^{prefix}/$', viewset.as_view({'get': 'list', 'post': 'create'}), name=f'{viewset.basename}-list'),
+        re_path(rf'^{prefix}/(?P<pk>[0-9]+)/$',
+                viewset.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}),
+                name=f'{viewset.basename}-detail'),
+    ]
+
+
+urlpatterns = [
+    *async_routes('books', AsyncBookViewSet),
+    *async_routes('products', AsyncProductViewSet),
+    *async_routes('users', AsyncUserViewSet),
+]
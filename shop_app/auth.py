@@ -0,0 +1,270 @@
+# auth.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from functools import cached_property
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .models import AuthRevocation
+
+# Changing any of these invalidates the user's outstanding access tokens
+TOKEN_USER_FIELDS = ('username', 'role', 'password', 'is_active')
+
+
+def auth_setting(name, default=None):
+    return getattr(settings, 'AUTH_TOKENS', {}).get(name, default)
+
+
+def add_user_claims(token, user):
+    """What ClaimsUser needs, so authenticating a request does not load the User row."""
+    token['username'] = user.username
+    token['role'] = user.role
+    token['ver'] = user.token_version
+    return token
+
+
+class ShopTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
+
+class ShopTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Re-reads the user on refresh so new access tokens carry the current role and version.
+    A refresh token from before a role or credentials change (`ver` below the user's
+    `token_version`, see revoke_user_tokens) is rejected.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        try:
+            user = get_user_model().objects.get(
+                **{api_settings.USER_ID_FIELD: refresh.payload.get(api_settings.USER_ID_CLAIM)}
+            )
+        except ObjectDoesNotExist:
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        if refresh.get('ver', 0) < user.token_version:
+            raise InvalidToken("Token has been revoked.")
+        data = super().validate(attrs)  # active-user check and, if enabled, rotation
+        data['access'] = str(add_user_claims(refresh.access_token, user))
+        return data
+
+
+class ClaimsUser(TokenUser):
+    """`request.user` built from access token claims; there is no User row behind it."""
+
+    @cached_property
+    def role(self):
+        return self.token.get('role')
+
+
+class TokenCache:
+    """
+    LRU of validated access tokens keyed by the SHA-256 of the raw token. Entries live
+    for at most `AUTH_TOKENS['CACHE_TTL']` seconds and never past the token's `exp`.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, exp):
+        expires = min(time.time() + auth_setting('CACHE_TTL', 300), exp)
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > auth_setting('CACHE_MAX_ENTRIES', 10000):
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class RevocationList:
+    """
+    In-process mirror of the unexpired AuthRevocation rows: revoked access token jtis
+    and, per user id, the lowest token version still accepted. Both are dicts keyed to
+    the entry's expiry, so a check is two lookups and expired entries are dropped on
+    every sync (memory is bounded by the access token lifetime).
+
+    The first check after startup loads every unexpired row; after that one query every
+    `REVOCATION_SYNC_INTERVAL` seconds picks up rows written by other processes
+    (re-reading a few seconds of overlap, so rows committed late are not missed).
+    Revocations made in this process apply as soon as they commit.
+    """
+    SYNC_OVERLAP = timedelta(seconds=10)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.user_versions = {}
+        self.jtis = {}
+        self.synced_at = None
+        self.next_sync = 0.0
+
+    def add(self, user_id, token_version, jti, expires_at):
+        if jti:
+            self.jtis[jti] = expires_at.timestamp()
+            return
+        user_id = str(user_id)  # the user_id claim is a string
+        current = self.user_versions.get(user_id)
+        if current is None or token_version > current[0]:
+            self.user_versions[user_id] = (token_version, expires_at.timestamp())
+
+    def sync_due(self):
+        return time.time() >= self.next_sync
+
+    def sync(self, force=False):
+        now = time.time()
+        if not force and now < self.next_sync:
+            return
+        if not self.lock.acquire(blocking=False):
+            return  # another thread is already syncing
+        try:
+            started = timezone.now()
+            rows = AuthRevocation.objects.filter(expires_at__gt=started)
+            if self.synced_at is not None:
+                rows = rows.filter(created_at__gte=self.synced_at - self.SYNC_OVERLAP)
+            for row in rows.values_list('user_id', 'token_version', 'jti', 'expires_at'):
+                self.add(*row)
+            self.user_versions = {k: v for k, v in self.user_versions.items() if v[1] > now}
+            self.jtis = {k: v for k, v in self.jtis.items() if v > now}
+            self.synced_at = started
+            self.next_sync = now + auth_setting('REVOCATION_SYNC_INTERVAL', 2)
+        finally:
+            self.lock.release()
+
+    def check(self, token, sync=True):
+        if sync:
+            self.sync()
+        if token.get(api_settings.JTI_CLAIM) in self.jtis:
+            raise InvalidToken("Token has been revoked.")
+        revoked = self.user_versions.get(str(token.get(api_settings.USER_ID_CLAIM)))
+        if revoked is not None and token.get('ver', 0) < revoked[0] and revoked[1] > time.time():
+            raise InvalidToken("Token has been revoked.")
+
+    def clear(self):
+        with self.lock:
+            self.user_versions.clear()
+            self.jtis.clear()
+            self.synced_at = None
+            self.next_sync = 0.0
+
+
+revocations = RevocationList()
+
+
+def revoke_user_tokens(user):
+    """Reject every access and refresh token issued to `user` so far (role or credentials change, deactivation, deletion)."""
+    get_user_model().objects.filter(pk=user.pk).update(token_version=F('token_version') + 1)
+    user.refresh_from_db(fields=['token_version'])
+    leeway = api_settings.LEEWAY if isinstance(api_settings.LEEWAY, timedelta) else timedelta(seconds=api_settings.LEEWAY)
+    revocation = AuthRevocation.objects.create(
+        user_id=user.pk,
+        token_version=user.token_version,
+        expires_at=timezone.now() + api_settings.ACCESS_TOKEN_LIFETIME + leeway,
+    )
+    transaction.on_commit(lambda: revocations.add(revocation.user_id, revocation.token_version, '', revocation.expires_at))
+
+
+def revoke_access_token(token):
+    """Reject this one access token until it expires (logout)."""
+    revocation = AuthRevocation.objects.create(
+        user_id=token[api_settings.USER_ID_CLAIM],
+        jti=token[api_settings.JTI_CLAIM],
+        expires_at=datetime_from_epoch(token['exp']),
+    )
+    transaction.on_commit(lambda: revocations.add(revocation.user_id, None, revocation.jti, revocation.expires_at))
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication without the per-request User query.
+
+    Access tokens issued by ShopTokenObtainPairSerializer carry `username`, `role` and
+    `ver`, so `request.user` is a ClaimsUser. Verified tokens are kept in `token_cache`,
+    so repeat requests skip signature verification too. Every request is still checked
+    against `revocations` (logged-out jtis, revoked user versions: dict lookups). Tokens from before the claims existed fall
+    back to loading the user once, then are cached the same way.
+    """
+
+    def authenticate(self, request):
+        raw_token = self.get_request_token(request)
+        if raw_token is None:
+            return None
+
+        key = hashlib.sha256(raw_token).digest()
+        cached = token_cache.get(key)
+        if cached is None:
+            validated_token = self.get_validated_token(raw_token)
+            cached = (self.get_user(validated_token), validated_token)
+            token_cache.set(key, cached, validated_token['exp'])
+
+        revocations.check(cached[1])
+        return cached
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views: the revocation sync and User lookups run in a thread."""
+        raw_token = self.get_request_token(request)
+        if raw_token is None:
+            return None
+        if revocations.sync_due():
+            await sync_to_async(revocations.sync)()
+
+        key = hashlib.sha256(raw_token).digest()
+        cached = token_cache.get(key)
+        if cached is None:
+            validated_token = self.get_validated_token(raw_token)
+            if self.has_user_claims(validated_token):
+                user = ClaimsUser(validated_token)
+            else:
+                user = await sync_to_async(super().get_user)(validated_token)
+            cached = (user, validated_token)
+            token_cache.set(key, cached, validated_token['exp'])
+
+        revocations.check(cached[1], sync=False)
+        return cached
+
+    def get_request_token(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        return self.get_raw_token(header)
+
+    def has_user_claims(self, validated_token):
+        return 'role' in validated_token and 'ver' in validated_token
+
+    def get_user(self, validated_token):
+        if self.has_user_claims(validated_token):
+            return ClaimsUser(validated_token)
+        return super().get_user(validated_token)
@@ -0,0 +1,210 @@
+# bulk.py
+import logging
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .cache import catalog_cache
+
+logger = logging.getLogger(__name__)
+
+
+class BulkWriteMixin:
+    """
+    Adds `/<resource>/bulk/` to a ModelViewSet:
+
+    - POST:   list of objects to create        -> bulk_create
+    - PATCH:  list of objects with `id` to update -> bulk_update
+    - DELETE: list of ids (or objects with `id`) -> one DELETE ... WHERE id IN (...)
+
+    All rows are validated up front, unique collisions (inside the payload and
+    against the table) are found with one query per batch, and every write runs in
+    a single transaction. Bad rows are reported per row, good rows are written.
+    """
+    bulk_serializer_class = None
+    bulk_unique_fields = ()
+    bulk_conflict_message = "An object with these values already exists."
+
+    @property
+    def bulk_batch_size(self):
+        return getattr(settings, 'BULK_BATCH_SIZE', 500)
+
+    @property
+    def bulk_max_rows(self):
+        return getattr(settings, 'BULK_MAX_ROWS', 5000)
+
+    @swagger_auto_schema(
+        methods=['post', 'patch', 'delete'],
+        operation_description="🔒 Bulk create (POST, admin), update (PATCH, admin/staff) or delete (DELETE, admin) in one transaction."
+    )
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request, *args, **kwargs):
+        rows = request.data
+        if not isinstance(rows, list):
+            raise ValidationError("Expected a list of items.")
+        if len(rows) > self.bulk_max_rows:
+            raise ValidationError(f"At most {self.bulk_max_rows} items can be sent in one bulk request.")
+
+        try:
+            with transaction.atomic():
+                if request.method == 'POST':
+                    results = self._bulk_create(rows)
+                elif request.method == 'PATCH':
+                    results = self._bulk_update(rows)
+                else:
+                    results = self._bulk_delete(rows)
+                # bulk_create / bulk_update do not send post_save
+                transaction.on_commit(lambda: catalog_cache.invalidate(self.cache_namespace))
+        except IntegrityError as e:
+            logger.error("Integrity error during bulk %s: %s", request.method, str(e), exc_info=True)
+            raise ValidationError(self.bulk_conflict_message)
+
+        failed = sum(1 for r in results if r['status'] == 'error')
+        logger.info("Bulk %s finished: %d rows, %d failed", request.method, len(results), failed)
+
+        if failed:
+            response_status = status.HTTP_207_MULTI_STATUS
+        elif request.method == 'POST':
+            response_status = status.HTTP_201_CREATED
+        else:
+            response_status = status.HTTP_200_OK
+        return Response({'total': len(results), 'failed': failed, 'results': results}, status=response_status)
+
+    def _validate_rows(self, rows, partial=False):
+        serializer = self.bulk_serializer_class(data=rows, many=True, partial=partial, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data, serializer.row_errors
+
+    def _unique_key(self, values):
+        if not self.bulk_unique_fields or any(f not in values for f in self.bulk_unique_fields):
+            return None
+        return tuple(values[f] for f in self.bulk_unique_fields)
+
+    def _existing_keys(self, keys):
+        """Map unique key -> pk for rows already in the table, one query per batch."""
+        model = self.get_queryset().model
+        keys = list(keys)
+        existing = {}
+        for start in range(0, len(keys), self.bulk_batch_size):
+            batch = keys[start:start + self.bulk_batch_size]
+            condition = reduce(or_, (Q(**dict(zip(self.bulk_unique_fields, key))) for key in batch))
+            for row in model.objects.filter(condition).values_list('pk', *self.bulk_unique_fields):
+                existing[tuple(row[1:])] = row[0]
+        return existing
+
+    def _check_conflicts(self, items, results):
+        """
+        `items` is a list of (index, pk or None, values). Marks colliding rows as
+        errors in `results` and returns the rows that are safe to write.
+        """
+        keyed = [(index, pk, values, self._unique_key(values)) for index, pk, values in items]
+        existing = self._existing_keys({key for _, _, _, key in keyed if key is not None})
+
+        seen = {}
+        accepted = []
+        for index, pk, values, key in keyed:
+            if key is not None and key in seen:
+                results[index] = self._error(index, f"Duplicates row {seen[key]} of this request.")
+                continue
+            if key is not None and existing.get(key, pk) != pk:
+                results[index] = self._error(index, self.bulk_conflict_message)
+                continue
+            if key is not None:
+                seen[key] = index
+            accepted.append((index, pk, values))
+        return accepted
+
+    def _error(self, index, errors):
+        return {'index': index, 'status': 'error', 'errors': errors}
+
+    def _row_ids(self, rows, results, allow_bare_ids):
+        """Map row index -> integer pk, marking rows without a usable `id` as errors."""
+        ids, seen = {}, {}
+        for index, row in enumerate(rows):
+            pk = row.get('id') if isinstance(row, dict) else (row if allow_bare_ids else None)
+            if not str(pk).isdigit():
+                results[index] = self._error(index, {'id': ['A valid integer is required.']})
+            elif int(pk) in seen:
+                results[index] = self._error(index, f"Duplicates row {seen[int(pk)]} of this request.")
+            else:
+                ids[index] = int(pk)
+                seen[int(pk)] = index
+        return ids
+
+    def _bulk_create(self, rows):
+        model = self.get_queryset().model
+        validated, row_errors = self._validate_rows(rows)
+        results = [None] * len(rows)
+        for index, errors in row_errors.items():
+            results[index] = self._error(index, errors)
+
+        items = [(index, None, values) for index, values in enumerate(validated) if values is not None]
+        accepted = self._check_conflicts(items, results)
+
+        objs = model.objects.bulk_create([model(**values) for _, _, values in accepted], batch_size=self.bulk_batch_size)
+        data = self.get_serializer(objs, many=True).data
+        for (index, _, _), item in zip(accepted, data):
+            results[index] = {'index': index, 'status': 'created', 'data': item}
+        return results
+
+    def _bulk_update(self, rows):
+        model = self.get_queryset().model
+        results = [None] * len(rows)
+        ids = self._row_ids(rows, results, allow_bare_ids=False)
+
+        validated, row_errors = self._validate_rows(rows, partial=True)
+        for index, errors in row_errors.items():
+            results[index] = self._error(index, errors)
+
+        # Lock in primary key order so concurrent bulk updates cannot deadlock
+        instances = {obj.pk: obj for obj in model.objects.select_for_update().filter(pk__in=set(ids.values())).order_by('pk')}
+
+        items = []
+        for index, pk in ids.items():
+            if results[index] is not None:
+                continue
+            instance = instances.get(pk)
+            if instance is None:
+                results[index] = self._error(index, "Not found.")
+                continue
+            values = {f: validated[index].get(f, getattr(instance, f)) for f in self.bulk_unique_fields}
+            values.update(validated[index])
+            items.append((index, instance.pk, values))
+        accepted = self._check_conflicts(items, results)
+
+        objs, fields = [], set()
+        for index, pk, values in accepted:
+            instance = instances[pk]
+            for field, value in values.items():
+                setattr(instance, field, value)
+            fields.update(validated[index])
+            objs.append(instance)
+        if objs and fields:
+            model.objects.bulk_update(objs, sorted(fields), batch_size=self.bulk_batch_size)
+
+        data = self.get_serializer(objs, many=True).data
+        for (index, _, _), item in zip(accepted, data):
+            results[index] = {'index': index, 'status': 'updated', 'data': item}
+        return results
+
+    def _bulk_delete(self, rows):
+        model = self.get_queryset().model
+        results = [None] * len(rows)
+        ids = self._row_ids(rows, results, allow_bare_ids=True)
+
+        existing = set(model.objects.filter(pk__in=set(ids.values())).values_list('pk', flat=True))
+        model.objects.filter(pk__in=existing).delete()
+        for index, pk in ids.items():
+            if pk in existing:
+                results[index] = {'index': index, 'status': 'deleted', 'id': pk}
+            else:
+                results[index] = self._error(index, "Not found.")
+        return results
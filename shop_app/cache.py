@@ -0,0 +1,156 @@
+# cache.py
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework import status
+from rest_framework.response import Response
+
+from .replicas import _read_alias
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogCache:
+    """
+    Versioned read-through cache for serialized catalog payloads.
+
+    Every model has a version counter stored next to the entries. Cache keys embed
+    the current version, so invalidating a model is a single `incr` - old entries are
+    never read again and age out of the (LRU bounded) backend on their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    @property
+    def backend(self):
+        return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+    def _version_key(self, namespace):
+        return f"catalog:{namespace}:version"
+
+    def get_version(self, namespace):
+        version = self.backend.get(self._version_key(namespace))
+        if version is None:
+            # Seed from the clock so a culled counter can never roll back onto old keys
+            self.backend.add(self._version_key(namespace), int(time.time() * 1000), timeout=None)
+            version = self.backend.get(self._version_key(namespace))
+        return version
+
+    def invalidate(self, namespace):
+        try:
+            self.backend.incr(self._version_key(namespace))
+        except ValueError:
+            self.get_version(namespace)
+        with self._lock:
+            self._invalidations += 1
+        logger.debug("Catalog cache invalidated for %s", namespace)
+
+    def make_key(self, namespace, kind, identity):
+        digest = hashlib.md5(str(identity).encode('utf-8')).hexdigest()
+        return f"catalog:{namespace}:v{self.get_version(namespace)}:{kind}:{digest}"
+
+    def get(self, key):
+        entry = self.backend.get(key)
+        with self._lock:
+            if entry is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return entry
+
+    def set(self, key, data):
+        entry = (data, make_etag(data))
+        self.backend.set(key, entry, timeout=self.timeout)
+        return entry
+
+    def fill(self, key, data):
+        """
+        set(), unless `data` was read from a replica: it may predate the write the key's
+        version was bumped for, and would then be served - to the writer too, whose reads are
+        on the primary - for the whole timeout. The entry is returned either way.
+        """
+        if _read_alias.get() is not None:
+            return data, make_etag(data)
+        return self.set(key, data)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses, 'invalidations': self._invalidations}
+
+
+catalog_cache = CatalogCache()
+
+
+def make_etag(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return '"%s"' % hashlib.sha1(body.encode('utf-8')).hexdigest()
+
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get('If-None-Match', '')
+    return any(tag.strip() in (etag, '*') for tag in if_none_match.split(','))
+
+
+class CachedReadMixin:
+    """
+    Serve `list` and `retrieve` from `catalog_cache`, with `ETag` / `If-None-Match`.
+
+    A cache hit returns before the queryset or serializer is touched, and a matching
+    `If-None-Match` turns it into a body-less 304. Writes invalidate the namespace
+    through the model signals registered in `register_cache_invalidation`. Only reads
+    from the primary fill the cache (see CatalogCache.fill).
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        key = catalog_cache.make_key(self.cache_namespace, 'list', request.build_absolute_uri())
+        return self._cached_response(request, key, lambda: super(CachedReadMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        key = catalog_cache.make_key(self.cache_namespace, 'detail', kwargs.get(self.lookup_field))
+        return self._cached_response(request, key, lambda: super(CachedReadMixin, self).retrieve(request, *args, **kwargs))
+
+    def _cached_response(self, request, key, load):
+        entry = catalog_cache.get(key)
+        if entry is None:
+            response = load()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = catalog_cache.fill(key, response.data)
+
+        data, etag = entry
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(data, headers={'ETag': etag})
+
+
+def register_cache_invalidation(model, namespace):
+    """
+    Bump the namespace version whenever an instance of `model` is saved or deleted.
+
+    The version is bumped immediately, so this process never serves the pre-write
+    payload, and again on commit, so an entry re-cached by a concurrent reader while
+    the transaction was still open is dropped as well.
+    """
+    def invalidate(sender, **kwargs):
+        catalog_cache.invalidate(namespace)
+        transaction.on_commit(lambda: catalog_cache.invalidate(namespace))
+
+    post_save.connect(invalidate, sender=model, weak=False, dispatch_uid=f"catalog-cache-save-{namespace}")
+    post_delete.connect(invalidate, sender=model, weak=False, dispatch_uid=f"catalog-cache-delete-{namespace}")
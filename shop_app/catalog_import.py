@@ -0,0 +1,254 @@
+# catalog_import.py
+import csv
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import time
+from collections import deque, namedtuple
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from rest_framework import serializers
+
+from .cache import catalog_cache
+
+# An NDJSON line that is not valid JSON; rejected with the parser's error
+InvalidLine = namedtuple('InvalidLine', ['text', 'error'])
+
+
+def read_records(path, fmt):
+    """Yield the input rows as dicts. `fmt` is 'csv' or 'ndjson'; `.gz` files are decompressed."""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield InvalidLine(line.rstrip('\n'), str(e))
+
+
+class CatalogImporter:
+    """
+    Loads validated rows into `model` in batches: COPY into a temporary staging table,
+    then one `INSERT ... SELECT ... ON CONFLICT (key_fields) DO UPDATE` into the real
+    table. Within a batch the last row for a key wins.
+
+    Rows are validated with `serializer_class` (the bulk serializers: the same field rules
+    as the API, minus the per-row uniqueness queries the upsert makes unnecessary).
+    """
+
+    def __init__(self, serializer_class, key_fields, cache_namespace, using='default'):
+        self.serializer = serializer_class()
+        self.model = serializer_class.Meta.model
+        self.key_fields = tuple(key_fields)
+        self.cache_namespace = cache_namespace
+        self.using = using
+        self.connection = connections[using]
+        self.columns = [
+            self.model._meta.get_field(name)
+            for name, field in self.serializer.fields.items() if not field.read_only
+        ]
+        self.stage_table = f'import_stage_{self.model._meta.db_table}'
+
+    def validate(self, record):
+        """Return (row, None) for a valid record or (None, errors)."""
+        if isinstance(record, InvalidLine):
+            return None, {'non_field_errors': [f"Invalid JSON: {record.error}"]}
+        try:
+            data = self.serializer.run_validation(record)
+        except serializers.ValidationError as e:
+            return None, serializers.as_serializer_error(e)
+        missing = [key for key in self.key_fields if key not in data]
+        if missing:
+            return None, {key: ["This field is required for import."] for key in missing}
+        return [data[field.name] if field.name in data else field.get_default() for field in self.columns], None
+
+    def create_stage_table(self):
+        qn = self.connection.ops.quote_name
+        definition = ', '.join(f'{qn(field.column)} {field.db_type(self.connection)}' for field in self.columns)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'CREATE TEMPORARY TABLE IF NOT EXISTS {qn(self.stage_table)} (seq bigint, {definition})')
+
+    def load(self, rows):
+        """COPY `rows` ([seq, *values]) into staging and upsert them. Returns (inserted, updated)."""
+        qn = self.connection.ops.quote_name
+        columns = ', '.join(qn(field.column) for field in self.columns)
+        keys = ', '.join(qn(self.model._meta.get_field(name).column) for name in self.key_fields)
+        updates = ', '.join(f'{qn(field.column)} = EXCLUDED.{qn(field.column)}'
+                            for field in self.columns if field.name not in self.key_fields)
+
+        buffer = io.StringIO()
+        # Strings are quoted and None is written unquoted, which COPY reads as NULL
+        csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+        buffer.seek(0)
+
+        with transaction.atomic(using=self.using), self.connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {qn(self.stage_table)}')
+            cursor.copy_expert(f'COPY {qn(self.stage_table)} (seq, {columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+            cursor.execute(
+                f'WITH upserted AS ('
+                f' INSERT INTO {qn(self.model._meta.db_table)} ({columns})'
+                f' SELECT DISTINCT ON ({keys}) {columns} FROM {qn(self.stage_table)} ORDER BY {keys}, seq DESC'
+                f' ON CONFLICT ({keys}) DO UPDATE SET {updates}'
+                f' RETURNING (xmax = 0) AS inserted'
+                f') SELECT count(*) FILTER (WHERE inserted), count(*) FROM upserted'
+            )
+            inserted, total = cursor.fetchone()
+            transaction.on_commit(lambda: catalog_cache.invalidate(self.cache_namespace), using=self.using)
+        return inserted, total - inserted
+
+
+def _validate_batch(importer, first, records):
+    rows, rejected = [], []
+    for number, record in enumerate(records, first):
+        row, errors = importer.validate(record)
+        if errors:
+            rejected.append((number, record, errors))
+        else:
+            rows.append([number, *row])
+    return rows, rejected
+
+
+_worker_importer = None
+
+
+def _init_validator(serializer_class, key_fields):
+    global _worker_importer
+    _worker_importer = CatalogImporter(serializer_class, key_fields, cache_namespace=None)
+
+
+def _validate_in_worker(first, records):
+    return _validate_batch(_worker_importer, first, records)
+
+
+class ImportCommand(BaseCommand):
+    """
+    Base for `import_products` / `import_books`. Subclasses set `serializer_class`,
+    `key_fields` and `cache_namespace`.
+
+    Records are numbered from 1 (the CSV header is not counted). The number of records
+    handled is checkpointed to `<file>.checkpoint` after every committed batch and a rerun
+    continues from there (`--restart` ignores it). Because every batch is an upsert,
+    replaying the batch that was in flight during a crash is harmless. Rejected records
+    are written to `<file>.rejected.ndjson` with their number and errors.
+    """
+    serializer_class = None
+    key_fields = ()
+    cache_namespace = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="CSV (with a header row) or NDJSON file; may be gzipped (.gz).")
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help="Input format (default: from the file extension).")
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'IMPORT_BATCH_SIZE', 20000),
+                            help="Rows per COPY + upsert transaction.")
+        parser.add_argument('--rejects', help="Where to write rejected rows (default: <file>.rejected.ndjson).")
+        parser.add_argument('--checkpoint', help="Checkpoint file (default: <file>.checkpoint).")
+        parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint and start over.")
+        parser.add_argument('--jobs', type=int, default=1,
+                            help="Processes validating rows in parallel (validation is most of the CPU time).")
+        parser.add_argument('--database', default='default', help="Database alias to load into.")
+
+    def handle(self, *args, **options):
+        path = options['file']
+        if not os.path.exists(path):
+            raise CommandError(f"No such file: {path}")
+        fmt = options['format'] or ('ndjson' if '.ndjson' in path or '.jsonl' in path else 'csv')
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        rejects_path = options['rejects'] or f'{path}.rejected.ndjson'
+
+        state = {'records': 0, 'inserted': 0, 'updated': 0, 'rejected': 0}
+        if os.path.exists(checkpoint_path) and not options['restart']:
+            with open(checkpoint_path) as f:
+                state.update(json.load(f))
+            self.stdout.write(f"Resuming after record {state['records']} (checkpoint {checkpoint_path})")
+
+        jobs = max(1, options['jobs'])
+        pool = None
+        if jobs > 1:
+            # Fork before this process opens its connection (the staging table lives in it)
+            connections.close_all()
+            pool = multiprocessing.get_context('fork').Pool(
+                jobs, initializer=_init_validator, initargs=(self.serializer_class, self.key_fields)
+            )
+        importer = CatalogImporter(self.serializer_class, self.key_fields, self.cache_namespace, options['database'])
+        importer.create_stage_table()
+        records = islice(read_records(path, fmt), state['records'], None)
+        started, loaded = time.perf_counter(), 0
+
+        try:
+            with open(rejects_path, 'a' if state['records'] else 'w', encoding='utf-8') as rejects:
+                for first, count, rows, rejected in self.validated_batches(records, state['records'] + 1,
+                                                                         options['batch_size'], importer, pool, jobs):
+                    for number, record, errors in rejected:
+                        data = record.text if isinstance(record, InvalidLine) else record
+                        rejects.write(json.dumps({'record': number, 'data': data, 'errors': errors}, default=str) + '\n')
+                    rejects.flush()
+                    state['rejected'] += len(rejected)
+
+                    if rows:
+                        inserted, updated = importer.load(rows)
+                        state['inserted'] += inserted
+                        state['updated'] += updated
+                    state['records'] = first + count - 1
+                    self.write_checkpoint(checkpoint_path, state)
+
+                    loaded += count
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f"record {state['records']}: inserted={state['inserted']} updated={state['updated']} "
+                        f"rejected={state['rejected']} ({loaded / elapsed:,.0f} rows/s)"
+                    )
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {state['records']} records, inserted={state['inserted']} updated={state['updated']} "
+            f"rejected={state['rejected']} in {elapsed:.1f}s ({loaded / max(elapsed, 1e-9):,.0f} rows/s)"
+        ))
+        if state['rejected']:
+            self.stdout.write(f"Rejected rows: {rejects_path}")
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    def validated_batches(self, records, first, batch_size, importer, pool, jobs):
+        """
+        Yield (first record number, record count, valid rows, rejected) per batch, in input
+        order. With a pool, up to 2 * jobs batches are validated ahead of the one being loaded.
+        """
+        def batches():
+            number = first
+            while batch := list(islice(records, batch_size)):
+                yield number, batch
+                number += len(batch)
+
+        if pool is None:
+            for number, batch in batches():
+                yield number, len(batch), *_validate_batch(importer, number, batch)
+            return
+
+        pending = deque()
+        for number, batch in batches():
+            pending.append((number, len(batch), pool.apply_async(_validate_in_worker, (number, batch))))
+            if len(pending) >= 2 * jobs:
+                number, count, result = pending.popleft()
+                yield number, count, *result.get()
+        while pending:
+            number, count, result = pending.popleft()
+            yield number, count, *result.get()
+
+    def write_checkpoint(self, path, state):
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, path)  # atomic: a crash leaves the old or the new checkpoint, never half of one
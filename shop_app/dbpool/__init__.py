@@ -0,0 +1 @@
+# Database engine: django_db_geventpool's PostgreSQL pool with checkout timeouts and statistics (see base.py)
@@ -0,0 +1,161 @@
+"""
+django_db_geventpool's PostgreSQL engine with two additions:
+
+- `OPTIONS['CHECKOUT_TIMEOUT']`: seconds a request waits for a free connection once
+  `MAX_CONNS` are in use. It then fails with PoolCheckoutTimeout (a 503 through the
+  views) instead of waiting forever. None keeps the unbounded wait.
+- `pool_stats()`: per alias, connections open / in use / idle, greenlets waiting,
+  checkouts, waits and timeouts, and a rolling window of checkout wait times.
+- `recent_pool_wait()`: the average wait of the recent checkouts, for load shedding
+  (shop_app/throttling.py).
+
+The pool is meant for gevent (shop/gevent_patch.py): its gevent locks and queue are not
+safe between native threads.
+"""
+import collections
+import threading
+import time
+
+import psycopg2
+from django_db_geventpool.backends.postgresql_psycopg2 import base
+from gevent import Timeout, queue
+from gevent.event import AsyncResult
+
+
+RECENT_WAIT_ALPHA = 0.1  # weight of each checkout
+RECENT_WAIT_DECAY = 5    # seconds; the average decays when there are no checkouts
+
+
+class PoolCheckoutTimeout(psycopg2.OperationalError):
+    """No pooled connection became free within CHECKOUT_TIMEOUT."""
+
+
+class InstrumentedConnectionPool(base.PostgresConnectionPool):
+
+    def __init__(self, *args, **kwargs):
+        # Not a libpq parameter: take it out before the rest is passed to psycopg2.connect()
+        self.checkout_timeout = kwargs.pop('CHECKOUT_TIMEOUT', None)
+        super().__init__(*args, **kwargs)
+        # Imported here: the engine module is loaded before the app registry is ready
+        from shop_app.task_metrics import DecayingAverage, RollingWindow, metrics_setting
+
+        # A plain threading lock (a gevent one once patched): only guards the counters
+        self.stats_lock = threading.Lock()
+        self.waiters = collections.deque()
+        self.counters = {'waiting': 0, 'connecting': 0, 'checkouts': 0, 'waited': 0, 'timeouts': 0, 'connects': 0}
+        self.wait = RollingWindow(metrics_setting('WINDOW', 300), metrics_setting('MAX_SAMPLES', 10000))
+        # Average wait of the recent checkouts (0 when a connection was free): load shedding's signal
+        self.recent_wait = DecayingAverage(RECENT_WAIT_ALPHA, RECENT_WAIT_DECAY)
+
+    def get(self):
+        # Same policy as DatabaseConnectionPool.get(): reuse an idle connection, open a new one
+        # below MAX_CONNS, otherwise wait for one to be returned - here for at most checkout_timeout.
+        # Connections being opened count towards MAX_CONNS: connecting yields to other greenlets,
+        # which would otherwise all see room and open one each.
+        # Waiting is first come, first served: put() hands a returned connection straight to the
+        # oldest waiter, so there is never an idle one for a new arrival to take first. Through
+        # gevent's queue the woken waiter runs too late to get it, and under steady load waiters
+        # starve into timeouts however short the checkouts are.
+        started = time.monotonic()
+        must_wait = not self.pool.qsize() and self.open_count() >= self.maxsize
+        conn = self.wait_turn() if must_wait else None
+        if conn is None:
+            try:
+                conn = self.pool.get_nowait()
+            except queue.Empty:
+                pass
+
+        if conn is not None:
+            try:
+                self.check_usable(conn)
+            except self.DBERROR:
+                self._conns.discard(conn)
+                conn = None
+        if conn is None:
+            self.count('connecting', 1)
+            try:
+                conn = self.create_connection()
+            finally:
+                self.count('connecting', -1)
+            self._conns.add(conn)
+            self.count('connects')
+
+        now = time.monotonic()
+        with self.stats_lock:
+            self.counters['checkouts'] += 1
+            self.recent_wait.add(now - started if must_wait else 0.0, now)
+            if must_wait:
+                self.counters['waited'] += 1
+                self.wait.add(now - started, now)
+        return conn
+
+    def wait_turn(self):
+        waiter = AsyncResult()
+        self.waiters.append(waiter)
+        self.count('waiting', 1)
+        try:
+            return waiter.get(timeout=self.checkout_timeout)
+        except Timeout:
+            if waiter.ready():  # handed over as the timeout fired
+                return waiter.value
+            self.count('timeouts')
+            raise PoolCheckoutTimeout(
+                f"No database connection free within {self.checkout_timeout}s ({self.maxsize} in use)"
+            )
+        finally:
+            self.count('waiting', -1)
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    def put(self, item):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.ready():
+                waiter.set(item)
+                return
+        super().put(item)
+
+    def open_count(self):
+        return len(self._conns) + self.counters['connecting']
+
+    def count(self, name, delta=1):
+        with self.stats_lock:
+            self.counters[name] += delta
+
+    def snapshot(self):
+        size, idle = self.open_count(), self.pool.qsize()
+        with self.stats_lock:
+            return {
+                'max': self.maxsize,
+                'open': size,
+                'in_use': max(0, size - idle),
+                'idle': idle,
+                'checkout_timeout': self.checkout_timeout,
+                **self.counters,
+                'wait': self.wait.summary(time.monotonic()),
+                'recent_wait': self.recent_wait.get(time.monotonic()),
+            }
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # OPTIONS (MAX_CONNS, REUSE_CONNS, CHECKOUT_TIMEOUT included) reach the pool as keyword arguments
+    pool_class = InstrumentedConnectionPool
+
+
+def pool_stats():
+    """{alias: snapshot} for the pools this process has opened."""
+    return {
+        alias: pool.snapshot()
+        for alias, pool in DatabaseWrapper._connection_pools.items()
+        if isinstance(pool, InstrumentedConnectionPool)
+    }
+
+
+def recent_pool_wait():
+    """The longest recent average checkout wait (seconds) of this process's pools."""
+    now = time.monotonic()
+    return max(
+        (pool.recent_wait.get(now) for pool in DatabaseWrapper._connection_pools.values()
+         if isinstance(pool, InstrumentedConnectionPool)),
+        default=0.0,
+    )
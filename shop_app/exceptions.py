@@ -1,11 +1,27 @@
 from rest_framework.views import exception_handler
+from rest_framework.exceptions import APIException
 from rest_framework.response import Response
 from rest_framework import status
 import logging
 
+from .dbpool.base import PoolCheckoutTimeout
+
 logger = logging.getLogger(__name__)
 
+
+def raised_from(exc, exc_types):
+    """The first exception of `exc_types` in `exc`'s cause/context chain (views re-raise as APIException), or None."""
+    seen = 0
+    while exc is not None and seen < 10:
+        if isinstance(exc, exc_types):
+            return exc
+        exc, seen = exc.__cause__ or exc.__context__, seen + 1
+    return None
+
+
 def custom_exception_handler(exc, context):
+    if raised_from(exc, PoolCheckoutTimeout):
+        exc = DatabaseBusy()
     response = exception_handler(exc, context)
 
     if response is not None:
@@ -16,7 +32,9 @@ def custom_exception_handler(exc, context):
             'error': True,
             'message': response.data,
         }
-        return Response(customized_response, status=response.status_code)
+        # Keep the headers DRF set (Retry-After, WWW-Authenticate)
+        headers = {name: response[name] for name in ('Retry-After', 'WWW-Authenticate') if response.has_header(name)}
+        return Response(customized_response, status=response.status_code, headers=headers)
 
     # If DRF didn't handle it, return a generic 500
     return Response({
@@ -24,3 +42,54 @@ def custom_exception_handler(exc, context):
         'error': True,
         'message': 'Internal server error',
     }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class InsufficientStock(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Insufficient stock.'
+    default_code = 'insufficient_stock'
+
+    def __init__(self, failed):
+        super().__init__()
+        # `failed` lists the order lines that could not be applied; kept as-is so
+        # quantities stay numbers in the response
+        self.detail = {'detail': self.detail, 'failed': failed}
+
+
+class HashingPoolSaturated(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-ins in progress, please retry shortly.'
+    default_code = 'hashing_saturated'
+    wait = 1  # seconds, sent as Retry-After
+
+
+class DatabaseBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The database is busy, please retry shortly.'
+    default_code = 'database_busy'
+    wait = 1  # seconds, sent as Retry-After
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is still in progress, please retry shortly.'
+    default_code = 'idempotency_key_in_use'
+    wait = 1  # seconds, sent as Retry-After
+
+
+class IdempotencyKeyMismatch(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used for a different request.'
+    default_code = 'idempotency_key_mismatch'
+
+
+class ServiceOverloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The service is overloaded, please retry shortly.'
+    default_code = 'overloaded'
+    wait = 1  # seconds, sent as Retry-After
+
+    def __init__(self, wait=None):
+        super().__init__()
+        if wait is not None:
+            self.wait = wait
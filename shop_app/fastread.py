@@ -0,0 +1,121 @@
+# fastread.py
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import BasePermission
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+
+from .perf import timed
+from .renderers import FastJSONRenderer
+
+_row_converters = {}
+
+
+def _decimal_converter(field):
+    # Same output as serializers.DecimalField.to_representation with COERCE_DECIMAL_TO_STRING
+    exponent = Decimal(1).scaleb(-field.decimal_places)
+    return lambda value: '{:f}'.format(value.quantize(exponent))
+
+
+def _date_converter(field):
+    return lambda value: value.isoformat()
+
+
+def build_row_converter(serializer_class, fields=None):
+    """
+    Compile a `.values()` row -> representation function for a plain ModelSerializer,
+    optionally limited to `fields` (in that order).
+
+    Only serializers whose readable fields are model columns of the same name qualify
+    (no `source=`, method, nested or datetime fields); anything else raises
+    ImproperlyConfigured, so the fast path can never drift from the serializer.
+    """
+    model = serializer_class.Meta.model
+    serializer_fields = serializer_class().fields
+    pairs = []
+    for name in fields or serializer_fields:
+        serializer_field = serializer_fields[name]
+        if serializer_field.write_only:
+            continue
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            field = None
+        if (field is None or serializer_field.source != name or not field.concrete or field.is_relation
+                or isinstance(field, models.DateTimeField)):
+            raise ImproperlyConfigured(f"{serializer_class.__name__}.{name} cannot be served by the fast read path.")
+        if isinstance(field, models.DecimalField):
+            pairs.append((name, _decimal_converter(field)))
+        elif isinstance(field, models.DateField):
+            pairs.append((name, _date_converter(field)))
+        else:
+            pairs.append((name, None))
+    pairs = tuple(pairs)
+
+    def convert(row):
+        return {
+            name: row[name] if converter is None or row[name] is None else converter(row[name])
+            for name, converter in pairs
+        }
+
+    convert.fields = tuple(name for name, _ in pairs)
+    return convert
+
+
+def get_row_converter(serializer_class, fields=None):
+    key = (serializer_class, tuple(fields) if fields else None)
+    if key not in _row_converters:
+        _row_converters[key] = build_row_converter(serializer_class, fields)
+    return _row_converters[key]
+
+
+class FastReadMixin:
+    """
+    Serves `list` and `retrieve` from `.values()` rows converted by a precompiled
+    per-serializer converter and rendered with orjson, instead of building model
+    instances and running ModelSerializer.to_representation field by field. The JSON
+    is byte-for-byte what the serializer path returns.
+
+    The view's `serializer_class` defines the output; other actions are unaffected.
+    Views with object-level permissions fall back to the normal retrieve.
+    """
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def get_fast_rows(self):
+        convert = get_row_converter(self.get_serializer_class())
+        queryset = self.filter_queryset(self.get_queryset())
+        # Annotations the paginator orders by (e.g. search_rank) must be in the row for the cursor
+        extra = [name for name in queryset.query.annotations if name not in convert.fields]
+        return convert, queryset.values(*convert.fields, *extra)
+
+    def list(self, request, *args, **kwargs):
+        convert, rows = self.get_fast_rows()
+        page = self.paginate_queryset(rows)
+        with timed('serializer'):
+            data = [convert(row) for row in (rows if page is None else page)]
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def uses_object_permissions(self):
+        return any(type(permission).has_object_permission is not BasePermission.has_object_permission
+                   for permission in self.get_permissions())
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.uses_object_permissions():
+            return super().retrieve(request, *args, **kwargs)
+
+        convert, rows = self.get_fast_rows()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            row = rows.filter(**{self.lookup_field: kwargs[lookup_url_kwarg]}).first()
+        except (TypeError, ValueError, DjangoValidationError):
+            row = None
+        if row is None:
+            raise NotFound()
+        with timed('serializer'):
+            return Response(convert(row))
@@ -0,0 +1,53 @@
+# filters.py
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+SCHEMA_TYPES = {
+    'DecimalField': {'type': 'number'},
+    'PositiveIntegerField': {'type': 'integer'},
+    'DateField': {'type': 'string', 'format': 'date'},
+}
+
+
+class FieldLookupFilter(BaseFilterBackend):
+    """
+    Declarative query-string filters. The view's `query_filter_fields` maps a model field
+    to the lookups clients may use:
+
+        query_filter_fields = {'price': ['gte', 'lte'], 'author': ['exact']}
+
+    accepts `?price__gte=10&price__lte=99.50&author=Tagore` ('exact' is the bare field
+    name). Values are parsed with the model field, so bad input is a 400, not a 500.
+    Every whitelisted field is backed by a B-tree index (see the model Meta.indexes).
+    """
+
+    def get_params(self, view):
+        for field_name, lookups in getattr(view, 'query_filter_fields', {}).items():
+            for lookup in lookups:
+                yield field_name, (field_name if lookup == 'exact' else f'{field_name}__{lookup}')
+
+    def filter_queryset(self, request, queryset, view):
+        filters = {}
+        for field_name, param in self.get_params(view):
+            value = request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                filters[param] = queryset.model._meta.get_field(field_name).to_python(value)
+            except DjangoValidationError as e:
+                raise ValidationError({param: e.messages})
+        return queryset.filter(**filters) if filters else queryset
+
+    def get_schema_operation_parameters(self, view):
+        model = view.get_queryset().model
+        return [
+            {
+                'name': param,
+                'required': False,
+                'in': 'query',
+                'description': f"Filter on `{field_name}`" + ('' if param == field_name else f" ({param.split('__')[1]})") + '.',
+                'schema': SCHEMA_TYPES.get(model._meta.get_field(field_name).get_internal_type(), {'type': 'string'}),
+            }
+            for field_name, param in self.get_params(view)
+        ]
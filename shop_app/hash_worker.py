@@ -0,0 +1,22 @@
+# hash_worker.py
+# Runs inside the PasswordHashPool processes (shop_app/hashing.py). Spawned workers
+# unpickle these functions by importing this module, so it must not import models.
+import os
+import threading
+import time
+
+
+def init_worker(parent_pid):
+    def watch_parent():
+        # A worker outliving its server (SIGKILL, OOM) would otherwise sit idle forever
+        while os.getppid() == parent_pid:
+            time.sleep(1)
+        os._exit(0)
+
+    threading.Thread(target=watch_parent, daemon=True).start()
+
+
+def timed_call(fn, *args):
+    started = time.time()
+    result = fn(*args)
+    return started, time.time(), result
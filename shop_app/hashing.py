@@ -0,0 +1,211 @@
+# hashing.py
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+
+from .exceptions import HashingPoolSaturated
+from .hash_worker import init_worker, timed_call
+from .task_metrics import RollingWindow, metrics_setting
+
+logger = logging.getLogger(__name__)
+
+
+def hashing_setting(name, default=None):
+    return getattr(settings, 'PASSWORD_HASHING', {}).get(name, default)
+
+
+def gevent_patched():
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+class PasswordHashPool:
+    """
+    Runs password hashing and verification (PBKDF2: tens of ms of CPU each) on at most
+    `WORKERS` processes, so a login storm cannot take every core away from catalog reads.
+
+    At most `WORKERS + QUEUE_SIZE` calls are in flight per server process; a call that
+    cannot get a slot within `ACQUIRE_TIMEOUT` seconds raises HashingPoolSaturated (503
+    with Retry-After) instead of queueing. `EXECUTOR` is 'process' (spawned on first use,
+    so they inherit no sockets or database connections from the server), 'thread' (for
+    gevent workers; hashlib's PBKDF2 releases the GIL) or 'inline' (no pool, the old
+    behaviour).
+    Queue wait (submit -> start in the pool) and hash time are kept as rolling windows.
+    """
+
+    def __init__(self, executor=None, workers=None, queue_size=None, acquire_timeout=None):
+        self.kind = executor or hashing_setting('EXECUTOR', 'process')
+        self.workers = workers or hashing_setting('WORKERS', 2)
+        self.queue_size = hashing_setting('QUEUE_SIZE', 16) if queue_size is None else queue_size
+        self.acquire_timeout = hashing_setting('ACQUIRE_TIMEOUT', 0.05) if acquire_timeout is None else acquire_timeout
+        self.slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self.lock = threading.Lock()
+        self.executor = None
+        self.wait = RollingWindow(metrics_setting('WINDOW', 300), metrics_setting('MAX_SAMPLES', 10000))
+        self.run = RollingWindow(metrics_setting('WINDOW', 300), metrics_setting('MAX_SAMPLES', 10000))
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                if self.kind == 'thread' and gevent_patched():
+                    # Patched threads are greenlets: hashing on one would stall the whole process
+                    from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+                    self.executor = NativeThreadPoolExecutor(self.workers)
+                elif self.kind == 'thread':
+                    self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password-hash')
+                else:
+                    self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                                        initializer=init_worker, initargs=(os.getpid(),))
+            return self.executor
+
+    def call(self, fn, *args):
+        if self.kind == 'inline':
+            return fn(*args)
+        if not self.slots.acquire(timeout=self.acquire_timeout):
+            self._reject()
+        submitted = self._enter()
+        try:
+            executor = self.get_executor()
+            try:
+                timings = executor.submit(timed_call, fn, *args).result()
+            except BrokenProcessPool:
+                self._reset(executor)
+                timings = self.get_executor().submit(timed_call, fn, *args).result()
+        finally:
+            self._leave()
+        return self._record(submitted, *timings)
+
+    async def acall(self, fn, *args):
+        """call() for async views: waits for a slot and for the result without blocking the event loop."""
+        if self.kind == 'inline':
+            return await sync_to_async(fn, thread_sensitive=False)(*args)
+        deadline = time.monotonic() + self.acquire_timeout
+        while not self.slots.acquire(blocking=False):
+            if time.monotonic() >= deadline:
+                self._reject()
+            await asyncio.sleep(0.005)
+        submitted = self._enter()
+        try:
+            executor = self.get_executor()
+            try:
+                timings = await asyncio.wrap_future(executor.submit(timed_call, fn, *args))
+            except BrokenProcessPool:
+                self._reset(executor)
+                timings = await asyncio.wrap_future(self.get_executor().submit(timed_call, fn, *args))
+        finally:
+            self._leave()
+        return self._record(submitted, *timings)
+
+    def _reject(self):
+        with self.lock:
+            self.rejected += 1
+        raise HashingPoolSaturated()
+
+    def _enter(self):
+        with self.lock:
+            self.in_flight += 1
+        return time.time()
+
+    def _leave(self):
+        self.slots.release()
+        with self.lock:
+            self.in_flight -= 1
+
+    def _reset(self, broken):
+        # A worker died (e.g. OOM-killed); the next submit starts a fresh pool. Only the
+        # first caller to see `broken` replaces it, and its threads and processes are released
+        with self.lock:
+            if self.executor is not broken:
+                return
+            self.executor = None
+        logger.warning("Password hashing pool broken, restarting it")
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _record(self, submitted, started, finished, result):
+        with self.lock:
+            self.wait.add(max(0.0, started - submitted), finished)
+            self.run.add(finished - started, finished)
+            self.completed += 1
+        return result
+
+    def snapshot(self):
+        now = time.time()
+        with self.lock:
+            return {
+                'executor': self.kind,
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'wait': self.wait.summary(now),
+                'run': self.run.summary(now),
+            }
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+hash_pool = PasswordHashPool()
+
+
+def hash_password(raw_password):
+    return hash_pool.call(make_password, raw_password)
+
+
+def verify_password(raw_password, encoded):
+    return hash_pool.call(check_password, raw_password, encoded)
+
+
+async def ahash_password(raw_password):
+    return await hash_pool.acall(make_password, raw_password)
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend with the password check (and the upgrade re-hash) done on `hash_pool`."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway, so unknown usernames take as long as wrong passwords
+            hash_password(password)
+            return None
+        if not user.password or not verify_password(password, user.password):
+            return None
+
+        # What check_password's setter does: re-hash with the preferred hasher/iterations
+        preferred = get_hasher('default')
+        try:
+            outdated = identify_hasher(user.password).algorithm != preferred.algorithm or preferred.must_update(user.password)
+        except ValueError:
+            outdated = False
+        if outdated:
+            user.password = hash_password(password)
+            user.save(update_fields=['password'])
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,159 @@
+"""
+`Idempotency-Key` on create endpoints: a client retrying a POST (after a timeout, say)
+gets the first response back instead of a second write attempt.
+
+The first request with a key runs the create and stores its response, keyed by user +
+key with a keyed hash of the request, for IDEMPOTENCY['TTL'] seconds. The row is written in
+the create's own transaction, so it exists exactly when the created object does. A retry
+with the same key and body replays the stored response (`Idempotent-Replayed: true`)
+without touching the models; the same key with a different body is a 422.
+
+A duplicate arriving while the first request is still running waits on a transaction
+level advisory lock on the key - at most IDEMPOTENCY['LOCK_TIMEOUT'] seconds, then a 409
+to retry - and replays the response once the first commits. Only 2xx responses are
+stored: if the first request failed, the duplicate runs the create itself.
+
+Expired rows are never replayed. Each process deletes them in batches through the
+`expires_at` index, at most once every IDEMPOTENCY['PURGE_INTERVAL'] seconds.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import OperationalError, connection, transaction
+from django.utils import timezone
+from drf_yasg import openapi
+from psycopg2 import errors
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .exceptions import IdempotencyKeyInUse, IdempotencyKeyMismatch, raised_from
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+
+IDEMPOTENCY_PARAMETERS = [
+    openapi.Parameter(HEADER, openapi.IN_HEADER, type=openapi.TYPE_STRING, required=False,
+                      description="Retries with the same key and body replay the first response instead of creating again."),
+]
+
+
+def idempotency_setting(name, default=None):
+    return getattr(settings, 'IDEMPOTENCY', {}).get(name, default)
+
+
+def request_hash(request):
+    """
+    HMAC-SHA256, keyed with SECRET_KEY, of method, path and the parsed body (key order and
+    whitespace do not matter). Keyed because the body can hold a password: a plain hash
+    of it in the table could be brute-forced offline.
+    """
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder)
+    message = f'{request.method} {request.path}\n{body}'.encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def lock_key(scope, key):
+    return int.from_bytes(hashlib.sha256(f'{scope}\n{key}'.encode()).digest()[:8], 'big', signed=True)
+
+
+def acquire(scope, key):
+    """Take the key's advisory lock for the rest of the transaction, waiting for a duplicate in flight."""
+    lock_id = lock_key(scope, key)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", [lock_id])
+        if cursor.fetchone()[0]:
+            return
+        cursor.execute("SELECT current_setting('lock_timeout')")
+        previous = cursor.fetchone()[0]
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", [f"{int(idempotency_setting('LOCK_TIMEOUT', 10) * 1000)}ms"])
+        try:
+            with transaction.atomic():  # a savepoint: the timeout must not abort the request's transaction
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [lock_id])
+        except OperationalError as e:
+            if raised_from(e, errors.LockNotAvailable):
+                raise IdempotencyKeyInUse()
+            raise
+        finally:
+            cursor.execute("SELECT set_config('lock_timeout', %s, true)", [previous])
+
+
+class ExpiredKeyPurger:
+    """Deletes expired IdempotencyKey rows, one batch at most every PURGE_INTERVAL seconds."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next_run = 0.0
+
+    def purge_if_due(self):
+        if time.monotonic() < self.next_run or not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.next_run = time.monotonic() + idempotency_setting('PURGE_INTERVAL', 60)
+            deleted = self.purge(idempotency_setting('PURGE_BATCH', 5000))
+            if deleted:
+                logger.info("Deleted %d expired idempotency keys", deleted)
+        except Exception:
+            logger.exception("Deleting expired idempotency keys failed")
+        finally:
+            self.lock.release()
+
+    @staticmethod
+    def purge(batch_size):
+        expired = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).order_by('expires_at')
+        deleted, _ = IdempotencyKey.objects.filter(pk__in=expired.values('pk')[:batch_size]).delete()
+        return deleted
+
+
+purger = ExpiredKeyPurger()
+
+
+class IdempotentCreateMixin:
+    """
+    Honour the `Idempotency-Key` header on `create` (see the module docstring). Keys are
+    scoped to the authenticated user; anonymous sign-ups share one scope, where the
+    request hash keeps a key from replaying someone else's different request.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return super().create(request, *args, **kwargs)
+        if not key or len(key) > 255:
+            raise ValidationError({HEADER: "Must be 1 to 255 characters."})
+
+        scope = f'user:{request.user.pk}' if request.user.is_authenticated else 'anonymous'
+        fingerprint = request_hash(request)
+        with transaction.atomic():
+            acquire(scope, key)
+            stored = IdempotencyKey.objects.filter(scope=scope, key=key, expires_at__gt=timezone.now()).first()
+            if stored is not None:
+                if stored.request_hash != fingerprint:
+                    raise IdempotencyKeyMismatch()
+                logger.info("Replaying the response stored for %s %s", HEADER, key)
+                return Response(stored.response, status=stored.status_code, headers={'Idempotent-Replayed': 'true'})
+
+            response = super().create(request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                now = timezone.now()
+                IdempotencyKey.objects.update_or_create(  # replaces an expired row with the same key
+                    scope=scope, key=key,
+                    defaults={
+                        'request_hash': fingerprint,
+                        'status_code': response.status_code,
+                        'response': response.data,
+                        'created_at': now,
+                        'expires_at': now + timedelta(seconds=idempotency_setting('TTL', 86400)),
+                    },
+                )
+            transaction.on_commit(purger.purge_if_due)
+        return response
@@ -0,0 +1,419 @@
+# logs.py
+import atexit
+import glob
+import gzip
+import json
+import logging
+import logging.config
+import logging.handlers
+import os
+import queue
+import random
+import re
+import shutil
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+# Loaded by django.setup() (LOGGING_CONFIG), before the app registry: no model imports here
+
+_request = ContextVar('log_request', default=None)
+access_logger = logging.getLogger('shop_app.access')
+
+REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+# LogRecord attributes; everything else on a record came in through `extra=`
+RECORD_FIELDS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id', 'route'}
+
+
+def logging_setting(name, default=None):
+    return getattr(settings, 'REQUEST_LOGGING', {}).get(name, default)
+
+
+class RequestLogState:
+    """The request a log record was written for. Route and sampling are resolved on the first record."""
+
+    def __init__(self, request_id, request):
+        self.id = request_id
+        self.request = request
+        self.route = None
+        self.sampled = None
+
+    def get_route(self):
+        if self.route is None:
+            match = getattr(self.request, 'resolver_match', None)
+            if match is not None:
+                self.route = match.view_name
+        return self.route
+
+    def is_sampled(self):
+        route = self.get_route()
+        if route is None:
+            return True  # before URL resolution (middleware): not attributable to a route yet
+        if self.sampled is None:
+            self.sampled = random.random() < logging_setting('SAMPLE_RATES', {}).get(route, 1.0)
+        return self.sampled
+
+
+class RateLimiter:
+    """Token bucket per route: `RATE_LIMITS[route]` success records per second, bursting to as many."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def allow(self, route):
+        rate = logging_setting('RATE_LIMITS', {}).get(route)
+        if rate is None:
+            return True
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(route, (rate, now))
+            tokens = min(rate, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            self.buckets[route] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Runs on the thread that logs, before a record is formatted or queued. Stamps the
+    request id and route, and drops success records (below WARNING) of requests that
+    were not sampled (`SAMPLE_RATES`) or past their route's `RATE_LIMITS`. Warnings
+    and errors are always kept.
+    """
+
+    def __init__(self, pipeline):
+        super().__init__()
+        self.pipeline = pipeline
+        self.rate_limiter = RateLimiter()
+
+    def filter(self, record):
+        state = _request.get()
+        if state is None:
+            record.request_id = record.route = None
+            return True
+        record.request_id, record.route = state.id, state.get_route()
+        if record.levelno >= logging.WARNING:
+            return True
+        if not state.is_sampled():
+            self.pipeline.count('sampled_out')
+            return False
+        if record.route is not None and not self.rate_limiter.allow(record.route):
+            self.pipeline.count('rate_limited')
+            return False
+        return True
+
+
+class PipelineQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks a request on a full queue for success records."""
+
+    def __init__(self, pipeline):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+
+    def prepare(self, record):
+        # Render the message and traceback here (the arguments may change after this call
+        # returns), but keep them apart so JSONFormatter can emit them as separate fields.
+        # No copy: on the root logger this is the last handler to see the record.
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if record.levelno >= logging.WARNING:
+            try:
+                self.queue.put(record, timeout=1)
+                return
+            except queue.Full:
+                pass
+        self.pipeline.count('dropped')
+
+
+class PipelineListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)  # waits for room while the listener drains a full queue
+
+
+class LogPipeline:
+    """
+    Moves the root logger's handlers (file, console) behind a bounded queue drained by
+    one listener thread, so formatting to disk, rotation and compression never run on
+    a request thread. Loggers with handlers of their own are left alone; give them
+    `'propagate': True` and no handlers to route them through the pipeline.
+
+    A forked child (runworkers --processes) gets a fresh queue and listener.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queue = None
+        self.handler = None
+        self.listener = None
+        self.targets = ()
+        self.counters = {'dropped': 0, 'sampled_out': 0, 'rate_limited': 0}
+
+    def install(self, logger=None):
+        logger = logger or logging.getLogger()
+        self.stop()
+        self.targets = tuple(handler for handler in logger.handlers if not isinstance(handler, PipelineQueueHandler))
+        self.queue = queue.Queue(logging_setting('QUEUE_SIZE', 10000))
+        self.handler = PipelineQueueHandler(self)
+        self.handler.addFilter(SamplingFilter(self))
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(self.handler)
+        self.start()
+
+    def start(self):
+        self.listener = PipelineListener(self.queue, *self.targets, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()  # drains what is queued
+            self.listener = None
+
+    def after_fork(self):
+        if self.listener is not None:
+            self.queue = self.handler.queue = queue.Queue(logging_setting('QUEUE_SIZE', 10000))
+            self.start()
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+        return {'queued': self.queue.qsize() if self.queue is not None else 0, **counters}
+
+
+log_pipeline = LogPipeline()
+atexit.register(log_pipeline.stop)
+os.register_at_fork(after_in_child=log_pipeline.after_fork)
+
+
+def configure_logging(config):
+    """LOGGING_CONFIG: dictConfig(LOGGING), then put the root logger's handlers behind `log_pipeline`."""
+    logging.config.dictConfig(config)
+    if logging_setting('ENABLED', True):
+        log_pipeline.install()
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, request_id, route, `extra=` fields, exc."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for name in ('request_id', 'route'):
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        for name, value in record.__dict__.items():
+            if name not in RECORD_FIELDS and not name.startswith('_'):
+                entry[name] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        if orjson is not None:
+            try:
+                return orjson.dumps(entry, default=str).decode()
+            except TypeError:
+                pass  # e.g. non-str dict keys in an extra field
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class CompressedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rotates when the file reaches `maxBytes` or at the next multiple of `interval`
+    seconds (UTC; 86400 = daily at midnight), whichever comes first. The rotated file
+    is gzipped to `<file>.<YYYYmmdd-HHMMSS>.gz` and only the newest `backupCount` are
+    kept. A file left over from an earlier interval is rotated on the first write.
+
+    Rotation is not coordinated between processes. With `per_process`, which several
+    processes logging to one path need (web workers, `runworkers --processes`), every
+    process writes `<name>.<pid><ext>` instead - a forked child switches to its own on its
+    first record - and `backupCount` counts the rotated files of all processes together.
+    Files of processes that are gone are rotated by the next process to start.
+    """
+
+    def __init__(self, filename, maxBytes=0, interval=86400, backupCount=7, encoding='utf-8', delay=True, per_process=False):
+        self.path = os.path.abspath(os.fspath(filename))
+        self.per_process = per_process
+        self.pid = os.getpid()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        super().__init__(self.process_filename(), maxBytes=maxBytes, backupCount=backupCount, encoding=encoding, delay=delay)
+        self.interval = interval
+        started = os.path.getmtime(self.baseFilename) if os.path.exists(self.baseFilename) else time.time()
+        self.rollover_at = self.next_rollover(started)
+        if per_process:
+            self.rotate_orphans()
+
+    def process_filename(self):
+        if not self.per_process:
+            return self.path
+        root, ext = os.path.splitext(self.path)
+        return f'{root}.{self.pid}{ext}'
+
+    def next_rollover(self, now):
+        return (int(now) // self.interval + 1) * self.interval if self.interval else float('inf')
+
+    def emit(self, record):
+        if self.per_process and os.getpid() != self.pid:
+            self.after_fork()
+        super().emit(record)
+
+    def after_fork(self):
+        if self.stream:
+            self.stream.close()  # the parent's file; closing our copy leaves the parent's open
+            self.stream = None
+        self.pid = os.getpid()
+        self.baseFilename = self.process_filename()
+        self.rollover_at = self.next_rollover(time.time())
+
+    def shouldRollover(self, record):
+        if time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self.compress(self.baseFilename)
+        self.rollover_at = self.next_rollover(time.time())
+        if not self.delay:
+            self.stream = self._open()
+
+    def compress(self, filename):
+        if os.path.exists(filename) and os.path.getsize(filename):
+            stamp = time.strftime('%Y%m%d-%H%M%S', time.gmtime())
+            target, n = f'{filename}.{stamp}', 1
+            while os.path.exists(f'{target}.gz'):
+                target, n = f'{filename}.{stamp}-{n}', n + 1
+            os.rename(filename, target)
+            with open(target, 'rb') as source, gzip.open(f'{target}.gz', 'wb') as compressed:
+                shutil.copyfileobj(source, compressed)
+            os.remove(target)
+        self.prune()
+
+    def prune(self):
+        if self.per_process:
+            root, ext = os.path.splitext(self.path)
+            rotated = glob.glob(f'{glob.escape(root)}.*{glob.escape(ext)}.*.gz')  # every process's
+        else:
+            rotated = glob.glob(f'{glob.escape(self.path)}.*.gz')
+        try:
+            for old in sorted(rotated, key=lambda name: (os.path.getmtime(name), name))[:-self.backupCount or None]:
+                os.remove(old)
+        except FileNotFoundError:
+            pass  # another process is pruning; it removes the rest
+
+    def rotate_orphans(self):
+        """Rotate the files of processes that exited without rotating them."""
+        root, ext = os.path.splitext(self.path)
+        for filename in glob.glob(f'{glob.escape(root)}.*{glob.escape(ext)}'):
+            pid = filename[len(root) + 1:len(filename) - len(ext)]
+            if not pid.isdigit() or int(pid) == self.pid or process_alive(int(pid)):
+                continue
+            try:
+                self.compress(filename)
+            except FileNotFoundError:
+                pass  # another process starting at the same time got it first
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class RequestLogMiddleware:
+    """
+    Gives every request an id (a valid incoming `X-Request-ID`, else a new one), stamped
+    on its log records and returned in the `X-Request-ID` header, and writes one access
+    record per request to `shop_app.access`: INFO (sampled like any success record)
+    below 400, WARNING from 400 on.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _request.set(state)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            return self.finish(request, response, state, time.perf_counter() - started)
+        finally:
+            _request.reset(token)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = _request.set(state)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            return self.finish(request, response, state, time.perf_counter() - started)
+        finally:
+            _request.reset(token)
+
+    def start(self, request):
+        request_id = request.headers.get('X-Request-ID', '')
+        if not REQUEST_ID.match(request_id):
+            # Not uuid4(): os.urandom can cost hundreds of microseconds in a VM, and an
+            # id needs no cryptographic randomness (random reseeds itself after fork)
+            request_id = f'{random.getrandbits(128):032x}'
+        return RequestLogState(request_id, request)
+
+    def finish(self, request, response, state, duration):
+        response['X-Request-ID'] = state.id
+        if logging_setting('ACCESS_LOG', True):
+            level = logging.INFO if response.status_code < 400 else logging.WARNING
+            if access_logger.isEnabledFor(level):
+                access_logger.log(level, "%s %s %s", request.method, request.path, response.status_code, extra={
+                    'method': request.method, 'path': request.path, 'status': response.status_code,
+                    'duration_ms': round(duration * 1000, 2),
+                })
+        return response
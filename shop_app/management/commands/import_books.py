@@ -0,0 +1,9 @@
+from shop_app.catalog_import import ImportCommand
+from shop_app.serializers import BookBulkSerializer
+
+
+class Command(ImportCommand):
+    help = "Load books from a CSV/NDJSON feed with COPY and upsert them by (title, author)."
+    serializer_class = BookBulkSerializer
+    key_fields = ('title', 'author')
+    cache_namespace = 'book'
@@ -0,0 +1,9 @@
+from shop_app.catalog_import import ImportCommand
+from shop_app.serializers import ProductBulkSerializer
+
+
+class Command(ImportCommand):
+    help = "Load products from a CSV/NDJSON feed with COPY and upsert them by SKU."
+    serializer_class = ProductBulkSerializer
+    key_fields = ('sku',)
+    cache_namespace = 'product'
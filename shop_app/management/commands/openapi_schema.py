@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from shop_app.openapi import code_version, write_schema
+
+
+class Command(BaseCommand):
+    help = "Generate the OpenAPI schema into OPENAPI_SCHEMA['DIR'] for the current code version (run at deploy)."
+
+    def handle(self, *args, **options):
+        for path in write_schema():
+            self.stdout.write(f"Wrote {path}")
+        self.stdout.write(f"Code version {code_version()}")
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop_app.task import queue_setting, run_workers
+
+
+class Command(BaseCommand):
+    help = "Run the background task workers. Web processes only enqueue; this process owns the pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engine', choices=['thread', 'asyncio', 'gevent'], default='thread',
+                            help="'thread': one task per worker thread. 'asyncio': many concurrent tasks on an event loop. "
+                                 "'gevent': many concurrent plain tasks on greenlets (monkey-patched process).")
+        parser.add_argument('--threads', type=int, default=None,
+                            help="Worker threads per process for the default queue (default: TASK_QUEUE['WORKERS']).")
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help="asyncio/gevent engines: concurrent tasks per process for the default queue "
+                                 "(default: TASK_QUEUE['ASYNC_CONCURRENCY']).")
+        parser.add_argument('--processes', type=int, default=1,
+                            help="Number of worker processes to fork (default: 1).")
+        parser.add_argument('--queue', action='append', default=[], metavar='NAME[:THREADS]',
+                            help="Queue to consume, optionally with its own thread count (concurrency for asyncio/gevent). "
+                                 "Can be repeated.")
+
+    def handle(self, *args, **options):
+        if options['engine'] == 'gevent':
+            try:
+                from shop.gevent_patch import is_patched
+            except ImportError:
+                raise CommandError("The gevent engine needs gevent: pip install gevent")
+            if not is_patched():
+                # manage.py patches when it sees `runworkers --engine gevent`; call_command() is too late
+                raise CommandError("The gevent engine must be patched before Django loads: "
+                                   "run `python manage.py runworkers --engine gevent`.")
+        if options['engine'] in ('asyncio', 'gevent'):
+            per_queue = options['concurrency'] or queue_setting('ASYNC_CONCURRENCY', 1000)
+        else:
+            per_queue = options['threads'] or queue_setting('WORKERS', 3)
+        if per_queue < 1 or options['processes'] < 1:
+            raise CommandError("--threads, --concurrency and --processes must be at least 1.")
+
+        queues = {}
+        for spec in options['queue']:
+            name, _, count = spec.partition(':')
+            if not name or (count and (not count.isdigit() or int(count) < 1)):
+                raise CommandError(f"Invalid --queue value '{spec}', expected NAME or NAME:THREADS with THREADS at least 1.")
+            queues[name] = int(count) if count else per_queue
+        if not queues:
+            queues[queue_setting('QUEUE', 'default')] = per_queue
+
+        unit = 'thread(s)' if options['engine'] == 'thread' else 'concurrent task(s)'
+        self.stdout.write(
+            f"Running {options['engine']} workers: {options['processes']} process(es), queues "
+            + ", ".join(f"{name}={count} {unit}" for name, count in queues.items())
+        )
+        run_workers(queues, processes=options['processes'], engine=options['engine'])
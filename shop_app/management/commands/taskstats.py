@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from shop_app.task import get_backend
+from shop_app.task_metrics import live_worker_stats, render_prometheus
+
+
+class Command(BaseCommand):
+    help = "Show task queue depth and the metrics published by running worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prometheus', action='store_true',
+                            help="Print the Prometheus text format served at /api/metrics/tasks/.")
+
+    def handle(self, *args, **options):
+        depth = get_backend().depth()
+        workers = live_worker_stats()
+        if options['prometheus']:
+            self.stdout.write(render_prometheus(depth, workers), ending='')
+            return
+
+        self.stdout.write("Queue depth:")
+        for queue_name, states in sorted(depth.items()):
+            self.stdout.write(f"  {queue_name}: " + ", ".join(f"{state}={count}" for state, count in sorted(states.items())))
+        if not depth:
+            self.stdout.write("  (empty)")
+
+        self.stdout.write(f"Workers ({len(workers)} live process(es)):")
+        for worker_id, stats in workers.items():
+            self.stdout.write(f"  {worker_id}: busy={stats['busy']} idle={stats['idle']}")
+            for name, type_stats in sorted(stats['types'].items()):
+                wait, run = type_stats['wait'], type_stats['run']
+                self.stdout.write(
+                    f"    {name}: ok={type_stats['succeeded']} failed={type_stats['failed']} "
+                    f"throughput={type_stats['throughput']:.2f}/s "
+                    f"wait p50/p95/p99={wait['p50']:.3f}/{wait['p95']:.3f}/{wait['p99']:.3f}s "
+                    f"run p50/p95/p99={run['p50']:.3f}/{run['p95']:.3f}/{run['p99']:.3f}s"
+                )
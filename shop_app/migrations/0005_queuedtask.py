@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_app', '0004_delete_task_product_sku_alter_book_unique_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('queue', models.CharField(default='default', max_length=100)),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('DEAD', 'Dead')], default='PENDING', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('run_at', models.DateTimeField()),
+                ('leased_until', models.DateTimeField(blank=True, null=True)),
+                ('locked_by', models.CharField(blank=True, max_length=255)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['queue', 'status', 'run_at'], name='queuedtask_dequeue_idx')],
+            },
+        ),
+    ]
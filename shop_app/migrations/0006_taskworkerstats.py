@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_app', '0005_queuedtask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskWorkerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker_id', models.CharField(max_length=255, unique=True)),
+                ('stats', models.JSONField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+    ]
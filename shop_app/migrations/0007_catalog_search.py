@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:16
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+TRIGRAM_INDEXES = (
+    ('product_name_trgm_idx', 'shop_app_product', 'name'),
+    ('book_title_trgm_idx', 'shop_app_book', 'title'),
+    ('book_author_trgm_idx', 'shop_app_book', 'author'),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # pg_trgm ships with Postgres contrib; without it ?q= falls back to full-text only
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, table, column in TRIGRAM_INDEXES:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" USING gin ("{column}" gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for name, _, _ in TRIGRAM_INDEXES:
+            cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_app', '0006_taskworkerstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('title', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector('author', config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('name', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector('description', config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='book_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
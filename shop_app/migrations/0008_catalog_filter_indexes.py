@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_app', '0007_catalog_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['price', 'id'], name='book_price_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['published_date', 'id'], name='book_published_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author', 'id'], name='book_author_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title', 'id'], name='book_title_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['stock', 'id'], name='product_stock_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['id'], name='product_in_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_app', '0008_catalog_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthRevocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField()),
+                ('token_version', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='token_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
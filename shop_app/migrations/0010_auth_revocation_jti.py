@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_app', '0009_auth_revocation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authrevocation',
+            name='jti',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='authrevocation',
+            name='token_version',
+            field=models.PositiveIntegerField(null=True),
+        ),
+    ]
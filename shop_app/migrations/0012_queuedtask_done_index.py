@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop_app', '0011_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='queuedtask',
+            index=models.Index(condition=models.Q(('status', 'DONE')), fields=['completed_at'], name='queuedtask_done_idx'),
+        ),
+    ]
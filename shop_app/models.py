@@ -1,5 +1,9 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 
 # Create your models here.
 
@@ -11,15 +15,31 @@ class User(AbstractUser):
     )
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='user')
     email = models.EmailField(unique=True)
+    # Embedded in access tokens as `ver`; bumped when role/credentials change (see shop_app/auth.py)
+    token_version = models.PositiveIntegerField(default=0)
       
 class Book(models.Model):
     title = models.CharField(max_length=100)
     author = models.CharField(max_length=100)
     published_date = models.DateField()
     price = models.DecimalField(max_digits=6, decimal_places=2)
+    # Maintained by Postgres on every write; used by ?q= search (shop_app/search.py)
+    search_vector = models.GeneratedField(
+        expression=SearchVector('title', weight='A', config='english') + SearchVector('author', weight='B', config='english'),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
     
     class Meta:
        unique_together = ('title', 'author')
+       indexes = [
+           GinIndex(fields=['search_vector'], name='book_search_vector_idx'),
+           # ?price__gte= / ?published_date__lte= / ?author= and ?ordering=, with id as cursor tie-breaker
+           models.Index(fields=['price', 'id'], name='book_price_id_idx'),
+           models.Index(fields=['published_date', 'id'], name='book_published_id_idx'),
+           models.Index(fields=['author', 'id'], name='book_author_id_idx'),
+           models.Index(fields=['title', 'id'], name='book_title_id_idx'),
+       ]
 
 class Product(models.Model):
     name = models.CharField(max_length=100)
@@ -27,4 +47,82 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=8, decimal_places=2)
     stock = models.PositiveIntegerField()
     sku = models.CharField(max_length=100, unique=True, default='SKU_TEMP')
-    
\ No newline at end of file
+    # Maintained by Postgres on every write; used by ?q= search (shop_app/search.py)
+    search_vector = models.GeneratedField(
+        expression=SearchVector('name', weight='A', config='english') + SearchVector('description', weight='B', config='english'),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='product_search_vector_idx'),
+            # ?price__gte= / ?stock__gt= and ?ordering=, with id as cursor tie-breaker
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+            models.Index(fields=['stock', 'id'], name='product_stock_id_idx'),
+            # "in stock" listings only touch the rows that can be sold
+            models.Index(fields=['id'], condition=models.Q(stock__gt=0), name='product_in_stock_idx'),
+        ]
+    
+class QueuedTask(models.Model):
+    """A task persisted by the database queue backend (see shop_app/task.py)."""
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('DEAD', 'Dead'),
+    )
+    queue = models.CharField(max_length=100, default='default')
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField()                                # not visible to workers before this
+    leased_until = models.DateTimeField(null=True, blank=True)     # visibility timeout of a RUNNING task
+    locked_by = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['queue', 'status', 'run_at'], name='queuedtask_dequeue_idx'),
+            # purge of finished tasks (DatabaseQueueBackend.purge_done)
+            models.Index(fields=['completed_at'], condition=models.Q(status='DONE'), name='queuedtask_done_idx'),
+        ]
+
+class TaskWorkerStats(models.Model):
+    """Latest metrics snapshot published by one task worker process (see shop_app/task_metrics.py)."""
+    worker_id = models.CharField(max_length=255, unique=True)
+    stats = models.JSONField()
+    updated_at = models.DateTimeField()
+
+class AuthRevocation(models.Model):
+    """
+    Append-only feed of token revocations. Every process mirrors the unexpired rows in
+    memory (shop_app/auth.py), so checking a token costs no query. A row revokes either
+    one access token (`jti`, on logout) or all tokens of a user below `token_version`.
+    """
+    user_id = models.BigIntegerField()
+    token_version = models.PositiveIntegerField(null=True)  # tokens of `user_id` with a lower `ver` are rejected
+    jti = models.CharField(max_length=255, blank=True)      # a single logged-out access token
+    expires_at = models.DateTimeField()                     # after this no affected access token is still valid
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+
+class IdempotencyKey(models.Model):
+    """
+    The stored response of a create sent with an `Idempotency-Key` (see shop_app/idempotency.py).
+    Rows past `expires_at` are never replayed and are deleted in batches.
+    """
+    scope = models.CharField(max_length=64)                # 'user:<pk>', or 'anonymous' for sign-ups
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)         # HMAC-SHA256 of method, path and body
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('scope', 'key')
@@ -0,0 +1,225 @@
+"""
+The OpenAPI schema, generated once instead of on every docs request.
+
+drf_yasg builds the schema by introspecting every view and `swagger_auto_schema`
+decorator. `manage.py openapi_schema` does that once (at deploy) and writes JSON and
+YAML artifacts tagged with the code version to OPENAPI_SCHEMA['DIR']. `schema_file`
+serves them from memory with a content-hash ETag, Cache-Control and a pre-gzipped body.
+Without an artifact for the running code version the schema is generated on the first
+request, once per process.
+
+The Swagger UI and ReDoc pages are static HTML, rendered once per schema without the
+generator, that load it from `/openapi.json?v=<content hash>` - a URL that changes with
+the schema, so browsers and proxies may keep it for a year.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import urlencode
+
+import drf_yasg
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, HttpResponsePermanentRedirect
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import require_safe
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.renderers import ReDocRenderer, SwaggerUIRenderer
+
+from .cache import etag_matches
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'json': (OpenAPICodecJson, 'application/json'),
+    'yaml': (OpenAPICodecYaml, 'application/yaml'),
+}
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def schema_setting(name, default=None):
+    return getattr(settings, 'OPENAPI_SCHEMA', {}).get(name, default)
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    """OPENAPI_SCHEMA['VERSION'], or a hash of the project sources and drf_yasg's version."""
+    if schema_setting('VERSION'):
+        return str(schema_setting('VERSION'))
+    base = Path(settings.BASE_DIR)
+    digest = hashlib.sha256(drf_yasg.__version__.encode())
+    for package in ('shop', 'shop_app'):
+        for path in sorted((base / package).rglob('*.py')):
+            if 'tests' not in path.parts:
+                digest.update(str(path.relative_to(base)).encode())
+                digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def generate_schema():
+    """The full public schema. No request: paths are host-relative, as a static file should be."""
+    from shop.urls import api_info  # the URLconf imports this module
+
+    return OpenAPISchemaGenerator(api_info).get_schema(request=None, public=True)
+
+
+def render_schema(schema, fmt):
+    codec_class, _ = FORMATS[fmt]
+    return codec_class(validators=[]).encode(schema)
+
+
+def artifact_path(fmt, version=None):
+    directory = schema_setting('DIR') or Path(settings.BASE_DIR) / 'openapi'
+    return Path(directory) / f'openapi.{version or code_version()}.{fmt}'
+
+
+def write_schema():
+    """Generate the schema, write every format for the current code version and drop older ones."""
+    schema = generate_schema()
+    paths = []
+    for fmt in FORMATS:
+        path = artifact_path(fmt)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_bytes(render_schema(schema, fmt))
+        os.replace(tmp, path)  # a process loading it never sees half a file
+        paths.append(path)
+    for stale in paths[0].parent.glob('openapi.*.*'):
+        if stale not in paths:
+            stale.unlink()
+    return paths
+
+
+class SchemaFile:
+    """One rendering of the schema: its bytes, their gzip and a content-hash ETag."""
+
+    def __init__(self, body, content_type):
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        self.content_type = content_type
+        self.digest = hashlib.sha256(body).hexdigest()[:20]
+        self.etag = f'"{self.digest}"'
+
+
+_files = {}
+_lock = threading.Lock()
+
+
+def load(fmt):
+    """The SchemaFile for `fmt`, from the artifact or, failing that, generated - once per process."""
+    with _lock:
+        if fmt not in _files:
+            try:
+                body = artifact_path(fmt).read_bytes()
+            except FileNotFoundError:
+                logger.warning("No OpenAPI schema artifact for code version %s, generating it "
+                               "(run `manage.py openapi_schema` at deploy)", code_version())
+                schema = generate_schema()
+                for name in FORMATS:
+                    _files[name] = SchemaFile(render_schema(schema, name), FORMATS[name][1])
+            else:
+                _files[fmt] = SchemaFile(body, FORMATS[fmt][1])
+        return _files[fmt]
+
+
+def clear():
+    """Forget loaded schemas and the code version (tests, settings changes)."""
+    with _lock:
+        _files.clear()
+        _pages.clear()
+    code_version.cache_clear()
+
+
+def schema_url(fmt='json'):
+    """The schema URL versioned by its content, for pages that link to it."""
+    return reverse('openapi-schema', kwargs={'fmt': fmt}) + '?' + urlencode({'v': load(fmt).digest})
+
+
+@require_safe
+def schema_file(request, fmt):
+    schema = load(fmt)
+    if etag_matches(request, schema.etag):
+        response = HttpResponseNotModified()
+    elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = HttpResponse(schema.gzipped, content_type=schema.content_type)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(schema.body, content_type=schema.content_type)
+    response['ETag'] = schema.etag
+    if request.GET.get('v') == schema.digest:
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=schema_setting('MAX_AGE', 300))
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+class PrecomputedSwaggerUIRenderer(SwaggerUIRenderer):
+
+    def get_swagger_ui_settings(self):
+        return {**super().get_swagger_ui_settings(), 'url': schema_url()}
+
+
+class PrecomputedReDocRenderer(ReDocRenderer):
+
+    def get_redoc_settings(self):
+        return {**super().get_redoc_settings(), 'url': schema_url()}
+
+
+UI_RENDERERS = {'swagger': PrecomputedSwaggerUIRenderer, 'redoc': PrecomputedReDocRenderer}
+
+_pages = {}
+
+
+def docs_page(ui):
+    """
+    The `ui` page as a SchemaFile, rendered once per schema. The title and version come
+    from the schema file itself and no request is involved, so every client gets the
+    same bytes; the session login button (which needs a CSRF token and the user) is left
+    out - the API authenticates with the JWT `Authorize` dialog.
+    """
+    schema = load('json')
+    page = _pages.get(ui)
+    if page is None or page.schema_digest != schema.digest:
+        # Rendered outside _lock: the renderer settings call schema_url(). A race only renders twice.
+        info = json.loads(schema.body)['info']
+        renderer = UI_RENDERERS[ui]()
+        context = {}
+        renderer.set_context(context, SimpleNamespace(info=SimpleNamespace(**info)))
+        context['USE_SESSION_AUTH'] = False
+        page = SchemaFile(render_to_string(renderer.template, context).encode(), 'text/html; charset=utf-8')
+        page.schema_digest = schema.digest
+        _pages[ui] = page
+    return page
+
+
+def docs_view(ui):
+    """
+    The Swagger UI / ReDoc page, a static page that loads the precomputed schema from
+    `schema_url()`. It never runs the schema generator or authentication, so a stale
+    `Authorization` header cannot turn it into a 401. The page is cached for
+    OPENAPI_SCHEMA['MAX_AGE']; the old `?format=openapi` spec URLs redirect to the
+    schema file.
+    """
+    @require_safe
+    def view(request):
+        fmt = request.GET.get('format')
+        if fmt in ('openapi', 'json', 'yaml'):
+            return HttpResponsePermanentRedirect(reverse('openapi-schema', kwargs={'fmt': 'yaml' if fmt == 'yaml' else 'json'}))
+        page = docs_page(ui)
+        if etag_matches(request, page.etag):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(page.body, content_type=page.content_type)
+        response['ETag'] = page.etag
+        patch_cache_control(response, public=True, max_age=schema_setting('MAX_AGE', 300))
+        return response
+    return view
@@ -0,0 +1,153 @@
+# pagination.py
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, _positive_int, _reverse_ordering
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.settings import api_settings
+
+
+class ShopCursorPagination(CursorPagination):
+    """
+    Keyset (cursor) pagination for the list endpoints.
+
+    - Pages are keyed on `id` by default, so page N costs the same as page 1
+      (`WHERE id > <last seen id> ORDER BY id LIMIT n`) instead of an OFFSET scan.
+    - Clients may pick another column with `?ordering=<field>` / `?ordering=-<field>`
+      as long as the view whitelists it in `cursor_ordering_fields`. `id` is always
+      appended as a tie-breaker so the order is stable, and the cursor holds both
+      (`WHERE price > v OR (price = v AND id > last_id)`), so pages over a column with
+      many equal values do not fall back to skipping the ties with an OFFSET.
+    - `?page_size=` is honoured up to `PAGINATION_MAX_PAGE_SIZE`.
+    - `apaginate_queryset` is the same for async views, fetching the page with `async for`.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'PAGINATION_MAX_PAGE_SIZE', 500)
+    ordering = ('id',)
+    ordering_query_param = 'ordering'
+
+    # CursorPagination.paginate_queryset, split around the one query it runs so the
+    # async views can share everything but the fetch
+    def paginate_queryset(self, queryset, request, view=None):
+        window = self.get_window(queryset, request, view)
+        return None if window is None else self.set_page(list(window))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        window = self.get_window(queryset, request, view)
+        return None if window is None else self.set_page([row async for row in window])
+
+    def get_window(self, queryset, request, view):
+        """The ordered, positioned slice holding this page plus one row (to detect a next page)."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            self.offset, self.reverse, self.current_position = 0, False, None
+        else:
+            self.offset, self.reverse, self.current_position = self.cursor
+
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if self.reverse else self.ordering))
+        if self.current_position is not None:
+            order = self.ordering[0]
+            # (cursor reversed) XOR (queryset reversed)
+            lookup = 'lt' if self.cursor.reverse != order.startswith('-') else 'gt'
+            field = order.lstrip('-')
+            if isinstance(self.current_position, tuple):
+                value, last_id = self.current_position
+                queryset = queryset.filter(Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'id__{lookup}': last_id}))
+            else:
+                queryset = queryset.filter(**{f'{field}__{lookup}': self.current_position})
+        return queryset[self.offset:self.offset + self.page_size + 1]
+
+    def set_page(self, results):
+        self.page = list(results[:self.page_size])
+        has_following_position = len(results) > len(self.page)
+        following_position = self._get_position_from_instance(results[-1], self.ordering) if has_following_position else None
+
+        if self.reverse:
+            # The query ran in reverse order; put the page back the right way round
+            self.page = list(reversed(self.page))
+            self.has_next = self.current_position is not None or self.offset > 0
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = self.current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = self.current_position is not None or self.offset > 0
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = self.current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        # (value, id) when `id` breaks ties; the tie-breaker always runs the same direction
+        position = super()._get_position_from_instance(instance, ordering)
+        if len(ordering) == 1:
+            return position
+        return position, super()._get_position_from_instance(instance, ordering[1:])
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None:
+            return None
+        try:
+            tokens = parse.parse_qs(b64decode(request.query_params[self.cursor_query_param].encode('ascii')).decode('ascii'))
+            last_id = tokens.get('i', [None])[0]
+            if last_id is None:
+                return cursor
+            return Cursor(offset=cursor.offset, reverse=cursor.reverse, position=(cursor.position, str(_positive_int(last_id))))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        if not isinstance(cursor.position, tuple):
+            return super().encode_cursor(cursor)
+        value, last_id = cursor.position
+        tokens = {'p': value, 'i': last_id}
+        if cursor.offset != 0:
+            tokens['o'] = str(cursor.offset)
+        if cursor.reverse:
+            tokens['r'] = '1'
+        encoded = b64encode(parse.urlencode(tokens).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+
+        requested = request.query_params.get(self.ordering_query_param)
+        allowed = getattr(view, 'cursor_ordering_fields', ())
+        if not requested or requested.lstrip('-') not in allowed:
+            return ordering
+
+        if requested.lstrip('-') == 'id':
+            return (requested,)
+        tie_breaker = '-id' if requested.startswith('-') else 'id'
+        return (requested, tie_breaker)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        allowed = getattr(view, 'cursor_ordering_fields', ())
+        if allowed:
+            parameters.append({
+                'name': self.ordering_query_param,
+                'required': False,
+                'in': 'query',
+                'description': "Sort by one of: " + ', '.join(allowed) + ". Prefix with '-' for descending.",
+                'schema': {'type': 'string'},
+            })
+        return parameters
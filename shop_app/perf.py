@@ -0,0 +1,200 @@
+# perf.py
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .task_metrics import percentile
+
+_current = ContextVar('request_timings', default=None)
+
+
+def perf_setting(name, default=None):
+    return getattr(settings, 'PERFORMANCE', {}).get(name, default)
+
+
+class RequestTimings:
+    """Where the time of one sampled request went. Phases are in seconds."""
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.phases = {}
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook: counts and times every query
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_time += time.perf_counter() - started
+
+
+def record_query(execute, sql, params, many, context):
+    # Installed on every connection; the ContextVar follows async ORM calls into their
+    # worker thread, which a per-request connection.execute_wrapper would not
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings(execute, sql, params, many, context)
+
+
+def install_query_timer(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_timer, dispatch_uid='perf-query-timer')
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to `phase` of the current request, if it is being sampled."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - started)
+
+
+class RouteStats:
+    """In-process ring buffer of recent sampled requests per route (URL name such as `product-list`)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def record(self, route, total, timings):
+        sample = {'total': total, 'db': timings.db_time, 'queries': timings.db_queries, **timings.phases}
+        with self.lock:
+            if route not in self.routes:
+                self.routes[route] = deque(maxlen=perf_setting('BUFFER_SIZE', 1000))
+            self.routes[route].append(sample)
+
+    def summary(self):
+        with self.lock:
+            routes = {route: list(samples) for route, samples in self.routes.items()}
+        result = {}
+        for route, samples in sorted(routes.items()):
+            stats = {'count': len(samples), 'avg_queries': sum(s['queries'] for s in samples) / len(samples)}
+            for phase in ('total', 'db', 'auth', 'perm', 'serializer'):
+                values = sorted(s.get(phase, 0.0) * 1000 for s in samples)
+                stats[f'{phase}_ms'] = {'p50': percentile(values, 0.50), 'p95': percentile(values, 0.95),
+                                        'p99': percentile(values, 0.99), 'max': values[-1]}
+            result[route] = stats
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.routes.clear()
+
+
+route_stats = RouteStats()
+
+
+class PerformanceMiddleware:
+    """
+    Samples `PERFORMANCE['SAMPLE_RATE']` of requests and records SQL query count and DB
+    time (via `record_query`, installed on every connection), authentication, permission
+    and serializer time (via `timed()` in the DRF hooks) and total time. Sampled responses carry a
+    `Server-Timing` header and are aggregated per route in `route_stats`. Requests
+    that are not sampled pay for one `random()` call. Runs natively under ASGI too, so
+    async views are not pushed onto a thread by this middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if random.random() >= perf_setting('SAMPLE_RATE', 1.0):
+            return self.get_response(request)
+
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(connection)  # opened before this module was imported
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, time.perf_counter() - started, timings)
+
+    async def __acall__(self, request):
+        if random.random() >= perf_setting('SAMPLE_RATE', 1.0):
+            return await self.get_response(request)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, time.perf_counter() - started, timings)
+
+    def finish(self, request, response, total, timings):
+        match = getattr(request, 'resolver_match', None)
+        route_stats.record(match.view_name if match else 'unresolved', total, timings)
+        if perf_setting('SERVER_TIMING', True):
+            response['Server-Timing'] = server_timing_header(total, timings)
+        return response
+
+
+def server_timing_header(total, timings):
+    entries = [f'db;dur={timings.db_time * 1000:.2f};desc="{timings.db_queries} queries"']
+    entries += [f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in timings.phases.items()]
+    entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+
+class RequestTimingMixin:
+    """DRF hook for `PerformanceMiddleware`: times authentication and permission checks."""
+
+    def perform_authentication(self, request):
+        with timed('auth'):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with timed('perm'):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with timed('perm'):
+            super().check_object_permissions(request, obj)
+
+
+class TimedSerializerMixin:
+    """Counts validation and `.data` rendering as `serializer` time of the current request."""
+
+    def is_valid(self, *args, **kwargs):
+        with timed('serializer'):
+            return super().is_valid(*args, **kwargs)
+
+    @property
+    def data(self):
+        with timed('serializer'):
+            return super().data
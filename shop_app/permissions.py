@@ -1,11 +1,12 @@
 # permissions.py
+from django.conf import settings
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
 class RoleBasedAccessPermission(BasePermission):
     """
     - GET (read): all authenticated users
     - POST (create): only admin
-    - PUT/PATCH (update): admin and staff
+    - PUT/PATCH (update) and the view's `update_actions`: admin and staff
     - DELETE: only admin
     """
 
@@ -24,6 +25,10 @@ class RoleBasedAccessPermission(BasePermission):
         if method in SAFE_METHODS:
             return True
 
+        # Actions that change existing rows (e.g. stock reserve/release): admin or staff
+        if getattr(view, 'action', None) in getattr(view, 'update_actions', ()):
+            return role in ['admin', 'staff']
+
         # Create: only admin
         if method == 'POST':
             return role == 'admin'
@@ -37,3 +42,16 @@ class RoleBasedAccessPermission(BasePermission):
             return role == 'admin'
 
         return False
+
+
+class IsMetricsClient(BasePermission):
+    """
+    Metrics endpoints: 'admin' users, or scrapers calling from an address listed in
+    settings.METRICS_ALLOWED_IPS (Prometheus cannot refresh short-lived JWTs). List only
+    addresses that reach the app directly, never that of a proxy in front of it.
+    """
+
+    def has_permission(self, request, view):
+        if request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', []):
+            return True
+        return bool(request.user and request.user.is_authenticated and getattr(request.user, 'role', None) == 'admin')
@@ -0,0 +1,47 @@
+# renderers.py
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional: FastJSONRenderer then behaves exactly like JSONRenderer
+    orjson = None
+
+
+class PrometheusTextRenderer(BaseRenderer):
+    """Prometheus text exposition format. Error payloads (dicts) are rendered as JSON."""
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        return json.dumps(data).encode(self.charset)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by orjson. Output matches JSONRenderer's compact, non-ASCII-escaped
+    JSON byte for byte: types orjson does not handle natively (Decimal, datetimes, lazy
+    strings, ...) go through DRF's JSONEncoder, and U+2028/U+2029 are escaped the same way.
+    Indented output (`Accept: application/json; indent=4`) and payloads orjson rejects are
+    left to JSONRenderer.
+    """
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        try:
+            ret = orjson.dumps(data, default=self.encoder.default, option=self.options)
+        except orjson.JSONEncodeError:  # e.g. integers beyond 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,212 @@
+# replicas.py
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, InterfaceError, OperationalError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from .exceptions import raised_from
+
+logger = logging.getLogger(__name__)
+
+# Replica alias serving the reads of the current request; None means the primary
+_read_alias = ContextVar('read_alias', default=None)
+
+# Seconds the replica's replay is behind the primary; 0 when it has replayed everything received
+LAG_SQL = (
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+def replica_setting(name, default=None):
+    return getattr(settings, 'DATABASE_REPLICAS', {}).get(name, default)
+
+
+def is_connection_error(exc):
+    """Whether `exc`, or an exception it was raised from, is a lost connection."""
+    return raised_from(exc, (OperationalError, InterfaceError)) is not None
+
+
+class ReplicaUnavailable(Exception):
+    """A read on a replica failed to connect; the request is served again from the primary."""
+
+
+class ReplicaSet:
+    """
+    Health and lag of the replicas in `DATABASE_REPLICAS['ALIASES']`, as seen by this process.
+
+    Every `CHECK_INTERVAL` seconds one request thread probes each replica (LAG_SQL on
+    Postgres, `SELECT 0` elsewhere, e.g. an SQLite stand-in); the others keep using the
+    last result. A replica is used when the last probe succeeded and its lag was at most
+    `MAX_LAG`. `STRATEGY` is 'round_robin' over the usable replicas or 'least_lag'
+    (round-robin among those tied for the lowest lag). No usable replica: the primary.
+
+    After a user's write their reads go to the primary for `STICKY_SECONDS`, so they
+    read their own writes. The marker lives in the default cache, which is shared
+    between processes when it is a shared backend (Redis, Memcached).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = {}  # alias -> {'healthy': bool, 'lag': float | None, 'checked_at': float, 'error': str}
+        self.next_check = 0.0
+        self.counter = itertools.count()
+
+    @property
+    def aliases(self):
+        return replica_setting('ALIASES', [])
+
+    def check_due(self):
+        return bool(self.aliases) and time.time() >= self.next_check
+
+    def check(self):
+        if not self.lock.acquire(blocking=False):
+            return  # another thread is probing
+        try:
+            state = {}
+            for alias in self.aliases:
+                connection = connections[alias]
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(LAG_SQL if connection.vendor == 'postgresql' else "SELECT 0")
+                        lag = float(cursor.fetchone()[0])
+                    healthy, error = lag <= replica_setting('MAX_LAG', 5), ''
+                except DatabaseError as e:
+                    connection.close()
+                    lag, healthy, error = None, False, str(e).strip()
+                if healthy != self.state.get(alias, {}).get('healthy', True):
+                    logger.warning("Replica %s is %s (lag %s)", alias, 'back' if healthy else 'out of rotation', lag)
+                state[alias] = {'healthy': healthy, 'lag': lag, 'checked_at': time.time(), 'error': error}
+            self.state = state
+            self.next_check = time.time() + replica_setting('CHECK_INTERVAL', 5)
+        finally:
+            self.lock.release()
+
+    def mark_down(self, alias):
+        logger.warning("Replica %s failed during a request, out of rotation until the next check", alias)
+        with self.lock:
+            self.state[alias] = {**self.state.get(alias, {}), 'healthy': False, 'error': 'connection failed'}
+            self.next_check = min(self.next_check, time.time() + replica_setting('CHECK_INTERVAL', 5))
+
+    def choose(self):
+        usable = [(alias, s['lag']) for alias, s in self.state.items() if s['healthy'] and alias in self.aliases]
+        if not usable:
+            return None
+        if replica_setting('STRATEGY', 'round_robin') == 'least_lag':
+            lowest = min(lag for _, lag in usable)
+            usable = [(alias, lag) for alias, lag in usable if lag == lowest]
+        return usable[next(self.counter) % len(usable)][0]
+
+    def sticky_key(self, user):
+        return f'replicas:sticky:{user.pk}'
+
+    def stick(self, user):
+        if self.aliases and user is not None and user.is_authenticated:
+            caches['default'].set(self.sticky_key(user), 1, replica_setting('STICKY_SECONDS', 5))
+
+    def is_sticky(self, user):
+        return user is not None and user.is_authenticated and caches['default'].get(self.sticky_key(user)) is not None
+
+    def read_alias(self, user):
+        """The replica for a safe request by `user`, or None for the primary."""
+        if not self.aliases or self.is_sticky(user):
+            return None
+        if self.check_due():
+            self.check()
+        return self.choose()
+
+    async def aread_alias(self, user):
+        """read_alias() for async views: the probe runs in a thread."""
+        if not self.aliases or self.is_sticky(user):
+            return None
+        if self.check_due():
+            await sync_to_async(self.check)()
+        return self.choose()
+
+    def snapshot(self):
+        return {'strategy': replica_setting('STRATEGY', 'round_robin'), 'replicas': dict(self.state)}
+
+    def clear(self):
+        with self.lock:
+            self.state = {}
+            self.next_check = 0.0
+
+
+replicas = ReplicaSet()
+
+
+class ReplicaRouter:
+    """
+    DATABASE_ROUTERS entry: reads go to the replica picked for the current request (set
+    by ReplicaReadMixin / the async views), everything else - writes, migrations, reads
+    outside those requests - to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas.aliases}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replicas.aliases:
+            return False  # replicas get the schema through replication
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Serves GET/HEAD/OPTIONS from a replica (see ReplicaSet) and writes from the primary.
+
+    The replica is chosen after authentication, so a user inside their sticky window
+    reads from the primary. `get_queryset()` pins the alias too, so streamed responses
+    that query after the view returns (exports) stay on it. A read that loses its replica
+    connection marks the replica down and the request is run again on the primary.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        token = _read_alias.set(None)
+        try:
+            try:
+                return super().dispatch(request, *args, **kwargs)
+            except ReplicaUnavailable:
+                self.read_from_primary = True
+                _read_alias.set(None)
+                return super().dispatch(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and not getattr(self, 'read_from_primary', False):
+            _read_alias.set(replicas.read_alias(request.user))
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        alias = _read_alias.get()
+        return queryset.using(alias) if alias else queryset
+
+    def handle_exception(self, exc):
+        alias = _read_alias.get()
+        if alias is not None and is_connection_error(exc):
+            replicas.mark_down(alias)
+            raise ReplicaUnavailable(alias) from exc
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            replicas.stick(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,87 @@
+# search.py
+from functools import reduce
+from operator import or_
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connections
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast, Greatest
+from rest_framework.filters import BaseFilterBackend
+
+_trigram_available = {}
+
+
+def trigram_available(alias):
+    """Whether pg_trgm is installed in the database (migration 0007 only adds it where available)."""
+    if alias not in _trigram_available:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_available[alias] = cursor.fetchone() is not None
+    return _trigram_available[alias]
+
+
+async def atrigram_available(alias):
+    """trigram_available() for async views; only the first call per alias queries the database."""
+    if alias not in _trigram_available:
+        await sync_to_async(trigram_available)(alias)
+    return _trigram_available[alias]
+
+
+class CatalogSearchFilter(BaseFilterBackend):
+    """
+    `?q=` search over the model's `search_vector` column.
+
+    - Full-text: `websearch_to_tsquery('english', q)` against the generated, GIN-indexed
+      `search_vector` (stemmed, weighted: name/title 'A', description/author 'B').
+    - Fuzzy: when pg_trgm is installed, `field % q` on the view's `search_trigram_fields`
+      (GIN trigram indexes) also matches misspelled terms.
+    - Results are annotated with `search_rank` (ts_rank + best trigram similarity) and the
+      paginator orders by it. The rank is computed, not indexed: every cursor page ranks
+      and sorts all the matches before it pages. The indexes only find the matches.
+    - So a broad query does not rank the whole table on every page, only the newest
+      `SEARCH_MAX_CANDIDATES` matches (a LIMIT'd subquery on the indexed match) are ranked.
+      Put this filter after the others, so they narrow the candidates rather than the
+      ranked page.
+    """
+    search_param = 'q'
+    max_length = 200
+
+    def get_terms(self, request):
+        return request.query_params.get(self.search_param, '').strip()[:self.max_length]
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_terms(request)
+        if not terms:
+            return queryset
+
+        query = SearchQuery(terms, search_type='websearch', config='english')
+        match = Q(search_vector=query)
+        score = SearchRank(F('search_vector'), query)
+
+        fields = getattr(view, 'search_trigram_fields', ())
+        if fields and trigram_available(queryset.db):
+            match |= reduce(or_, (Q(**{f'{field}__trigram_similar': terms}) for field in fields))
+            similarities = [TrigramSimilarity(field, terms) for field in fields]
+            score = score + (Greatest(*similarities) if len(similarities) > 1 else similarities[0])
+
+        # Newest first, so every page of a search sees the same candidates
+        candidates = queryset.filter(match).order_by('-pk').values('pk')[:getattr(settings, 'SEARCH_MAX_CANDIDATES', 1000)]
+        # float8: ts_rank is a float4, which never equals the float8 the cursor compares it with
+        return queryset.filter(pk__in=candidates).annotate(search_rank=Cast(score, FloatField()))
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': "Full-text search (web search syntax: quoted phrases, OR, -exclude), ranked by relevance.",
+            'schema': {'type': 'string'},
+        }]
+
+    def get_ordering(self, request, queryset, view):
+        # Used by ShopCursorPagination: best matches first
+        if self.get_terms(request):
+            return ('-search_rank', '-id')
+        return None
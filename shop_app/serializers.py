@@ -1,32 +1,128 @@
 from rest_framework import serializers
 from .models import Book, Product, User
-from django.contrib.auth.hashers import make_password
+from .hashing import hash_password
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .perf import TimedSerializerMixin
 
-class UserSerializer(serializers.ModelSerializer):
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
 
     def create(self, validated_data):
-        validated_data["password"] = make_password(validated_data["password"])
+        validated_data["password"] = hash_password(validated_data["password"])
         return super().create(validated_data)
 
+    def update(self, instance, validated_data):
+        if "password" in validated_data:
+            validated_data["password"] = hash_password(validated_data["password"])
+        return super().update(instance, validated_data)
+
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'password','role']
+        list_serializer_class = TimedListSerializer
         
         
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Book
         #fields = '__all__'
         fields = ['id','title','author','published_date','price']
+        list_serializer_class = TimedListSerializer
         
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         #fields = '__all__'
         fields = ['id','name','description','price','stock','sku']
+        list_serializer_class = TimedListSerializer
         
+class LogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+    def validate_refresh(self, value):
+        try:
+            token = RefreshToken(value)
+        except TokenError as e:
+            raise serializers.ValidationError(str(e))
+        if str(token.get(api_settings.USER_ID_CLAIM)) != str(self.context['request'].user.pk):
+            raise serializers.ValidationError("Token does not belong to the current user.")
+        return token
+
+
 class LogoutResponseSerializer(serializers.Serializer):
     detail = serializers.CharField()
       
+
+class BulkListSerializer(TimedListSerializer):
+    """
+    `many=True` serializer for the bulk endpoints.
+
+    Unlike the default ListSerializer it does not stop at the first bad row: every
+    row is validated, invalid ones become `None` in `validated_data` and their errors
+    are kept in `row_errors` (keyed by row index) so the view can report per row.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            raise serializers.ValidationError({'non_field_errors': ['Expected a list of items.']})
+
+        self.row_errors = {}
+        rows = []
+        for index, item in enumerate(data):
+            try:
+                rows.append(self.child.run_validation(item))
+            except serializers.ValidationError as e:
+                self.row_errors[index] = e.detail
+                rows.append(None)
+        return rows
+
+
+class BookBulkSerializer(BookSerializer):
+    # (title, author) collisions are checked once per batch by BulkWriteMixin
+    # instead of one UniqueTogetherValidator query per row.
+    class Meta(BookSerializer.Meta):
+        validators = []
+        list_serializer_class = BulkListSerializer
+
+
+class ProductBulkSerializer(ProductSerializer):
+    # SKU collisions are checked once per batch by BulkWriteMixin
+    # instead of one UniqueValidator query per row.
+    class Meta(ProductSerializer.Meta):
+        extra_kwargs = {'sku': {'validators': []}}
+        list_serializer_class = BulkListSerializer
+
+
+class StockLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class StockAdjustLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    delta = serializers.IntegerField()
+
+    def validate_delta(self, value):
+        if value == 0:
+            raise serializers.ValidationError("Delta must not be zero.")
+        return value
+
+
+class StockChangeSerializer(serializers.Serializer):
+    items = StockLineSerializer(many=True, allow_empty=False)
+
+
+class StockAdjustSerializer(serializers.Serializer):
+    items = StockAdjustLineSerializer(many=True, allow_empty=False)
+
+
+class StockResponseSerializer(serializers.Serializer):
+    stock = serializers.DictField(child=serializers.IntegerField())
@@ -0,0 +1,72 @@
+# stock.py
+import logging
+
+from django.db import transaction
+from django.db.models import Case, F, When
+
+from .cache import catalog_cache
+from .exceptions import InsufficientStock
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+
+def merge_lines(lines, field, sign=1):
+    """Collapse order lines into {product_id: signed delta}, summing repeated products."""
+    deltas = {}
+    for line in lines:
+        deltas[line['product']] = deltas.get(line['product'], 0) + sign * line[field]
+    return {pk: delta for pk, delta in deltas.items() if delta}
+
+
+def apply_stock_deltas(deltas):
+    """
+    Apply signed stock deltas ({product_id: delta}) atomically, all or nothing.
+
+    Stock is changed in the database with `F()` expressions, never read-modify-write
+    on the client, so concurrent checkouts cannot lose updates:
+
+    - one product: a single conditional `UPDATE ... SET stock = stock - n WHERE stock >= n`,
+      no explicit lock, which is what keeps hot SKUs fast.
+    - several products: rows are locked with `select_for_update` in primary key order
+      (so two orders touching the same products cannot deadlock), checked, then
+      changed with one `UPDATE ... CASE` statement.
+
+    Raises `InsufficientStock` listing the failing lines; returns {product_id: new stock}.
+    """
+    with transaction.atomic():
+        if len(deltas) == 1:
+            (pk, delta), = deltas.items()
+            queryset = Product.objects.filter(pk=pk)
+            if delta < 0:
+                queryset = queryset.filter(stock__gte=-delta)
+            if not queryset.update(stock=F('stock') + delta):
+                available = Product.objects.filter(pk=pk).values_list('stock', flat=True).first()
+                raise InsufficientStock([_failure(pk, delta, available)])
+        else:
+            available = dict(
+                Product.objects.select_for_update().filter(pk__in=deltas).order_by('pk').values_list('pk', 'stock')
+            )
+            failed = [
+                _failure(pk, delta, available.get(pk))
+                for pk, delta in sorted(deltas.items())
+                if pk not in available or available[pk] + delta < 0
+            ]
+            if failed:
+                raise InsufficientStock(failed)
+            Product.objects.filter(pk__in=deltas).update(
+                stock=Case(*[When(pk=pk, then=F('stock') + delta) for pk, delta in deltas.items()])
+            )
+
+        # queryset.update() does not send post_save
+        transaction.on_commit(lambda: catalog_cache.invalidate('product'))
+        stock = dict(Product.objects.filter(pk__in=deltas).values_list('pk', 'stock'))
+
+    logger.info("Stock changed for products %s", sorted(deltas))
+    return stock
+
+
+def _failure(pk, delta, available):
+    if available is None:
+        return {'product': pk, 'error': 'Product not found.'}
+    return {'product': pk, 'requested': -delta, 'available': available}
@@ -1,43 +1,632 @@
 # shop_app/task_queue.py
+import asyncio
+import heapq
+import itertools
 import threading
 import queue
 import logging
+import multiprocessing
+import os
+import socket
 import time
 import signal
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
-logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s', handlers=[
-        logging.FileHandler("shop_app_worker.log"),  # Log file path
-        logging.StreamHandler()  # Also output to console
-    ])
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections, transaction
+from django.db.models import Case, CharField, Count, Q, Value, When
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import QueuedTask
+from .task_metrics import metrics, start_publisher, task_type
+
+try:
+    import gevent
+    from gevent.pool import Pool as GreenletPool
+except ImportError:  # optional: only the gevent engine needs it
+    gevent = None
 
-task_queue = queue.Queue()
 shutdown_event = threading.Event()
 workers = []
 
+
+def queue_setting(name, default=None):
+    return getattr(settings, 'TASK_QUEUE', {}).get(name, default)
+
+
+class MemoryQueueBackend:
+    """
+    Process-local queue.Queue. Fast, but tasks are lost on restart and not shared between processes.
+    Delayed tasks wait in a heap and are moved onto the queue by `dequeue` once due.
+    """
+
+    def __init__(self):
+        self.queue_name = queue_setting('QUEUE', 'default')
+        self.queues = {}
+        self.delayed = {}
+        self.sequence = itertools.count()  # heap tie-breaker: tasks themselves need not be comparable
+        self.lock = threading.Lock()
+
+    def get_queue(self, queue_name):
+        with self.lock:
+            return self.queues.setdefault(queue_name or self.queue_name, queue.Queue())
+
+    def enqueue(self, task, queue_name=None, delay=0):
+        if delay > 0:
+            with self.lock:
+                heapq.heappush(self.delayed.setdefault(queue_name or self.queue_name, []), (time.time() + delay, next(self.sequence), task))
+            return
+        self.get_queue(queue_name).put((task, time.time()))
+
+    def release_due(self, queue_name):
+        """Put the delayed tasks that are due on the queue; seconds until the next one is, or None."""
+        now = time.time()
+        due = []
+        with self.lock:
+            delayed = self.delayed.get(queue_name or self.queue_name, [])
+            while delayed and delayed[0][0] <= now:
+                due.append(heapq.heappop(delayed))
+            next_due = delayed[0][0] - now if delayed else None
+        task_queue = self.get_queue(queue_name)
+        for ready_at, _, task in due:
+            task_queue.put((task, ready_at))  # waiting starts when it becomes visible, as in the database backend
+        return next_due
+
+    def dequeue(self, worker_id, batch_size=1, timeout=1, queue_name=None):
+        """Return a list of (handle, task, enqueued_at); blocks up to `timeout` seconds for the first one."""
+        task_queue = self.get_queue(queue_name)
+        deadline = time.monotonic() + timeout
+        while True:
+            next_due = self.release_due(queue_name)
+            wait = max(0.0, deadline - time.monotonic())
+            try:
+                batch = [task_queue.get(timeout=wait if next_due is None else min(wait, next_due))]
+                break
+            except queue.Empty:
+                if next_due is None or next_due >= wait:
+                    return []
+        while len(batch) < batch_size:
+            try:
+                batch.append(task_queue.get_nowait())
+            except queue.Empty:
+                break
+        return [(task_queue, task, enqueued_at) for task, enqueued_at in batch]
+
+    def ack(self, handle, worker_id):
+        handle.task_done()
+
+    def fail(self, handle, worker_id, error):
+        handle.task_done()
+
+    def depth(self):
+        with self.lock:
+            depth = {name: {'ready': q.qsize()} for name, q in self.queues.items()}
+            for name, delayed in self.delayed.items():
+                depth.setdefault(name, {'ready': 0})['delayed'] = len(delayed)
+            return depth
+
+
+class DatabaseQueueBackend:
+    """
+    Durable queue stored in the `QueuedTask` table, shared by every worker process on every node.
+
+    - Workers lease batches with `SELECT ... FOR UPDATE SKIP LOCKED`, so concurrent workers
+      never block on or double-process the same rows.
+    - A leased task is invisible for `VISIBILITY_TIMEOUT` seconds, renewed by `leases` while
+      it runs; if its worker dies it becomes visible again and is picked up by another worker.
+    - Failures are retried with exponential backoff (`RETRY_BACKOFF` * 2^(attempt-1) seconds,
+      capped at `RETRY_BACKOFF_MAX`); after `MAX_ATTEMPTS` the task is moved to DEAD.
+    - DONE tasks are kept for `DONE_RETENTION` seconds, then deleted in batches by the acking
+      workers (at most once every `PURGE_INTERVAL` seconds per process), so the table stays
+      the size of the backlog. DEAD tasks are kept for inspection.
+    """
+
+    def __init__(self):
+        self.visibility_timeout = queue_setting('VISIBILITY_TIMEOUT', 60)
+        self.max_attempts = queue_setting('MAX_ATTEMPTS', 5)
+        self.retry_backoff = queue_setting('RETRY_BACKOFF', 2)
+        self.retry_backoff_max = queue_setting('RETRY_BACKOFF_MAX', 300)
+        self.queue_name = queue_setting('QUEUE', 'default')
+        self.done_retention = queue_setting('DONE_RETENTION', 3600)
+        self.purge_lock = threading.Lock()
+        self.next_purge = 0.0
+
+    def enqueue(self, task, queue_name=None, delay=0):
+        return QueuedTask.objects.create(
+            queue=queue_name or self.queue_name,
+            payload=task,
+            max_attempts=self.max_attempts,
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+
+    def dequeue(self, worker_id, batch_size=1, timeout=1, queue_name=None):
+        now = timezone.now()
+        with transaction.atomic():
+            visible = (
+                Q(status='PENDING', run_at__lte=now) |
+                Q(status='RUNNING', leased_until__lt=now)  # lease expired, worker presumably died
+            )
+            batch = list(
+                QueuedTask.objects.select_for_update(skip_locked=True)
+                .filter(visible, queue=queue_name or self.queue_name)
+                .order_by('run_at', 'id')[:batch_size]
+            )
+            leased = []
+            for job in batch:
+                if job.attempts >= job.max_attempts:
+                    job.status = 'DEAD'
+                    job.last_error = job.last_error or 'Lease expired too many times.'
+                else:
+                    job.status = 'RUNNING'
+                    job.attempts += 1
+                    job.leased_until = now + timedelta(seconds=self.visibility_timeout)
+                    job.locked_by = worker_id
+                    leased.append(job)
+            QueuedTask.objects.bulk_update(batch, ['status', 'attempts', 'leased_until', 'locked_by', 'last_error'])
+
+        if not leased:
+            shutdown_event.wait(timeout)  # poll interval
+        # A delayed/retried task starts waiting when it becomes visible, not when it was created
+        return [(job.pk, job.payload, job.run_at.timestamp()) for job in leased]
+
+    def renew(self, handles, worker_id):
+        """Extend `worker_id`'s leases on the running `handles` by VISIBILITY_TIMEOUT; the number still held."""
+        return QueuedTask.objects.filter(pk__in=handles, locked_by=worker_id, status='RUNNING').update(
+            leased_until=timezone.now() + timedelta(seconds=self.visibility_timeout)
+        )
+
+    def ack(self, handle, worker_id):
+        # Only the current lease holder may complete the task
+        QueuedTask.objects.filter(pk=handle, locked_by=worker_id, status='RUNNING').update(
+            status='DONE', completed_at=timezone.now(), leased_until=None
+        )
+        self.purge_done_if_due()
+
+    def purge_done_if_due(self):
+        if time.monotonic() < self.next_purge or not self.purge_lock.acquire(blocking=False):
+            return
+        try:
+            self.next_purge = time.monotonic() + queue_setting('PURGE_INTERVAL', 60)
+            deleted = self.purge_done(queue_setting('PURGE_BATCH', 5000))
+            if deleted:
+                logging.info(f"Deleted {deleted} finished tasks")
+        except DatabaseError:
+            logging.exception("Deleting finished tasks failed")
+        finally:
+            self.purge_lock.release()
+
+    def purge_done(self, batch_size):
+        """Delete up to `batch_size` DONE tasks older than DONE_RETENTION; the number deleted."""
+        cutoff = timezone.now() - timedelta(seconds=self.done_retention)
+        done = QueuedTask.objects.filter(status='DONE', completed_at__lt=cutoff).order_by('completed_at')
+        deleted, _ = QueuedTask.objects.filter(pk__in=done.values('pk')[:batch_size]).delete()
+        return deleted
+
+    def fail(self, handle, worker_id, error):
+        job = QueuedTask.objects.filter(pk=handle, locked_by=worker_id, status='RUNNING').first()
+        if job is None:
+            return
+        if job.attempts >= job.max_attempts:
+            job.status = 'DEAD'
+            logging.error(f"Task {job.pk} moved to dead letter after {job.attempts} attempts: {error}")
+        else:
+            delay = min(self.retry_backoff * 2 ** (job.attempts - 1), self.retry_backoff_max)
+            job.status = 'PENDING'
+            job.run_at = timezone.now() + timedelta(seconds=delay)
+        job.leased_until = None
+        job.last_error = str(error)
+        job.save(update_fields=['status', 'run_at', 'leased_until', 'last_error'])
+
+    def depth(self):
+        """{queue: {state: count}} for unfinished and dead tasks, in one grouped query."""
+        now = timezone.now()
+        state = Case(
+            When(status='PENDING', run_at__gt=now, then=Value('delayed')),
+            When(status='PENDING', then=Value('ready')),
+            When(status='RUNNING', then=Value('running')),
+            default=Value('dead'),
+            output_field=CharField(),
+        )
+        depth = {}
+        rows = (QueuedTask.objects.exclude(status='DONE').annotate(state=state)
+                .values('queue', 'state').annotate(count=Count('id')).order_by())
+        for row in rows:
+            depth.setdefault(row['queue'], {})[row['state']] = row['count']
+        return depth
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            backend_path = queue_setting('BACKEND', 'shop_app.task.MemoryQueueBackend')
+            _backend = import_string(backend_path)()
+        return _backend
+
+
+def enqueue(task, queue_name=None, delay=0):
+    """Queue `task` (any JSON-serialisable value) for the worker pool."""
+    return get_backend().enqueue(task, queue_name=queue_name, delay=delay)
+
+
+task_handlers = {}
+
+
+def task_handler(name):
+    """Register a task function (plain or `async def`) for tasks enqueued as {'name': name, ...}."""
+    def decorator(func):
+        task_handlers[name] = func
+        return func
+    return decorator
+
+
+def get_handler(task, default):
+    if isinstance(task, dict) and task.get('name') in task_handlers:
+        return task_handlers[task['name']]
+    return default
+
+
+class LeaseKeeper:
+    """
+    Renews the leases of the tasks running in this process every VISIBILITY_TIMEOUT / 3
+    seconds, so a task that runs longer than the visibility timeout is not handed to a
+    second worker while the first is still on it. Only a dead process stops renewing.
+    Backends without leases (no `renew`) are skipped.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = {}  # handle -> (backend, worker_id)
+        self.thread = None
+
+    def hold(self, backend, handle, worker_id):
+        if not hasattr(backend, 'renew'):
+            return
+        with self.lock:
+            self.running[handle] = (backend, worker_id)
+            if self.thread is None or not self.thread.is_alive():  # also after a fork
+                self.thread = threading.Thread(target=self.run, daemon=True, name='task-leases')
+                self.thread.start()
+
+    def release(self, handle):
+        with self.lock:
+            self.running.pop(handle, None)
+
+    def run(self):
+        while True:
+            time.sleep(queue_setting('VISIBILITY_TIMEOUT', 60) / 3)
+            try:
+                self.renew_all()
+            except Exception as e:
+                logging.error(f"Failed to renew task leases: {e}")
+            finally:
+                close_old_connections()
+
+    def renew_all(self):
+        with self.lock:
+            holders = {}
+            for handle, (backend, worker_id) in self.running.items():
+                holders.setdefault((backend, worker_id), []).append(handle)
+        for (backend, worker_id), handles in holders.items():
+            held = backend.renew(handles, worker_id)
+            if held < len(handles):
+                logging.warning(f"{len(handles) - held} task lease(s) of {worker_id} were lost before renewal")
+
+
+leases = LeaseKeeper()
+
+
 def process_task(task):
     # Simulate task logic (e.g., update DB, send email)
     logging.info(f"Processing task: {task}")
     time.sleep(2)
     logging.info(f"Finished task: {task}")
 
-def worker():
+async def aprocess_task(task):
+    # Same simulation for the asyncio engine: an I/O wait that does not hold a thread
+    logging.info(f"Processing task: {task}")
+    await asyncio.sleep(2)
+    logging.info(f"Finished task: {task}")
+
+def run_handler(task):
+    handler = get_handler(task, process_task)
+    if asyncio.iscoroutinefunction(handler):
+        return asyncio.run(handler(task))
+    return handler(task)
+
+def worker(queue_name=None):
+    backend = get_backend()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    batch_size = queue_setting('BATCH_SIZE', 1)
     while not shutdown_event.is_set():
+        close_old_connections()
         try:
-            task = task_queue.get(timeout=1)
-            process_task(task)
-            task_queue.task_done()
-        except queue.Empty:
+            batch = backend.dequeue(worker_id, batch_size=batch_size, timeout=queue_setting('POLL_INTERVAL', 1),
+                                    queue_name=queue_name)
+        except Exception as e:
+            logging.error(f"Failed to fetch tasks: {e}")
+            shutdown_event.wait(queue_setting('POLL_INTERVAL', 1))
             continue
+        for handle, task, enqueued_at in batch:
+            started_at = metrics.task_started(task_type(task), enqueued_at)
+            leases.hold(backend, handle, worker_id)
+            try:
+                run_handler(task)
+            except Exception as e:
+                metrics.task_finished(task_type(task), started_at, succeeded=False)
+                logging.error(f"Task failed: {task}: {e}")
+                backend.fail(handle, worker_id, e)
+            else:
+                metrics.task_finished(task_type(task), started_at, succeeded=True)
+                backend.ack(handle, worker_id)
+            finally:
+                leases.release(handle)
 
-def start_worker_pool(num_workers=2):
-    logging.info(f"Starting {num_workers} worker threads...")
+def start_worker_pool(num_workers=2, queue_name=None):
+    logging.info(f"Starting {num_workers} worker threads for queue '{queue_name or queue_setting('QUEUE', 'default')}'...")
+    metrics.add_capacity(num_workers)
     for _ in range(num_workers):
-        t = threading.Thread(target=worker)
+        t = threading.Thread(target=worker, args=(queue_name,))
         t.daemon = True
         t.start()
         workers.append(t)
 
+class AsyncWorker:
+    """
+    asyncio engine: one event loop runs up to `concurrency` tasks of a queue at once.
+
+    - `async def` handlers run on the loop, so thousands of I/O waits (email, webhooks,
+      stock feeds) share one thread; plain handlers are offloaded to a bounded thread pool.
+    - Every task is limited to `TASK_TIMEOUT` seconds and failed (retried) when it overruns.
+    - On shutdown no new tasks are leased; running ones get `SHUTDOWN_GRACE` seconds to
+      finish and are then cancelled and handed back to the backend for retry.
+    - Backend calls (dequeue/ack/fail) use one dedicated thread, keeping the ORM off the loop.
+    """
+
+    def __init__(self, queue_name, concurrency):
+        self.queue_name = queue_name
+        self.concurrency = concurrency
+        self.backend = get_backend()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:async:{queue_name}"
+        self.batch_size = queue_setting('BATCH_SIZE', 1)
+        self.poll_interval = queue_setting('POLL_INTERVAL', 1)
+        self.task_timeout = queue_setting('TASK_TIMEOUT', 300)
+        self.shutdown_grace = queue_setting('SHUTDOWN_GRACE', 5)
+        self.backend_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"queue-{queue_name}")
+        self.sync_executor = ThreadPoolExecutor(max_workers=queue_setting('ASYNC_SYNC_THREADS', 10),
+                                                thread_name_prefix=f"task-{queue_name}")
+
+    async def call_backend(self, func, *args, **kwargs):
+        def call():
+            close_old_connections()
+            return func(*args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self.backend_executor, call)
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        running = set()
+        metrics.add_capacity(self.concurrency)
+        logging.info(f"Starting asyncio worker for queue '{self.queue_name}' (concurrency {self.concurrency})...")
+
+        while not shutdown_event.is_set():
+            # Wait for one free slot (re-checking the shutdown flag), then take as many more as are free
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                continue
+            slots = 1
+            while slots < self.batch_size and not semaphore.locked():
+                await semaphore.acquire()
+                slots += 1
+
+            try:
+                batch = await self.call_backend(self.backend.dequeue, self.worker_id, batch_size=slots,
+                                                timeout=self.poll_interval, queue_name=self.queue_name)
+            except Exception as e:
+                logging.error(f"Failed to fetch tasks: {e}")
+                batch = []
+                await asyncio.sleep(self.poll_interval)
+
+            for _ in range(slots - len(batch)):
+                semaphore.release()
+            for handle, task, enqueued_at in batch:
+                job = asyncio.create_task(self.run_task(handle, task, enqueued_at, semaphore))
+                running.add(job)
+                job.add_done_callback(running.discard)
+
+        if running:
+            _, pending = await asyncio.wait(running, timeout=self.shutdown_grace)
+            for job in pending:
+                job.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        self.backend_executor.shutdown(wait=True)
+        self.sync_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run_task(self, handle, task, enqueued_at, semaphore):
+        handler = get_handler(task, aprocess_task)
+        started_at = metrics.task_started(task_type(task), enqueued_at)
+        succeeded = False
+        leases.hold(self.backend, handle, self.worker_id)
+        try:
+            if asyncio.iscoroutinefunction(handler):
+                await asyncio.wait_for(handler(task), timeout=self.task_timeout)
+            else:
+                loop = asyncio.get_running_loop()
+                await asyncio.wait_for(loop.run_in_executor(self.sync_executor, handler, task), timeout=self.task_timeout)
+        except asyncio.CancelledError:
+            logging.warning(f"Task cancelled on shutdown: {task}")
+            await asyncio.shield(self.call_backend(self.backend.fail, handle, self.worker_id, 'Cancelled on shutdown.'))
+        except asyncio.TimeoutError:
+            logging.error(f"Task timed out after {self.task_timeout}s: {task}")
+            await self.call_backend(self.backend.fail, handle, self.worker_id, 'Timed out.')
+        except Exception as e:
+            logging.error(f"Task failed: {task}: {e}")
+            await self.call_backend(self.backend.fail, handle, self.worker_id, e)
+        else:
+            succeeded = True
+            await self.call_backend(self.backend.ack, handle, self.worker_id)
+        finally:
+            leases.release(handle)
+            metrics.task_finished(task_type(task), started_at, succeeded)
+            semaphore.release()
+
+
+class GeventWorker:
+    """
+    gevent engine (`runworkers --engine gevent`; manage.py patches before Django loads): one
+    greenlet leases tasks of a queue and runs each on a greenlet from a pool of `concurrency`.
+    Plain task functions doing blocking I/O (sockets, psycopg2 through the wait callback)
+    then yield instead of holding a thread, and the database connections come from the
+    geventpool pool (MAX_CONNS), to which each task returns its connection when it ends.
+
+    Like AsyncWorker: every task is limited to `TASK_TIMEOUT` seconds, and on shutdown
+    running tasks get `SHUTDOWN_GRACE` seconds before they are killed and handed back to
+    the backend for retry.
+    """
+
+    def __init__(self, queue_name, concurrency):
+        self.queue_name = queue_name
+        self.concurrency = concurrency
+        self.backend = get_backend()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:gevent:{queue_name}"
+        self.batch_size = queue_setting('BATCH_SIZE', 1)
+        self.poll_interval = queue_setting('POLL_INTERVAL', 1)
+        self.task_timeout = queue_setting('TASK_TIMEOUT', 300)
+        self.shutdown_grace = queue_setting('SHUTDOWN_GRACE', 5)
+        self.pool = GreenletPool(concurrency)
+
+    def run(self):
+        metrics.add_capacity(self.concurrency)
+        logging.info(f"Starting gevent worker for queue '{self.queue_name}' (concurrency {self.concurrency})...")
+
+        while not shutdown_event.is_set():
+            free = self.pool.wait_available(timeout=self.poll_interval)
+            if not free:
+                continue
+            try:
+                batch = self.backend.dequeue(self.worker_id, batch_size=min(free, self.batch_size),
+                                             timeout=self.poll_interval, queue_name=self.queue_name)
+            except Exception as e:
+                logging.error(f"Failed to fetch tasks: {e}")
+                batch = []
+                shutdown_event.wait(self.poll_interval)
+            finally:
+                close_old_connections()  # back to the pool while the tasks run
+            for handle, task, enqueued_at in batch:
+                self.pool.spawn(self.run_task, handle, task, enqueued_at)
+            gevent.sleep(0)  # start them before the next lease, even if the backend never yielded
+
+        if not self.pool.join(timeout=self.shutdown_grace):
+            self.pool.kill(timeout=self.shutdown_grace)
+
+    def run_task(self, handle, task, enqueued_at):
+        started_at = metrics.task_started(task_type(task), enqueued_at)
+        succeeded = False
+        timeout = gevent.Timeout(self.task_timeout)
+        timeout.start()
+        leases.hold(self.backend, handle, self.worker_id)
+        try:
+            run_handler(task)
+        except gevent.Timeout as e:
+            if e is not timeout:
+                raise
+            logging.error(f"Task timed out after {self.task_timeout}s: {task}")
+            self.fail_interrupted(handle, 'Timed out.')
+        except gevent.GreenletExit:
+            logging.warning(f"Task cancelled on shutdown: {task}")
+            self.fail_interrupted(handle, 'Cancelled on shutdown.')
+        except Exception as e:
+            logging.error(f"Task failed: {task}: {e}")
+            self.backend.fail(handle, self.worker_id, e)
+        else:
+            succeeded = True
+            self.backend.ack(handle, self.worker_id)
+        finally:
+            timeout.close()
+            leases.release(handle)
+            metrics.task_finished(task_type(task), started_at, succeeded)
+            close_old_connections()
+
+    def fail_interrupted(self, handle, error):
+        # The task may have been stopped mid-query: give its connection back first (the pool
+        # checks a connection before handing it out again) and record the failure on a fresh one
+        try:
+            close_old_connections()
+        except DatabaseError:
+            pass  # close() has already dropped the broken connection
+        self.backend.fail(handle, self.worker_id, error)
+
+
+async def run_async_workers(queues):
+    """Run an AsyncWorker per queue (`queues` maps queue name -> concurrency) until shutdown."""
+    await asyncio.gather(*(AsyncWorker(name, concurrency).run() for name, concurrency in queues.items()))
+
+
+def run_gevent_workers(queues):
+    """Run a GeventWorker per queue (`queues` maps queue name -> concurrency) until shutdown."""
+    gevent.joinall([gevent.spawn(GeventWorker(name, concurrency).run) for name, concurrency in queues.items()])
+
+
+def on_shutdown_signals(handler, engine):
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        if engine == 'gevent':
+            gevent.signal_handler(signum, handler)  # runs in a greenlet, not on top of whatever was interrupted
+        else:
+            signal.signal(signum, handler)
+
+
+def run_workers(queues, processes=1, engine='thread'):
+    """
+    Run the worker pool in the foreground until SIGINT/SIGTERM (used by `manage.py runworkers`).
+
+    `queues` maps queue name -> worker threads (`engine='thread'`) or concurrent tasks
+    (`engine='asyncio'` or `'gevent'`). With `processes` > 1 the same pool is started in
+    that many forked child processes, and the parent only forwards signals.
+    """
+    if processes <= 1:
+        # The handler only sets the flag; logging and joining happen outside signal context
+        on_shutdown_signals(request_shutdown, engine)
+        publisher = start_publisher(f"{socket.gethostname()}:{os.getpid()}", shutdown_event)
+        if engine == 'asyncio':
+            asyncio.run(run_async_workers(queues))
+        elif engine == 'gevent':
+            run_gevent_workers(queues)
+        else:
+            for queue_name, num_workers in queues.items():
+                start_worker_pool(num_workers, queue_name)
+            while not shutdown_event.is_set():
+                shutdown_event.wait(1)
+        publisher.join(timeout=5)
+        graceful_shutdown()
+
+    # Children must open their own database connections
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    children = [context.Process(target=run_workers, args=(queues, 1, engine)) for _ in range(processes)]
+    logging.info(f"Starting {processes} worker processes...")
+    for child in children:
+        child.start()
+
+    def stop_children(*args):
+        for child in children:
+            if child.is_alive():
+                child.terminate()  # SIGTERM -> graceful_shutdown() in the child
+
+    on_shutdown_signals(stop_children, engine)
+    for child in children:
+        child.join()
+    logging.info("All worker processes exited.")
+
+def request_shutdown(*args):
+    shutdown_event.set()
+
 def graceful_shutdown(*args):
     logging.info("Graceful shutdown initiated...")
     shutdown_event.set()
@@ -52,10 +641,21 @@ def graceful_shutdown(*args):
 def setup_signal_handlers():
     signal.signal(signal.SIGINT, graceful_shutdown)
     signal.signal(signal.SIGTERM, graceful_shutdown)
-    
-    
+
+
 """How It Works
-start_worker_pool() creates daemon threads for concurrent processing.
+start_worker_pool() creates daemon threads for concurrent processing. It runs only in the
+dedicated `manage.py runworkers` process (run_workers()); web processes just call enqueue().
+
+get_backend() picks the queue from TASK_QUEUE['BACKEND']: MemoryQueueBackend keeps the
+old in-process queue.Queue, DatabaseQueueBackend stores tasks in Postgres so they survive
+restarts and are shared by all worker processes.
+
+AsyncWorker (`runworkers --engine asyncio`) runs up to ASYNC_CONCURRENCY tasks per queue on one
+event loop; register `async def` task functions with @task_handler to use it.
+
+GeventWorker (`runworkers --engine gevent`) runs as many plain task functions per queue on
+greenlets; blocking I/O in them yields because the process is monkey-patched.
 
 graceful_shutdown() sets a shutdown flag and joins threads cleanly.
 
@@ -0,0 +1,239 @@
+# task_metrics.py
+import math
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import TaskWorkerStats
+
+
+def metrics_setting(name, default=None):
+    return getattr(settings, 'TASK_METRICS', {}).get(name, default)
+
+
+class RollingWindow:
+    """Samples from the last `window` seconds (at most `max_samples`), summarised as percentiles."""
+
+    def __init__(self, window, max_samples):
+        self.window = window
+        self.samples = deque(maxlen=max_samples)
+
+    def add(self, value, now):
+        self.samples.append((now, value))
+
+    def summary(self, now):
+        while self.samples and self.samples[0][0] < now - self.window:
+            self.samples.popleft()
+        values = sorted(value for _, value in self.samples)
+        if not values:
+            return {'count': 0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+        return {
+            'count': len(values),
+            'p50': percentile(values, 0.50),
+            'p95': percentile(values, 0.95),
+            'p99': percentile(values, 0.99),
+            'max': values[-1],
+        }
+
+
+class RateCounter:
+    """Events in the last `window` seconds, counted per second - not capped like RollingWindow samples."""
+
+    def __init__(self, window):
+        self.window = window
+        self.buckets = deque()  # [second, count], oldest first
+
+    def add(self, now):
+        second = int(now)
+        if self.buckets and self.buckets[-1][0] == second:
+            self.buckets[-1][1] += 1
+        else:
+            self.buckets.append([second, 1])
+
+    def count(self, now):
+        while self.buckets and self.buckets[0][0] < now - self.window:
+            self.buckets.popleft()
+        return sum(count for _, count in self.buckets)
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))]
+
+
+class DecayingAverage:
+    """
+    Exponentially weighted moving average (`alpha` per sample) that also decays towards 0
+    with time constant `tau` seconds between samples. A signal nobody feeds any more -
+    the requests it describes are being shed - does not stay high.
+    """
+
+    def __init__(self, alpha, tau):
+        self.alpha = alpha
+        self.tau = tau
+        self.value = 0.0
+        self.updated = 0.0
+
+    def add(self, value, now):
+        current = self.get(now)
+        self.value = current + self.alpha * (value - current)
+        self.updated = now
+
+    def get(self, now):
+        return self.value * math.exp(-max(0.0, now - self.updated) / self.tau)
+
+
+class TaskMetrics:
+    """
+    Per-process task metrics, updated by the worker loops in shop_app/task.py.
+
+    For every task type (the `name` of dict tasks, otherwise "default") it keeps rolling
+    wait-time (enqueue -> dequeue) and run-time windows plus success/failure counters, and
+    it tracks how many worker slots (threads or asyncio concurrency) are busy.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.window = metrics_setting('WINDOW', 300)
+        self.max_samples = metrics_setting('MAX_SAMPLES', 10000)
+        self.types = {}
+        self.capacity = 0
+        self.busy = 0
+        self.started = time.time()
+
+    def _type(self, task_type):
+        if task_type not in self.types:
+            self.types[task_type] = {
+                'wait': RollingWindow(self.window, self.max_samples),
+                'run': RollingWindow(self.window, self.max_samples),
+                'finished': RateCounter(self.window),
+                'succeeded': 0,
+                'failed': 0,
+            }
+        return self.types[task_type]
+
+    def add_capacity(self, slots):
+        with self.lock:
+            self.capacity += slots
+
+    def task_started(self, task_type, enqueued_at):
+        now = time.time()
+        with self.lock:
+            self.busy += 1
+            if enqueued_at is not None:
+                self._type(task_type)['wait'].add(max(0.0, now - enqueued_at), now)
+        return now
+
+    def task_finished(self, task_type, started_at, succeeded):
+        now = time.time()
+        with self.lock:
+            self.busy -= 1
+            stats = self._type(task_type)
+            stats['run'].add(now - started_at, now)
+            stats['finished'].add(now)
+            stats['succeeded' if succeeded else 'failed'] += 1
+
+    def snapshot(self):
+        now = time.time()
+        window = min(self.window, max(now - self.started, 1))
+        with self.lock:
+            types = {}
+            for task_type, stats in self.types.items():
+                run = stats['run'].summary(now)
+                types[task_type] = {
+                    'wait': stats['wait'].summary(now),
+                    'run': run,
+                    'succeeded': stats['succeeded'],
+                    'failed': stats['failed'],
+                    'throughput': stats['finished'].count(now) / window,  # tasks/sec over the rolling window
+                }
+            return {'capacity': self.capacity, 'busy': self.busy, 'idle': self.capacity - self.busy, 'types': types}
+
+
+metrics = TaskMetrics()
+
+
+def task_type(task):
+    if isinstance(task, dict) and task.get('name'):
+        return str(task['name'])
+    return 'default'
+
+
+def publish_snapshot(worker_id):
+    TaskWorkerStats.objects.update_or_create(
+        worker_id=worker_id, defaults={'stats': metrics.snapshot(), 'updated_at': timezone.now()}
+    )
+
+
+def start_publisher(worker_id, stop_event):
+    """Write this process's snapshot to TaskWorkerStats every PUBLISH_INTERVAL seconds until `stop_event`."""
+    interval = metrics_setting('PUBLISH_INTERVAL', 10)
+
+    def run():
+        while True:
+            stopping = stop_event.wait(interval)
+            close_old_connections()
+            try:
+                publish_snapshot(worker_id)
+            except Exception:
+                pass  # metrics must never take a worker down
+            if stopping:
+                return
+
+    thread = threading.Thread(target=run, daemon=True, name='task-metrics')
+    thread.start()
+    return thread
+
+
+def live_worker_stats():
+    """Snapshots of worker processes that published within the last 3 intervals."""
+    cutoff = timezone.now() - timedelta(seconds=3 * metrics_setting('PUBLISH_INTERVAL', 10))
+    return {row.worker_id: row.stats for row in TaskWorkerStats.objects.filter(updated_at__gte=cutoff).order_by('worker_id')}
+
+
+def _labels(**labels):
+    return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels.items()) + '}'
+
+
+def render_prometheus(depth, workers):
+    """Prometheus text exposition (format 0.0.4) for queue depth and worker snapshots."""
+    lines = [
+        '# HELP shop_task_queue_depth Tasks in the queue by state.',
+        '# TYPE shop_task_queue_depth gauge',
+    ]
+    for queue_name, states in sorted(depth.items()):
+        for state, count in sorted(states.items()):
+            lines.append(f'shop_task_queue_depth{_labels(queue=queue_name, state=state)} {count}')
+
+    lines += ['# HELP shop_task_workers Worker slots (threads or asyncio concurrency) by state.',
+              '# TYPE shop_task_workers gauge']
+    for worker_id, stats in workers.items():
+        lines.append(f'shop_task_workers{_labels(worker=worker_id, state="busy")} {stats["busy"]}')
+        lines.append(f'shop_task_workers{_labels(worker=worker_id, state="idle")} {stats["idle"]}')
+
+    for metric, key, help_text in (('shop_task_wait_seconds', 'wait', 'Time from enqueue to dequeue.'),
+                                   ('shop_task_run_seconds', 'run', 'Task run duration.')):
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} summary']
+        for worker_id, stats in workers.items():
+            for name, type_stats in sorted(stats['types'].items()):
+                summary = type_stats[key]
+                for quantile, field in (('0.5', 'p50'), ('0.95', 'p95'), ('0.99', 'p99')):
+                    lines.append(f'{metric}{_labels(worker=worker_id, task=name, quantile=quantile)} {summary[field]}')
+
+    lines += ['# HELP shop_task_total Finished tasks by result.', '# TYPE shop_task_total counter']
+    for worker_id, stats in workers.items():
+        for name, type_stats in sorted(stats['types'].items()):
+            lines.append(f'shop_task_total{_labels(worker=worker_id, task=name, result="success")} {type_stats["succeeded"]}')
+            lines.append(f'shop_task_total{_labels(worker=worker_id, task=name, result="failure")} {type_stats["failed"]}')
+
+    lines += ['# HELP shop_task_throughput Finished tasks per second over the rolling window.',
+              '# TYPE shop_task_throughput gauge']
+    for worker_id, stats in workers.items():
+        for name, type_stats in sorted(stats['types'].items()):
+            lines.append(f'shop_task_throughput{_labels(worker=worker_id, task=name)} {type_stats["throughput"]}')
+
+    return '\n'.join(lines) + '\n'
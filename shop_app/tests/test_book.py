@@ -1,9 +1,22 @@
+import io
+import json
+import os
+import tempfile
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.test import AsyncRequestFactory
 from django.urls import reverse
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
+from shop_app.async_views import AsyncBookViewSet
+from shop_app.cache import catalog_cache
 from shop_app.models import User, Book
+from shop_app.serializers import BookSerializer
 
 User = get_user_model()
 
@@ -65,6 +78,83 @@ class BookCRUDTestCase(APITestCase):
     def test_delete_book(self):
         url = reverse('book-detail', args=[self.book_id])
         response = self.client.delete(url)
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT) 
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_bulk_create_books_reports_title_author_collisions(self):
+        url = reverse('book-bulk')
+        data = [
+            {"title": "Shared Book", "author": "Author Z", "published_date": "2024-05-01", "price": 10},
+            {"title": "Godan", "author": "Premchand", "published_date": "1936-01-01", "price": 90},
+            {"title": "Godan", "author": "Premchand", "published_date": "1936-01-01", "price": 90},
+            {"title": "Bad Row", "author": "Nobody", "published_date": "not-a-date", "price": 1},
+        ]
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([r['status'] for r in response.data['results']], ['error', 'created', 'error', 'error'])
+        self.assertIn('published_date', response.data['results'][3]['errors'])
+
+    def test_search_books_by_author(self):
+        response = self.client.get(self.create_url, {'q': 'author z'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([b['id'] for b in response.data['results']], [self.book_id])
+
+
+    def test_filter_books_by_author_and_published_date(self):
+        response = self.client.get(self.create_url, {'author': 'Author Z', 'published_date__gte': '2000-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([b['id'] for b in response.data['results']], [self.book_id])
+        response = self.client.get(self.create_url, {'author': 'Author Z', 'published_date__lte': '2000-01-01'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_fast_read_path_matches_serializer_output(self):
+        response = self.client.get(reverse('book-detail', args=[self.book_id]))
+        self.assertEqual(response.content, JSONRenderer().render(BookSerializer(Book.objects.get(pk=self.book_id)).data))
+        self.assertEqual(response.json()['price'], '100.00')
+
+    def test_async_views_match_sync_views(self):
+        list_view = async_to_sync(AsyncBookViewSet.as_view({'get': 'list', 'post': 'create'}))
+        detail_view = async_to_sync(AsyncBookViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update'}))
+        factory, auth = AsyncRequestFactory(), {'Authorization': 'Bearer ' + self.access_token}
+        Book.objects.create(title='Second', author='Author Y', published_date='2024-05-02', price=10)
+        detail_url = reverse('book-detail', args=[self.book_id])
+
+        for url, view, kwargs in ((self.create_url + '?page_size=1', list_view, {}), (detail_url, detail_view, {'pk': str(self.book_id)})):
+            catalog_cache.invalidate('book')
+            response = view(factory.get(url, headers=auth), **kwargs)
+            catalog_cache.invalidate('book')
+            expected = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content, expected.content)
+            self.assertEqual(response['ETag'], expected['ETag'])
+            self.assertEqual(view(factory.get(url, headers={**auth, 'If-None-Match': response['ETag']}), **kwargs).status_code,
+                             status.HTTP_304_NOT_MODIFIED)
+
+        response = list_view(factory.post(self.create_url, json.dumps(self.book_data), content_type='application/json', headers=auth))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(json.loads(response.content)['title'], 'Gitanjali')
+        response = list_view(factory.post(self.create_url, json.dumps(self.book_data), content_type='application/json', headers=auth))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = detail_view(factory.patch(detail_url, json.dumps({'price': 130}), content_type='application/json', headers=auth), pk=str(self.book_id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Book.objects.get(pk=self.book_id).price, Decimal('130'))
+
+        response = detail_view(factory.get(reverse('book-detail', args=[999999]), headers=auth), pk='999999')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(json.loads(response.content)['message']['detail'], "Book with the given ID does not exist.")
+        response = list_view(factory.get(self.create_url))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
 
-        
\ No newline at end of file
+    def test_import_books_ndjson_upserts_by_title_and_author(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'books.ndjson')
+            with open(path, 'w') as f:
+                f.write('{"title": "Shared Book", "author": "Author Z", "published_date": "2024-05-01", "price": "80"}\n'
+                        '{"title": "Godan", "author": "Premchand", "published_date": "1936-01-01", "price": 90}\n'
+                        'not json\n')
+            call_command('import_books', path, stdout=io.StringIO())
+            self.assertEqual(Book.objects.get(pk=self.book_id).price, Decimal('80.00'))
+            self.assertTrue(Book.objects.filter(title='Godan', author='Premchand').exists())
+            with open(path + '.rejected.ndjson') as f:
+                self.assertEqual(json.loads(f.read())['data'], 'not json')
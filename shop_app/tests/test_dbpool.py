@@ -0,0 +1,85 @@
+import gevent
+from django.db import OperationalError
+from django.test import SimpleTestCase
+from rest_framework import status
+from shop_app.dbpool.base import InstrumentedConnectionPool, PoolCheckoutTimeout
+from shop_app.exceptions import custom_exception_handler
+
+
+class FakeConnection:
+    closed = False
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool(InstrumentedConnectionPool):
+    connect_delay = 0
+
+    def create_connection(self):
+        if self.connect_delay:
+            gevent.sleep(self.connect_delay)  # yields, like a real connect under gevent
+        return FakeConnection()
+
+
+class InstrumentedConnectionPoolTestCase(SimpleTestCase):
+
+    def test_checkout_waits_then_times_out(self):
+        pool = FakePool(MAX_CONNS=1, CHECKOUT_TIMEOUT=0.5)
+        conn = pool.get()
+
+        gevent.spawn_later(0.05, pool.put, conn)
+        self.assertIs(pool.get(), conn)  # waited for the one in use to be returned
+
+        pool.checkout_timeout = 0.05
+        with self.assertRaises(PoolCheckoutTimeout):
+            pool.get()
+
+        stats = pool.snapshot()
+        self.assertEqual((stats['open'], stats['in_use'], stats['idle']), (1, 1, 0))
+        self.assertEqual((stats['checkouts'], stats['waited'], stats['timeouts'], stats['connects']), (2, 1, 1, 1))
+        self.assertEqual(stats['wait']['count'], 1)
+
+    def test_connections_being_opened_count_towards_max(self):
+        pool = FakePool(MAX_CONNS=2, CHECKOUT_TIMEOUT=0.05)
+        pool.connect_delay = 0.01
+
+        def checkout():
+            try:
+                return pool.get()
+            except PoolCheckoutTimeout as e:
+                return e
+
+        results = [g.value for g in gevent.joinall([gevent.spawn(checkout) for _ in range(4)])]
+        self.assertEqual(sum(isinstance(result, PoolCheckoutTimeout) for result in results), 2)
+        self.assertEqual(pool.snapshot()['open'], 2)
+
+    def test_returned_connection_goes_to_the_oldest_waiter(self):
+        pool = FakePool(MAX_CONNS=1, CHECKOUT_TIMEOUT=0.5)
+        conn = pool.get()
+        waiter = gevent.spawn(pool.get)
+        gevent.sleep(0)  # the waiter queues
+
+        pool.put(conn)
+        pool.checkout_timeout = 0.05
+        with self.assertRaises(PoolCheckoutTimeout):
+            pool.get()  # arrived later: may not take it before the waiter runs
+        self.assertIs(waiter.get(timeout=1), conn)
+
+    def test_checkout_timeout_is_a_503(self):
+        try:
+            try:
+                raise PoolCheckoutTimeout("No database connection free within 5s (20 in use)")
+            except PoolCheckoutTimeout as e:
+                raise OperationalError(str(e)) from e  # as Django's wrap_database_errors does
+        except OperationalError as exc:
+            response = custom_exception_handler(exc, {'view': None})
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
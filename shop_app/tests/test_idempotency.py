@@ -0,0 +1,100 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.db import connections
+from django.db.utils import load_backend
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from shop_app.idempotency import lock_key, purger
+from shop_app.models import IdempotencyKey, Product, User
+
+
+class IdempotencyKeyTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='idem_admin', password='Admin@123', email='idem@example.com', role='admin')
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.admin).access_token}')
+        self.data = {"name": "Kettle", "description": "Steel", "stock": 4, "price": 25, "sku": 'IDEM-1'}
+
+    def create(self, key, data=None):
+        return self.client.post(reverse('product-list'), data or self.data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def remove_other(self):
+        connections['other'].close()
+        del connections['other']
+
+    def test_retry_replays_the_first_response(self):
+        first = self.create('order-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        with CaptureQueriesContext(connections['default']) as queries:
+            retry = self.create('order-1')
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertFalse([q for q in queries if 'shop_app_product' in q['sql']])  # no validation, no insert
+        self.assertEqual(Product.objects.filter(sku='IDEM-1').count(), 1)
+
+        # Without a key the retry is a new create, and fails on the SKU as before
+        self.assertEqual(self.client.post(reverse('product-list'), self.data, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_key_reused_for_another_body_is_rejected(self):
+        self.create('order-2')
+        response = self.create('order-2', {**self.data, 'sku': 'IDEM-2'})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertFalse(Product.objects.filter(sku='IDEM-2').exists())
+
+    def test_request_hash_is_keyed(self):
+        data = {'username': 'idem_user', 'password': 'Pass@123', 'email': 'idem_user@example.com', 'role': 'user'}
+        url = reverse('user-list')
+        self.assertEqual(self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='user-1').status_code, status.HTTP_201_CREATED)
+
+        body = json.dumps(data, sort_keys=True)
+        plain = hashlib.sha256(f'POST {url}\n{body}'.encode()).hexdigest()
+        stored = IdempotencyKey.objects.get(key='user-1')
+        self.assertNotEqual(stored.request_hash, plain)
+        self.assertNotIn('Pass@123', json.dumps(stored.response))
+
+        retry = self.client.post(url, {**data, 'password': 'Other@123'}, format='json', HTTP_IDEMPOTENCY_KEY='user-1')
+        self.assertEqual(retry.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_failed_create_is_not_stored(self):
+        self.assertEqual(self.create('order-3', {**self.data, 'price': 'free'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.create('order-3').status_code, status.HTTP_201_CREATED)
+
+    @override_settings(IDEMPOTENCY={'LOCK_TIMEOUT': 0.1})
+    def test_duplicate_in_flight_gets_a_409(self):
+        # Another connection holds the key's lock, as the first request would while creating
+        settings_dict = {**connections['default'].settings_dict, 'ENGINE': 'django.db.backends.postgresql', 'OPTIONS': {}}
+        connections['other'] = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, 'other')
+        self.addCleanup(self.remove_other)
+        with connections['other'].cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", [lock_key(f'user:{self.admin.pk}', 'order-4')])
+
+        response = self.create('order-4')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(Product.objects.filter(sku='IDEM-1').exists())
+
+    def test_expired_keys_are_not_replayed_and_get_purged(self):
+        self.create('order-5')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        Product.objects.filter(sku='IDEM-1').delete()
+
+        response = self.create('order-5')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertTrue(Product.objects.filter(sku='IDEM-1').exists())
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(purger.purge(batch_size=10), 1)
+        self.assertFalse(IdempotencyKey.objects.exists())
@@ -0,0 +1,130 @@
+import glob
+import gzip
+import json
+import logging
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from shop_app.logs import CompressedRotatingFileHandler, JSONFormatter, LogPipeline, RequestLogState, _request
+from shop_app.models import User
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class LogPipelineTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('shop_app.tests.pipeline')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.output = ListHandler()
+        self.logger.addHandler(self.output)
+        self.pipeline = LogPipeline()
+        self.pipeline.install(self.logger)
+        self.addCleanup(self.pipeline.stop)
+        self.addCleanup(self.logger.removeHandler, self.pipeline.handler)
+
+    def log_in_request(self, route, *records):
+        state = RequestLogState('req-1', SimpleNamespace(resolver_match=SimpleNamespace(view_name=route)))
+        token = _request.set(state)
+        try:
+            for level, message in records:
+                self.logger.log(level, message)
+        finally:
+            _request.reset(token)
+
+    @override_settings(REQUEST_LOGGING={'SAMPLE_RATES': {'product-list': 0.0}})
+    def test_unsampled_requests_keep_only_failures(self):
+        self.log_in_request('product-list', (logging.INFO, "listed"), (logging.ERROR, "failed"))
+        self.log_in_request('product-detail', (logging.INFO, "fetched"))
+        self.pipeline.stop()  # drains the queue
+
+        self.assertEqual([r.getMessage() for r in self.output.records], ["failed", "fetched"])
+        self.assertEqual({r.request_id for r in self.output.records}, {'req-1'})
+        self.assertEqual(self.pipeline.snapshot()['sampled_out'], 1)
+
+    @override_settings(REQUEST_LOGGING={'RATE_LIMITS': {'product-list': 2}})
+    def test_rate_limit_applies_to_success_records(self):
+        self.log_in_request('product-list', *[(logging.INFO, f"listed {i}") for i in range(5)], (logging.WARNING, "slow"))
+        self.pipeline.stop()
+
+        self.assertEqual([r.getMessage() for r in self.output.records], ["listed 0", "listed 1", "slow"])
+        self.assertEqual(self.pipeline.snapshot()['rate_limited'], 3)
+
+    def test_json_lines_carry_request_context_and_traceback(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            state = RequestLogState('req-2', SimpleNamespace(resolver_match=SimpleNamespace(view_name='book-list')))
+            token = _request.set(state)
+            self.logger.exception("Failed %s", 'export', extra={'rows': 3})
+            _request.reset(token)
+        self.pipeline.stop()
+
+        entry = json.loads(JSONFormatter().format(self.output.records[0]))
+        self.assertEqual(entry['message'], "Failed export")
+        self.assertEqual((entry['request_id'], entry['route'], entry['rows']), ('req-2', 'book-list', 3))
+        self.assertIn("ValueError: boom", entry['exc'])
+
+
+class CompressedRotatingFileHandlerTestCase(SimpleTestCase):
+
+    def test_rotates_by_size_into_gzip_and_prunes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'app.log')
+            handler = CompressedRotatingFileHandler(path, maxBytes=200, backupCount=2)
+            handler.setFormatter(JSONFormatter())
+            for i in range(40):
+                handler.emit(logging.LogRecord('shop', logging.INFO, __file__, 1, "line %d", (i,), None))
+            handler.close()
+
+            rotated = sorted(glob.glob(f'{path}.*.gz'))
+            self.assertEqual(len(rotated), 2)
+            with gzip.open(rotated[-1], 'rt') as f:
+                self.assertTrue(all(json.loads(line)['logger'] == 'shop' for line in f))
+
+    def test_per_process_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'app.log')
+            orphan = os.path.join(directory, f'app.{2 ** 22 + 1}.log')  # above pid_max: never running
+            with open(orphan, 'w') as f:
+                f.write('{}\n')
+
+            handler = CompressedRotatingFileHandler(path, backupCount=5, per_process=True)
+            handler.setFormatter(JSONFormatter())
+            self.assertEqual(glob.glob(f'{orphan}.*.gz'), [os.path.join(directory, name) for name in os.listdir(directory)])
+
+            handler.emit(logging.LogRecord('shop', logging.INFO, __file__, 1, "parent", (), None))
+            with mock.patch('os.getpid', return_value=4242):  # a forked child
+                handler.emit(logging.LogRecord('shop', logging.INFO, __file__, 1, "child", (), None))
+            handler.close()
+
+            for pid, message in ((os.getpid(), "parent"), (4242, "child")):
+                with open(os.path.join(directory, f'app.{pid}.log')) as f:
+                    self.assertEqual([json.loads(line)['message'] for line in f], [message])
+
+
+class RequestIdTestCase(APITestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username='reader', password='Reader@123', email='reader@example.com')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    def test_request_id_is_echoed_or_generated(self):
+        response = self.client.get(reverse('book-list'), HTTP_X_REQUEST_ID='edge-42.a')
+        self.assertEqual(response['X-Request-ID'], 'edge-42.a')
+
+        response = self.client.get(reverse('book-list'), HTTP_X_REQUEST_ID='bad id\n')
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
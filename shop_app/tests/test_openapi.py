@@ -0,0 +1,68 @@
+import gzip
+import json
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from rest_framework import status
+from shop_app import openapi
+
+
+class OpenAPISchemaTestCase(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(OPENAPI_SCHEMA={'DIR': directory.name, 'VERSION': 'test', 'MAX_AGE': 60})
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        openapi.clear()
+        self.addCleanup(openapi.clear)
+
+    def test_artifact_is_served_without_regenerating(self):
+        json_path, yaml_path = openapi.write_schema()
+        self.assertEqual(json_path.name, 'openapi.test.json')
+        self.assertTrue(yaml_path.exists())
+
+        with mock.patch.object(openapi, 'generate_schema') as generate:
+            response = self.client.get('/openapi.json')
+            again = self.client.get('/openapi.json', HTTP_IF_NONE_MATCH=response['ETag'])
+        generate.assert_not_called()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('/products/', json.loads(response.content)['paths'])
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_missing_artifact_is_generated_once_and_gzipped(self):
+        with mock.patch.object(openapi, 'generate_schema', wraps=openapi.generate_schema) as generate:
+            response = self.client.get('/openapi.json', HTTP_ACCEPT_ENCODING='gzip, br')
+            self.client.get('/openapi.yaml')
+        self.assertEqual(generate.call_count, 1)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn('swagger', json.loads(gzip.decompress(response.content)))
+
+    def test_docs_pages_use_the_versioned_schema_url(self):
+        page = self.client.get('/swagger/')
+        url = openapi.schema_url()
+        self.assertEqual(page.status_code, status.HTTP_200_OK)
+        self.assertIn(url, page.content.decode())
+
+        response = self.client.get(url)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+        with mock.patch.object(openapi.OpenAPISchemaGenerator, 'get_schema') as get_schema:
+            redoc = self.client.get('/redoc/', HTTP_AUTHORIZATION='Bearer bogus')
+            again = self.client.get('/swagger/', HTTP_IF_NONE_MATCH=page['ETag'])
+        get_schema.assert_not_called()
+        self.assertEqual(redoc.status_code, status.HTTP_200_OK)
+        self.assertIn(url, redoc.content.decode())
+        self.assertIn('Shop API', redoc.content.decode())
+        self.assertEqual(redoc['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        legacy = self.client.get('/redoc/?format=openapi')
+        self.assertEqual(legacy.status_code, status.HTTP_301_MOVED_PERMANENTLY)
+        self.assertEqual(legacy['Location'], '/openapi.json')
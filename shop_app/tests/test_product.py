@@ -1,9 +1,24 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+from base64 import b64decode
+from decimal import Decimal
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from shop_app.models import User, Product
+from shop_app.serializers import ProductSerializer
 
 User = get_user_model()
 
@@ -69,4 +84,216 @@ class ProductCRUDTestCase(APITestCase):
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT) 
 
-        
\ No newline at end of file
+    def test_list_products_cursor_pagination(self):
+        Product.objects.bulk_create(
+            Product(name=f"P{i}", description="D", stock=1, price=10 + i, sku=f"Page-SKU-{i}") for i in range(5)
+        )
+        response = self.client.get(self.create_url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+        seen = [p['id'] for p in response.data['results']]
+        next_url = response.data['next']
+        while next_url:
+            response = self.client.get(next_url)
+            seen += [p['id'] for p in response.data['results']]
+            next_url = response.data['next']
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(len(seen), Product.objects.count())
+
+    def test_cursor_pagination_over_tied_values_uses_no_offset(self):
+        Product.objects.bulk_create(
+            Product(name=f"T{i}", description="D", stock=3, price=10, sku=f"Tie-SKU-{i}") for i in range(30)
+        )
+        expected = list(Product.objects.order_by('-stock', '-id').values_list('id', flat=True))
+
+        seen, cursors = [], []
+        next_url = f"{self.create_url}?ordering=-stock&page_size=5"
+        while next_url:
+            response = self.client.get(next_url)
+            seen += [p['id'] for p in response.data['results']]
+            next_url = response.data['next']
+            if next_url:
+                cursors.append(b64decode(parse_qs(urlparse(next_url).query)['cursor'][0]).decode())
+        self.assertEqual(seen, expected)
+        self.assertFalse([c for c in cursors if 'o=' in c])
+
+        # And back again
+        previous = self.client.get(response.data['previous'])
+        pages = [expected[i:i + 5] for i in range(0, len(expected), 5)]
+        self.assertEqual([p['id'] for p in previous.data['results']], pages[-2])
+
+    def test_retrieve_product_etag_and_invalidation(self):
+        url = reverse('product-detail', args=[self.product_id])
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(url, {'stock': 7}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['stock'], 7)
+
+    def test_bulk_create_products_reports_duplicate_skus(self):
+        url = reverse('product-bulk')
+        data = [
+            {"name": "Fan", "description": "Usha", "stock": 5, "price": 50, "sku": "Bulk-SKU-1"},
+            {"name": "Fan", "description": "Usha", "stock": 5, "price": 50, "sku": "Bulk-SKU-1"},
+            {"name": "AC", "description": "LG", "stock": 1, "price": 10, "sku": "Test-SKU"},
+            {"name": "Lamp", "description": "Philips", "stock": 3, "price": 20, "sku": "Bulk-SKU-2"},
+        ]
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'error', 'error', 'created'])
+        self.assertTrue(Product.objects.filter(sku__in=['Bulk-SKU-1', 'Bulk-SKU-2']).count() == 2)
+
+    def test_bulk_update_and_delete_products(self):
+        url = reverse('product-bulk')
+        response = self.client.patch(url, [{"id": self.product_id, "stock": 9}, {"id": 0, "stock": 1}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(Product.objects.get(id=self.product_id).stock, 9)
+
+        response = self.client.delete(url, [self.product_id], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Product.objects.filter(id=self.product_id).exists())
+
+    def test_reserve_and_release_stock(self):
+        other = Product.objects.create(name="Fridge", description="Whirlpool", stock=5, price=300, sku="Stock-SKU")
+        url = reverse('product-reserve')
+        data = {"items": [{"product": self.product_id, "quantity": 2}, {"product": other.id, "quantity": 3}]}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['stock'], {self.product_id: 0, other.id: 2})
+
+        response = self.client.post(reverse('product-release'), {"items": [{"product": self.product_id, "quantity": 1}]}, format='json')
+        self.assertEqual(response.data['stock'], {self.product_id: 1})
+
+    def test_reserve_insufficient_stock_changes_nothing(self):
+        other = Product.objects.create(name="Fridge", description="Whirlpool", stock=5, price=300, sku="Stock-SKU")
+        url = reverse('product-reserve')
+        data = {"items": [{"product": other.id, "quantity": 1}, {"product": self.product_id, "quantity": 3}]}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['message']['failed'], [{'product': self.product_id, 'requested': 3, 'available': 2}])
+        self.assertEqual(Product.objects.get(id=other.id).stock, 5)
+
+    def test_list_products_server_timing(self):
+        response = self.client.get(self.create_url, {'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries".*total;dur=')
+
+        response = self.client.get(reverse('request-metrics'))
+        self.assertIn('product-list', response.data)
+        self.assertGreaterEqual(response.data['catalog_cache']['misses'], 1)
+
+    def test_search_products_ranked(self):
+        Product.objects.create(name="Washing machine", description="Front load, LG", stock=1, price=500, sku="Search-1")
+        Product.objects.create(name="Dryer", description="Pairs with any washing machine", stock=1, price=400, sku="Search-2")
+        response = self.client.get(self.create_url, {'q': 'washing machines'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['sku'] for p in response.data['results']], ['Search-1', 'Search-2'])
+
+    def test_search_pages_are_complete_and_unique(self):
+        Product.objects.bulk_create(
+            Product(name=f"Machine {i}", description="Coffee machine" if i % 3 else "Sewing", stock=1, price=10, sku=f"Search-Page-{i}")
+            for i in range(36)
+        )
+        expected = set(Product.objects.filter(name__startswith='Machine').values_list('id', flat=True))
+
+        seen, next_url = [], f"{self.create_url}?q=machine&page_size=3"
+        while next_url and len(seen) <= len(expected):
+            response = self.client.get(next_url)
+            seen += [p['id'] for p in response.data['results']]
+            next_url = response.data['next']
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(set(seen), expected)
+
+        # A broad query only ranks the newest SEARCH_MAX_CANDIDATES matches
+        with self.settings(SEARCH_MAX_CANDIDATES=5):
+            response = self.client.get(self.create_url, {'q': 'machine', 'page_size': 50})
+        self.assertEqual({p['id'] for p in response.data['results']}, set(sorted(expected)[-5:]))
+
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")  # tiny test tables would otherwise always seq scan
+            cursor.execute("EXPLAIN " + sql)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def test_filter_products_by_price_and_stock_uses_indexes(self):
+        Product.objects.create(name="Fan", description="Usha", stock=0, price=50, sku="Test-SKU-FAN")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.create_url, {'price__gte': 40, 'stock__gt': 0, 'ordering': 'price'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['id'] for p in response.data['results']], [self.product_id])
+        sql = next(q['sql'] for q in queries.captured_queries if 'FROM "shop_app_product"' in q['sql'])
+        self.assertIn('Index', self.explain(sql))
+
+        response = self.client.get(self.create_url, {'price__gte': 'cheap'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('price__gte', response.data['message'])
+
+    def test_fast_read_path_matches_serializer_output(self):
+        product = Product.objects.create(name="Café ☕", description="Ünïcode", stock=0, price='12.5', sku="Test-SKU-CAFE")
+        response = self.client.get(self.create_url)
+        expected = ProductSerializer(Product.objects.order_by('id'), many=True).data
+        self.assertEqual(response.content, JSONRenderer().render({'next': None, 'previous': None, 'results': expected}))
+
+        response = self.client.get(reverse('product-detail', args=[product.id]))
+        self.assertEqual(response.content, JSONRenderer().render(ProductSerializer(product).data))
+        response = self.client.get(reverse('product-detail', args=[product.id + 1000]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_export_products_csv_and_ndjson(self):
+        url = reverse('product-export')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, ['id,name,description,price,stock,sku', f'{self.product_id},AC,LG,100.00,2,Test-SKU'])
+
+        response = self.client.get(url, {'output': 'ndjson', 'fields': 'sku,price'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(body, b'{"sku":"Test-SKU","price":"100.00"}\n')
+
+        response = self.client.get(url, {'fields': 'password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(EXPORT_SERVER_SIDE_CURSORS=False, EXPORT_CHUNK_SIZE=1)
+    def test_export_products_keyset_batches(self):
+        Product.objects.create(name="Fan", description="Usha", stock=0, price=50, sku="Test-SKU-FAN")
+        response = self.client.get(reverse('product-export'), {'output': 'ndjson', 'fields': 'sku'})
+        self.assertEqual(b''.join(response.streaming_content), b'{"sku":"Test-SKU"}\n{"sku":"Test-SKU-FAN"}\n')
+
+    def test_import_products_upserts_by_sku_and_resumes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'feed.csv')
+            with open(path, 'w') as f:
+                f.write('sku,name,description,price,stock\n'
+                        'Test-SKU,AC,Voltas,120.50,7\n'
+                        'IMP-1,"Fridge, 2 door",Whirlpool,300,1\n'
+                        'IMP-2,,bad,abc,-1\n'
+                        'IMP-1,Fridge,Whirlpool,310,1\n')
+            call_command('import_products', path, batch_size=2, stdout=io.StringIO())
+
+            self.assertEqual(Product.objects.get(pk=self.product_id).price, Decimal('120.50'))
+            self.assertEqual(Product.objects.get(sku='IMP-1').price, Decimal('310.00'))
+            self.assertFalse(Product.objects.filter(sku='IMP-2').exists())
+            with open(path + '.rejected.ndjson') as f:
+                rejected = [json.loads(line) for line in f]
+            self.assertEqual([r['record'] for r in rejected], [3])
+            self.assertEqual(set(rejected[0]['errors']), {'name', 'price', 'stock'})
+
+            # A checkpoint makes a rerun skip the records already loaded
+            with open(path + '.checkpoint', 'w') as f:
+                json.dump({'records': 3, 'inserted': 1, 'updated': 1, 'rejected': 1}, f)
+            Product.objects.filter(sku='IMP-1').update(price=1)
+            out = io.StringIO()
+            call_command('import_products', path, stdout=out)
+            self.assertIn('Resuming after record 3', out.getvalue())
+            self.assertEqual(Product.objects.get(sku='IMP-1').price, Decimal('310.00'))
+            self.assertFalse(os.path.exists(path + '.checkpoint'))
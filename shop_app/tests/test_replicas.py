@@ -0,0 +1,130 @@
+import json
+import time
+
+from asgiref.sync import async_to_sync
+from django.db import connections
+from django.db.utils import load_backend
+from django.test import AsyncRequestFactory, SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from shop_app.async_views import AsyncProductViewSet
+from shop_app.models import Product, User
+from shop_app.replicas import ReplicaSet, replicas
+
+REPLICAS = {'ALIASES': ['replica'], 'STRATEGY': 'round_robin', 'MAX_LAG': 5, 'CHECK_INTERVAL': 60, 'STICKY_SECONDS': 5}
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class ReplicaTestCase(APITestCase):
+    """
+    The 'replica' alias is a second connection to the test database. It only sees committed
+    rows, so everything written inside the test transaction has not "replicated" to it yet.
+    """
+
+    replica_settings = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='replica_admin', password='Admin@123', email='ra@example.com', role='admin')
+        cls.reader = User.objects.create_user(username='replica_reader', password='Reader@123', email='rr@example.com')
+        cls.product = Product.objects.create(name="Fan", description="Usha", stock=3, price=50, sku='REPLICA-1')
+
+    def setUp(self):
+        # Set on this thread only and not in connections.settings, so the test case
+        # treats it as a dynamically created connection and does not wrap it in a transaction
+        settings_dict = {**connections['default'].settings_dict, 'ENGINE': 'django.db.backends.postgresql', 'OPTIONS': {}, **self.replica_settings}
+        connections['replica'] = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, 'replica')
+        self.addCleanup(self.remove_replica)
+        replicas.clear()
+
+    def remove_replica(self):
+        connections['replica'].close()
+        del connections['replica']
+        replicas.clear()
+
+    def as_user(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return self.client
+
+
+class ReplicaRoutingTestCase(ReplicaTestCase):
+
+    def test_reads_use_replica_until_own_write(self):
+        data = {"name": "TV", "description": "LG", "stock": 1, "price": 10, "sku": 'REPLICA-2'}
+        response = self.as_user(self.admin).post(reverse('product-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        url = reverse('product-detail', args=[response.data['id']])
+
+        # Another user reads from the replica, which has not caught up
+        self.assertEqual(self.as_user(self.reader).get(url).status_code, status.HTTP_404_NOT_FOUND)
+        # The writer is on the primary for STICKY_SECONDS and reads their own write
+        self.assertEqual(self.as_user(self.admin).get(url).status_code, status.HTTP_200_OK)
+        self.assertTrue(replicas.snapshot()['replicas']['replica']['healthy'])
+
+    def test_replica_reads_do_not_fill_the_catalog_cache(self):
+        url = reverse('product-list') + '?page_size=50'
+        data = {"name": "Iron", "description": "Bajaj", "stock": 1, "price": 10, "sku": 'REPLICA-4'}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.as_user(self.admin).post(reverse('product-list'), data, format='json').status_code, status.HTTP_201_CREATED)
+
+        # The lagging replica does not have it yet...
+        self.assertNotIn('REPLICA-4', [p['sku'] for p in self.as_user(self.reader).get(url).data['results']])
+        # ...and that answer is not what the writer, reading from the primary, gets from the cache
+        self.assertIn('REPLICA-4', [p['sku'] for p in self.as_user(self.admin).get(url).data['results']])
+
+    def test_async_views_route_the_same_way(self):
+        list_view = async_to_sync(AsyncProductViewSet.as_view({'post': 'create'}))
+        detail_view = async_to_sync(AsyncProductViewSet.as_view({'get': 'retrieve'}))
+        factory = AsyncRequestFactory()
+
+        def auth(user):
+            return {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+        data = {"name": "Radio", "description": "Philips", "stock": 1, "price": 10, "sku": 'REPLICA-3'}
+        response = list_view(factory.post('/api/products/', json.dumps(data), content_type='application/json', headers=auth(self.admin)))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        pk = json.loads(response.content)['id']
+
+        response = detail_view(factory.get(f'/api/products/{pk}/', headers=auth(self.reader)), pk=pk)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = detail_view(factory.get(f'/api/products/{pk}/', headers=auth(self.admin)), pk=pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class DownReplicaTestCase(ReplicaTestCase):
+    replica_settings = {'PORT': '1', 'OPTIONS': {'connect_timeout': 2}}
+
+    def test_failed_probe_keeps_reads_on_primary(self):
+        response = self.as_user(self.reader).get(reverse('product-detail', args=[self.product.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(replicas.snapshot()['replicas']['replica']['healthy'])
+
+    def test_request_retries_on_primary_when_replica_is_lost(self):
+        replicas.state = {'replica': {'healthy': True, 'lag': 0.0, 'checked_at': time.time(), 'error': ''}}
+        replicas.next_check = time.time() + 60
+
+        response = self.as_user(self.reader).get(reverse('user-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('replica_reader', str(response.data))
+        self.assertFalse(replicas.snapshot()['replicas']['replica']['healthy'])
+
+
+class ReplicaChoiceTestCase(SimpleTestCase):
+
+    def make_set(self, **lags):
+        replica_set = ReplicaSet()
+        replica_set.state = {alias: {'healthy': lag is not None, 'lag': lag, 'checked_at': 0, 'error': ''} for alias, lag in lags.items()}
+        return replica_set
+
+    @override_settings(DATABASE_REPLICAS={**REPLICAS, 'ALIASES': ['r1', 'r2', 'r3']})
+    def test_round_robin_skips_unhealthy(self):
+        replica_set = self.make_set(r1=0.0, r2=None, r3=3.0)
+        self.assertEqual([replica_set.choose() for _ in range(4)], ['r1', 'r3', 'r1', 'r3'])
+
+    @override_settings(DATABASE_REPLICAS={**REPLICAS, 'ALIASES': ['r1', 'r2', 'r3'], 'STRATEGY': 'least_lag'})
+    def test_least_lag(self):
+        replica_set = self.make_set(r1=2.0, r2=0.0, r3=0.0)
+        self.assertEqual([replica_set.choose() for _ in range(4)], ['r2', 'r3', 'r2', 'r3'])
+        self.assertIsNone(self.make_set(r1=None).choose())
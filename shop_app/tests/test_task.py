@@ -0,0 +1,225 @@
+import asyncio
+import time
+from datetime import timedelta
+import gevent.queue
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from shop_app.models import QueuedTask, User
+from shop_app.task_metrics import TaskMetrics
+from shop_app.task import AsyncWorker, DatabaseQueueBackend, GeventWorker, LeaseKeeper, MemoryQueueBackend, shutdown_event, task_handler
+
+
+class DatabaseQueueBackendTestCase(TestCase):
+
+    def setUp(self):
+        self.backend = DatabaseQueueBackend()
+        self.backend.max_attempts = 2
+
+    def test_dequeue_leases_batch_once(self):
+        for i in range(3):
+            self.backend.enqueue({'n': i})
+        batch = self.backend.dequeue('worker-1', batch_size=2, timeout=0)
+        self.assertEqual([task for _, task, _ in batch], [{'n': 0}, {'n': 1}])
+
+        batch = self.backend.dequeue('worker-2', batch_size=5, timeout=0)
+        self.assertEqual([task for _, task, _ in batch], [{'n': 2}])
+
+        self.assertEqual(self.backend.dequeue('worker-3', batch_size=5, timeout=0), [])
+
+    def test_ack_marks_done(self):
+        self.backend.enqueue('email')
+        (handle, _, _), = self.backend.dequeue('worker-1', timeout=0)
+        self.backend.ack(handle, 'worker-1')
+        self.assertEqual(QueuedTask.objects.get(pk=handle).status, 'DONE')
+
+    def test_finished_tasks_are_purged_after_retention(self):
+        for name in ('old', 'recent'):
+            self.backend.enqueue(name)
+            (handle, _, _), = self.backend.dequeue('worker-1', timeout=0)
+            self.backend.ack(handle, 'worker-1')
+        QueuedTask.objects.filter(payload='old').update(completed_at=timezone.now() - timedelta(seconds=self.backend.done_retention + 1))
+        self.backend.enqueue('pending')
+
+        self.assertEqual(self.backend.purge_done(batch_size=10), 1)
+        self.assertEqual(sorted(QueuedTask.objects.values_list('payload', flat=True)), ['pending', 'recent'])
+
+    def test_fail_retries_with_backoff_then_dead_letters(self):
+        self.backend.enqueue('webhook')
+        (handle, _, _), = self.backend.dequeue('worker-1', timeout=0)
+        self.backend.fail(handle, 'worker-1', 'timeout')
+        job = QueuedTask.objects.get(pk=handle)
+        self.assertEqual(job.status, 'PENDING')
+        self.assertGreater(job.run_at, timezone.now())
+
+        QueuedTask.objects.filter(pk=handle).update(run_at=timezone.now())
+        (handle, _, _), = self.backend.dequeue('worker-1', timeout=0)
+        self.backend.fail(handle, 'worker-1', 'timeout')
+        self.assertEqual(QueuedTask.objects.get(pk=handle).status, 'DEAD')
+
+    def test_running_task_lease_is_renewed(self):
+        self.backend.enqueue('report')
+        (handle, _, _), = self.backend.dequeue('worker-1', timeout=0)
+        QueuedTask.objects.filter(pk=handle).update(leased_until=timezone.now() + timedelta(seconds=1))
+
+        keeper = LeaseKeeper()
+        keeper.running[handle] = (self.backend, 'worker-1')  # as hold() does, without starting the renewing thread
+        keeper.renew_all()
+        self.assertGreater(QueuedTask.objects.get(pk=handle).leased_until, timezone.now() + timedelta(seconds=30))
+        self.assertEqual(self.backend.dequeue('worker-2', timeout=0), [])
+        self.assertEqual(self.backend.renew([handle], 'worker-2'), 0)  # not the lease holder
+
+    def test_expired_lease_is_redelivered(self):
+        self.backend.enqueue('feed')
+        (handle, _, _), = self.backend.dequeue('worker-1', timeout=0)
+        QueuedTask.objects.filter(pk=handle).update(leased_until=timezone.now() - timedelta(seconds=1))
+
+        (redelivered, _, _), = self.backend.dequeue('worker-2', timeout=0)
+        self.assertEqual(redelivered, handle)
+        self.backend.ack(handle, 'worker-1')  # stale lease holder cannot complete it
+        self.assertEqual(QueuedTask.objects.get(pk=handle).status, 'RUNNING')
+
+
+class AsyncWorkerTestCase(SimpleTestCase):
+
+    def tearDown(self):
+        shutdown_event.clear()
+
+    def test_runs_io_bound_tasks_concurrently(self):
+        done = []
+
+        @task_handler('test_io_wait')
+        async def io_wait(task):
+            await asyncio.sleep(0.2)
+            done.append(task['n'])
+
+        worker = AsyncWorker('default', concurrency=100)
+        worker.backend = MemoryQueueBackend()
+        worker.poll_interval = 0.05
+        for i in range(100):
+            worker.backend.enqueue({'name': 'test_io_wait', 'n': i})
+
+        async def run_until_drained():
+            runner = asyncio.create_task(worker.run())
+            while len(done) < 100:
+                await asyncio.sleep(0.01)
+            shutdown_event.set()
+            await runner
+
+        started = time.monotonic()
+        asyncio.run(run_until_drained())
+        self.assertEqual(sorted(done), list(range(100)))
+        self.assertLess(time.monotonic() - started, 2)  # 100 x 0.2s sequentially would take 20s
+
+
+class MemoryQueueBackendTestCase(SimpleTestCase):
+
+    def test_delayed_task_waits_until_due(self):
+        backend = MemoryQueueBackend()
+        backend.enqueue({'n': 1}, delay=0.2)
+        backend.enqueue({'n': 2})
+        self.assertEqual([task for _, task, _ in backend.dequeue('worker-1', batch_size=5, timeout=0)], [{'n': 2}])
+        self.assertEqual(backend.depth(), {'default': {'ready': 0, 'delayed': 1}})
+
+        started = time.monotonic()
+        (_, task, _), = backend.dequeue('worker-1', timeout=5)
+        self.assertEqual(task, {'n': 1})
+        self.assertLess(time.monotonic() - started, 1)
+
+
+class RunWorkersCommandTestCase(SimpleTestCase):
+
+    def test_queue_needs_at_least_one_worker(self):
+        for spec in ('email:0', 'email:-2', 'email:x', ':3'):
+            with self.assertRaisesMessage(CommandError, f"Invalid --queue value '{spec}'"):
+                call_command('runworkers', queue=[spec])
+
+
+class GreenMemoryQueueBackend(MemoryQueueBackend):
+    """MemoryQueueBackend as it behaves once patched: waiting for a task yields to the running ones."""
+
+    def get_queue(self, queue_name):
+        with self.lock:
+            return self.queues.setdefault(queue_name or self.queue_name, gevent.queue.JoinableQueue())
+
+
+class GeventWorkerTestCase(SimpleTestCase):
+
+    def tearDown(self):
+        shutdown_event.clear()
+
+    def test_runs_blocking_tasks_on_greenlets_with_timeouts(self):
+        done, failed = [], []
+
+        @task_handler('test_green_wait')
+        def green_wait(task):
+            gevent.sleep(task['seconds'])  # what a patched socket or time.sleep does
+            done.append(task['n'])
+
+        worker = GeventWorker('default', concurrency=50)
+        worker.backend = GreenMemoryQueueBackend()
+        worker.backend.fail = lambda handle, worker_id, error: failed.append(error)
+        worker.poll_interval, worker.task_timeout = 0.05, 0.5
+        for i in range(50):
+            worker.backend.enqueue({'name': 'test_green_wait', 'n': i, 'seconds': 5 if i == 0 else 0.2})
+
+        runner = gevent.spawn(worker.run)
+        started = time.monotonic()
+        while len(done) < 49 or not failed:
+            gevent.sleep(0.01)
+        shutdown_event.set()
+        runner.join()
+
+        self.assertEqual(sorted(done), list(range(1, 50)))
+        self.assertEqual(failed, ['Timed out.'])
+        self.assertLess(time.monotonic() - started, 1.5)  # 49 x 0.2s sequentially would take ~10s
+
+
+class TaskMetricsTestCase(APITestCase):
+
+    def test_rolling_percentiles_and_counters(self):
+        metrics = TaskMetrics()
+        metrics.add_capacity(2)
+        for i in range(1, 101):
+            started_at = metrics.task_started('email', enqueued_at=time.time() - i / 100)
+            metrics.task_finished('email', started_at, succeeded=i != 100)
+        stats = metrics.snapshot()
+        self.assertEqual((stats['busy'], stats['idle']), (0, 2))
+        self.assertEqual((stats['types']['email']['succeeded'], stats['types']['email']['failed']), (99, 1))
+        self.assertAlmostEqual(stats['types']['email']['wait']['p50'], 0.5, places=1)
+        self.assertAlmostEqual(stats['types']['email']['wait']['p99'], 0.99, places=1)
+
+    def test_throughput_is_not_capped_by_the_sample_limit(self):
+        with self.settings(TASK_METRICS={'WINDOW': 300, 'MAX_SAMPLES': 10}):
+            metrics = TaskMetrics()
+        metrics.started -= 100  # running for 100s
+        for _ in range(50):
+            metrics.task_finished('email', metrics.task_started('email', enqueued_at=None), succeeded=True)
+        stats = metrics.snapshot()['types']['email']
+        self.assertEqual(stats['run']['count'], 10)
+        self.assertAlmostEqual(stats['throughput'], 0.5, places=2)
+
+    def test_metrics_endpoint_serves_prometheus_text(self):
+        admin = User.objects.create_user(username='metrics_admin', password='Pass@123', email='metrics@example.com', role='admin')
+        DatabaseQueueBackend().enqueue({'name': 'email'})
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(admin).access_token))
+        response = self.client.get(reverse('task-metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('shop_task_queue_depth{queue="default",state="ready"} 1', response.content.decode())
+
+    def test_metrics_endpoints_need_an_admin_or_an_allowed_address(self):
+        user = User.objects.create_user(username='metrics_user', password='Pass@123', email='mu@example.com', role='user')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(user).access_token))
+        for name in ('task-metrics', 'request-metrics'):
+            self.assertEqual(self.client.get(reverse(name)).status_code, status.HTTP_403_FORBIDDEN)
+            self.assertEqual(self.client.get(reverse(name), REMOTE_ADDR='10.0.0.7').status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.credentials()
+        with self.settings(METRICS_ALLOWED_IPS=['10.0.0.7']):
+            self.assertEqual(self.client.get(reverse('task-metrics'), REMOTE_ADDR='10.0.0.7').status_code, status.HTTP_200_OK)
+            self.assertEqual(self.client.get(reverse('task-metrics')).status_code, status.HTTP_401_UNAUTHORIZED)
+
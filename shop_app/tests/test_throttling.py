@@ -0,0 +1,91 @@
+import time
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from shop_app.models import User
+from shop_app.throttling import MemoryBucketStore, load, memory_buckets
+
+LIMITS = {'ENABLED': True, 'STORE': 'memory', 'DEFAULT': {}, 'ROUTES': {'product-list': {'user': (1, 2)}}}
+
+
+class BucketTestCase(SimpleTestCase):
+
+    def test_bucket_refills_at_the_rate(self):
+        store = MemoryBucketStore()
+        self.assertTrue(store.take('k', rate=2, burst=2, now=100).allowed)
+        self.assertTrue(store.take('k', rate=2, burst=2, now=100).allowed)
+
+        empty = store.take('k', rate=2, burst=2, now=100)
+        self.assertFalse(empty.allowed)
+        self.assertEqual(empty.wait, 0.5)
+        self.assertTrue(store.take('k', rate=2, burst=2, now=100.5).allowed)
+
+
+class ThrottlingTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='limit_admin', password='Admin@123', email='la@example.com', role='admin')
+        cls.user = User.objects.create_user(username='limit_user', password='User@123', email='lu@example.com', role='user')
+
+    def setUp(self):
+        for state in (memory_buckets, load):
+            state.clear()
+            self.addCleanup(state.clear)
+
+    def get(self, user, **headers):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return self.client.get(reverse('product-list'), **headers)
+
+    @override_settings(RATE_LIMITS=LIMITS)
+    def test_client_over_its_budget_gets_a_429(self):
+        first = self.get(self.user)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first['RateLimit-Limit'], '2')
+        self.assertEqual(first['RateLimit-Remaining'], '1')
+
+        self.get(self.user)
+        limited = self.get(self.user)
+        self.assertEqual(limited.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(limited['Retry-After'], '1')
+        self.assertEqual(limited['RateLimit-Remaining'], '0')
+
+        # Admins have no budget
+        admin = self.get(self.admin)
+        self.assertEqual(admin.status_code, status.HTTP_200_OK)
+        self.assertFalse(admin.has_header('RateLimit-Limit'))
+        self.assertEqual(load.snapshot()['throttled'], 1)
+
+    @override_settings(RATE_LIMITS={**LIMITS, 'ROUTES': {'token_refresh': {'anonymous': (0.1, 2)}}})
+    def test_anonymous_clients_cannot_pick_their_address(self):
+        def refresh(forwarded_for):
+            return self.client.post(reverse('token_refresh'), {'refresh': 'x'}, format='json', HTTP_X_FORWARDED_FOR=forwarded_for)
+
+        self.assertEqual([refresh(f'203.0.113.{i}').status_code for i in range(3)][-1], status.HTTP_429_TOO_MANY_REQUESTS)
+
+        # Behind one trusted proxy, the address it appends is the client's
+        memory_buckets.clear()
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            self.assertEqual([refresh(f'spoofed, 203.0.113.{i}').status_code for i in range(3)], [status.HTTP_401_UNAUTHORIZED] * 3)
+
+    @override_settings(LOAD_SHEDDING={'ENABLED': True, 'ROLES': ('user',), 'LATENCY': 0.5, 'RETRY_AFTER': 3})
+    def test_slow_responses_shed_user_traffic_only(self):
+        for _ in range(30):
+            load.observe(10)
+
+        shed = self.get(self.user)
+        self.assertEqual(shed.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(shed['Retry-After'], '3')
+        self.assertEqual(self.get(self.admin).status_code, status.HTTP_200_OK)
+        self.assertEqual(load.snapshot()['shed_latency'], 1)
+
+    @override_settings(LOAD_SHEDDING={'ENABLED': True, 'ROLES': ('user',), 'QUEUE_TIME': 1.0})
+    def test_request_queued_too_long_is_shed(self):
+        queued = f't={int((time.time() - 5) * 1000)}'
+        self.assertEqual(self.get(self.user, HTTP_X_REQUEST_START=queued).status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        fresh = f't={time.time():.3f}'
+        self.assertEqual(self.get(self.user, HTTP_X_REQUEST_START=fresh).status_code, status.HTTP_200_OK)
@@ -1,9 +1,19 @@
+import json
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from rest_framework.authtoken.models import Token
-from shop_app.models import User
+from rest_framework_simplejwt.tokens import AccessToken
+from shop_app.async_views import AsyncUserViewSet
+from shop_app.auth import revocations
+from shop_app.hashing import PasswordHashPool, hash_pool
+from shop_app.models import User, Book
 
 User = get_user_model()
 
@@ -60,4 +70,111 @@ class UserCRUDTestCase(APITestCase):
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT) 
 
-        
\ No newline at end of file
+        
+    def test_token_claims_authenticate_without_user_query(self):
+        book = Book.objects.create(title="Godan", author="Premchand", published_date="1936-01-01", price=90)
+        url = reverse('book-detail', args=[book.id])
+        self.client.get(url)  # warms the token and catalog caches
+        revocations.sync(force=True)  # so no periodic sync falls due inside the block
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_role_change_revokes_access_tokens(self):
+        other = User.objects.create_user(username='role_change', password='Pass@123', email='role_change@example.com')
+        tokens = self.client.post(reverse('token_obtain_pair'), {'username': 'role_change', 'password': 'Pass@123'}, format='json').data
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse('user-detail', args=[other.id]), {'role': 'staff'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + tokens['access'])
+        self.assertEqual(self.client.get(self.create_url).status_code, status.HTTP_401_UNAUTHORIZED)
+        revocations.clear()  # as in another process: rebuilt from the AuthRevocation feed
+        self.assertEqual(self.client.get(self.create_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # The old refresh token is revoked too; signing in again gets the new role
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        tokens = self.client.post(reverse('token_obtain_pair'), {'username': 'role_change', 'password': 'Pass@123'}, format='json').data
+        access = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json').data['access']
+        self.assertEqual(AccessToken(access)['role'], 'staff')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + access)
+        self.assertEqual(self.client.get(self.create_url).status_code, status.HTTP_200_OK)
+
+    def test_password_change_revokes_refresh_tokens(self):
+        other = User.objects.create_user(username='pw_change', password='Pass@123', email='pw_change@example.com')
+        tokens = self.client.post(reverse('token_obtain_pair'), {'username': 'pw_change', 'password': 'Pass@123'}, format='json').data
+        self.assertEqual(self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json').status_code, status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse('user-detail', args=[other.id]), {'password': 'Changed@456'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_async_signup_and_role_change(self):
+        list_view = async_to_sync(AsyncUserViewSet.as_view({'get': 'list', 'post': 'create'}))
+        detail_view = async_to_sync(AsyncUserViewSet.as_view({'get': 'retrieve', 'patch': 'partial_update'}))
+        factory = AsyncRequestFactory()
+
+        response = list_view(factory.post(self.create_url, self.user_data, content_type='application/json'))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user_id = json.loads(response.content)['id']
+        tokens = self.client.post(reverse('token_obtain_pair'), {'username': 'test_user_unique', 'password': 'Pass@123'}, format='json').data
+        user_auth = {'Authorization': 'Bearer ' + tokens['access']}
+        self.assertEqual(list_view(factory.get(self.create_url, headers=user_auth)).status_code, status.HTTP_200_OK)
+        response = detail_view(factory.patch(reverse('user-detail', args=[user_id]), {'role': 'admin'}, content_type='application/json', headers=user_auth), pk=str(user_id))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = self.client.post(reverse('token_obtain_pair'), {'username': 'test_admin_unique_2', 'password': 'Pass@123'}, format='json').data
+        with self.captureOnCommitCallbacks(execute=True):
+            response = detail_view(factory.patch(reverse('user-detail', args=[user_id]), {'role': 'staff'}, content_type='application/json',
+                                                 headers={'Authorization': 'Bearer ' + admin['access']}), pk=str(user_id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['role'], 'staff')
+        self.assertEqual(list_view(factory.get(self.create_url, headers=user_auth)).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        tokens = self.client.post(reverse('token_obtain_pair'), {'username': 'test_admin_unique_2', 'password': 'Pass@123'}, format='json').data
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + tokens['access'])
+        self.assertEqual(self.client.post(reverse('logout-list'), {}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('logout-list'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.client.get(self.create_url).status_code, status.HTTP_401_UNAUTHORIZED)
+        revocations.clear()  # as in another process: rebuilt from the AuthRevocation feed
+        self.assertEqual(self.client.get(self.create_url).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_hashing_pool_sheds_load_when_saturated(self):
+        completed = hash_pool.snapshot()['completed']
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'test_admin_unique_2', 'password': 'Pass@123'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(hash_pool.snapshot()['completed'], completed + 1)
+
+        busy = PasswordHashPool(executor='thread', workers=1, queue_size=0, acquire_timeout=0)
+        busy.slots.acquire()  # the only slot is taken
+        with mock.patch('shop_app.hashing.hash_pool', busy):
+            response = self.client.post(reverse('token_obtain_pair'), {'username': 'test_admin_unique_2', 'password': 'Pass@123'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(response['Retry-After'], '1')
+            response = self.client.post(self.create_url, {**self.user_data, 'username': 'busy_user'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(busy.snapshot()['rejected'], 2)
+        self.assertFalse(User.objects.filter(username='busy_user').exists())
+
+    def test_broken_hashing_pool_is_shut_down_and_replaced(self):
+        pool = PasswordHashPool(executor='thread', workers=1)
+        broken = mock.Mock()
+        broken.submit.return_value.result.side_effect = BrokenProcessPool()
+        pool.executor = broken
+
+        self.assertEqual(pool.call(len, 'abc'), 3)
+        broken.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
+        replacement = pool.executor
+        pool._reset(broken)  # another caller that saw the same broken pool leaves the new one alone
+        self.assertIs(pool.executor, replacement)
+        replacement.shutdown()
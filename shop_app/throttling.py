@@ -0,0 +1,258 @@
+"""
+Rate limits and load shedding, as DRF throttles (REST_FRAMEWORK['DEFAULT_THROTTLE_CLASSES']),
+so they run after authentication on every API view, the token endpoints and the async
+viewsets included.
+
+`RoleRateThrottle`: a token bucket per client - the user, or the IP address when
+anonymous (REMOTE_ADDR, or X-Forwarded-For as far as REST_FRAMEWORK['NUM_PROXIES'] trusted
+proxies vouch for it) - and route (URL name). Its rate and burst come from RATE_LIMITS['ROUTES'] for
+the client's role, else RATE_LIMITS['DEFAULT']. The buckets live in this process (a dict
+behind one lock, least recently used dropped past MAX_CLIENTS) or, with STORE = 'cache',
+in a shared Django cache. An empty bucket is a 429 with `Retry-After`; every limited
+response reports `RateLimit-Limit`, `RateLimit-Remaining` and `RateLimit-Reset`.
+
+`LoadSheddingThrottle`: while the process is overloaded, requests of the roles in
+LOAD_SHEDDING['ROLES'] get a 503 with `Retry-After` before they touch the database, so
+admin and staff traffic keeps going. Overloaded means any of:
+
+- this request waited in front of Django longer than QUEUE_TIME (`X-Request-Start`,
+  set by the proxy),
+- the recent average response time is above LATENCY,
+- the recent average database pool checkout wait is above POOL_WAIT.
+
+`LoadMonitorMiddleware` measures the response times and writes the RateLimit headers.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from .dbpool.base import recent_pool_wait
+from .task_metrics import DecayingAverage
+
+logger = logging.getLogger(__name__)
+
+Bucket = namedtuple('Bucket', 'allowed remaining wait reset')
+
+
+def rate_setting(name, default=None):
+    return getattr(settings, 'RATE_LIMITS', {}).get(name, default)
+
+
+def shedding_setting(name, default=None):
+    return getattr(settings, 'LOAD_SHEDDING', {}).get(name, default)
+
+
+def client_role(request):
+    if not request.user or not request.user.is_authenticated:
+        return 'anonymous'
+    return getattr(request.user, 'role', None) or 'user'
+
+
+def refill(tokens, updated, now, rate, burst):
+    """Take one token from a bucket last left at `tokens` at `updated`: (Bucket, tokens left)."""
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    wait = 0.0 if allowed else (1 - tokens) / rate
+    return Bucket(allowed, int(tokens), wait, (burst - tokens) / rate), tokens
+
+
+class MemoryBucketStore:
+    """Buckets of this process: no I/O, limits apply per process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()
+
+    def take(self, key, rate, burst, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (burst, now))
+            bucket, tokens = refill(tokens, updated, now, rate, burst)
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > rate_setting('MAX_CLIENTS', 100000):
+                self.buckets.popitem(last=False)
+        return bucket
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class CacheBucketStore:
+    """
+    Buckets in RATE_LIMITS['CACHE_ALIAS'], shared by every process using that cache. A
+    read and a write per request, not atomic: concurrent requests of one client can both
+    take the last token, so the limits are approximate.
+    """
+
+    def take(self, key, rate, burst, now=None):
+        now = time.time() if now is None else now
+        cache = caches[rate_setting('CACHE_ALIAS', 'default')]
+        key = f'ratelimit:{key}'
+        tokens, updated = cache.get(key) or (burst, now)
+        bucket, tokens = refill(tokens, updated, now, rate, burst)
+        cache.set(key, (tokens, now), timeout=int(burst / rate) + 1)  # full again by then, as if missing
+        return bucket
+
+    def clear(self):
+        pass
+
+
+memory_buckets = MemoryBucketStore()
+cache_buckets = CacheBucketStore()
+
+
+def bucket_store():
+    return cache_buckets if rate_setting('STORE', 'memory') == 'cache' else memory_buckets
+
+
+def budget(route, role):
+    """(requests per second, burst) for `role` on `route`, or None when unlimited."""
+    routes = rate_setting('ROUTES', {})
+    if route in routes and role in routes[route]:
+        return routes[route][role]
+    return rate_setting('DEFAULT', {}).get(role)
+
+
+class RoleRateThrottle(BaseThrottle):
+
+    def allow_request(self, request, view):
+        if not rate_setting('ENABLED', True):
+            return True
+        match = request.resolver_match
+        route = match.view_name if match else view.__class__.__name__
+        limit = budget(route, client_role(request))
+        if limit is None:
+            return True
+
+        rate, burst = limit
+        client = f'user:{request.user.pk}' if request.user.is_authenticated else f'ip:{self.get_ident(request)}'
+        bucket = bucket_store().take(f'{route}:{client}', rate, burst)
+        request._request.rate_limit = (burst, bucket)
+        self.wait_seconds = bucket.wait
+        if not bucket.allowed:
+            load.count('throttled')
+        return bucket.allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoadMonitor:
+    """Recent response times and shed/throttled counters of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = DecayingAverage(shedding_setting('SMOOTHING', 0.1), shedding_setting('DECAY', 5))
+        self.counters = {'throttled': 0, 'shed_queue_time': 0, 'shed_latency': 0, 'shed_pool_wait': 0}
+
+    def observe(self, seconds):
+        with self.lock:
+            self.latency.add(seconds, time.monotonic())
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def overload(self, request):
+        """Why `request` should be shed ('queue_time', 'latency', 'pool_wait'), or None."""
+        queue_time = getattr(request, 'queue_time', None)
+        if queue_time is not None and queue_time > shedding_setting('QUEUE_TIME', 1.0):
+            return 'queue_time'
+        with self.lock:
+            latency = self.latency.get(time.monotonic())
+        if latency > shedding_setting('LATENCY', 2.0):
+            return 'latency'
+        if recent_pool_wait() > shedding_setting('POOL_WAIT', 0.5):
+            return 'pool_wait'
+        return None
+
+    def snapshot(self):
+        with self.lock:
+            return {'recent_latency': self.latency.get(time.monotonic()), 'recent_pool_wait': recent_pool_wait(), **self.counters}
+
+    def clear(self):
+        with self.lock:
+            self.latency = DecayingAverage(shedding_setting('SMOOTHING', 0.1), shedding_setting('DECAY', 5))
+            self.counters = dict.fromkeys(self.counters, 0)
+
+
+load = LoadMonitor()
+
+
+class LoadSheddingThrottle(BaseThrottle):
+
+    def allow_request(self, request, view):
+        if not shedding_setting('ENABLED', True) or client_role(request) not in shedding_setting('ROLES', ()):
+            return True
+        reason = load.overload(request)
+        if reason is None:
+            return True
+        load.count(f'shed_{reason}')
+        request._request.load_shed = True
+        logger.warning("Shedding %s %s (%s)", request.method, request.path, reason)
+        # Imported here: rest_framework.views loads this module for DEFAULT_THROTTLE_CLASSES while shop_app.exceptions imports it
+        from .exceptions import ServiceOverloaded
+
+        raise ServiceOverloaded(wait=shedding_setting('RETRY_AFTER', 2))
+
+
+def queue_time(request, now):
+    """Seconds since the proxy received `request` (`X-Request-Start: t=<epoch>` in s, ms or us), or None."""
+    header = request.headers.get('X-Request-Start', '')
+    try:
+        started = float(header.removeprefix('t='))
+    except ValueError:
+        return None
+    while started > 1e11:  # milliseconds or microseconds
+        started /= 1000
+    return max(0.0, now - started)
+
+
+class LoadMonitorMiddleware:
+    """
+    Feeds `load` with response times (not those of shed requests, which say nothing
+    about the load) and the request's queue time, and adds the RateLimit headers set
+    by RoleRateThrottle. Runs natively under ASGI too.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.monotonic()
+        request.queue_time = queue_time(request, time.time())
+        return self.finish(request, self.get_response(request), started)
+
+    async def __acall__(self, request):
+        started = time.monotonic()
+        request.queue_time = queue_time(request, time.time())
+        return self.finish(request, await self.get_response(request), started)
+
+    def finish(self, request, response, started):
+        if not getattr(request, 'load_shed', False):
+            load.observe(time.monotonic() - started)
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit is not None:
+            burst, bucket = rate_limit
+            response['RateLimit-Limit'] = str(burst)
+            response['RateLimit-Remaining'] = str(bucket.remaining)
+            response['RateLimit-Reset'] = str(math.ceil(bucket.reset))
+        return response
@@ -1,6 +1,7 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import BookViewSet, ProductViewSet, UserViewSet, LogoutView
+from .views import BookViewSet, ProductViewSet, UserViewSet, LogoutView, TaskMetricsView, RequestMetricsView
 
 router = DefaultRouter()
 router.register(r'books', BookViewSet)
@@ -11,4 +12,10 @@ router.register(r'logout', LogoutView,basename='logout')
 
 urlpatterns = [
     path('', include(router.urls)),
-]
\ No newline at end of file
+    path('metrics/tasks/', TaskMetricsView.as_view(), name='task-metrics'),
+    path('metrics/requests/', RequestMetricsView.as_view(), name='request-metrics'),
+]
+if getattr(settings, 'ASYNC_VIEWS', False):
+    # Native async list/retrieve/create/update for ASGI deployments, ahead of the router
+    from .async_views import urlpatterns as async_urlpatterns
+    urlpatterns = async_urlpatterns + urlpatterns
@@ -1,4 +1,5 @@
 from rest_framework import viewsets
+from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.exceptions import ValidationError, NotFound, APIException
@@ -7,26 +8,47 @@ from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from rest_framework.decorators import action
 from .models import Book, Product, User
-from .serializers import BookSerializer, ProductSerializer, UserSerializer, LogoutResponseSerializer
-from .permissions import RoleBasedAccessPermission
+from .serializers import BookSerializer, ProductSerializer, UserSerializer, LogoutSerializer, LogoutResponseSerializer, BookBulkSerializer, ProductBulkSerializer
+from .serializers import StockChangeSerializer, StockAdjustSerializer, StockResponseSerializer
+from .stock import apply_stock_deltas, merge_lines
+from .permissions import RoleBasedAccessPermission, IsMetricsClient
+from .perf import RequestTimingMixin, route_stats
+from .renderers import PrometheusTextRenderer
+from .task import get_backend
+from .task_metrics import live_worker_stats, render_prometheus
+from .auth import TOKEN_USER_FIELDS, revoke_access_token, revoke_user_tokens
+from .cache import CachedReadMixin, catalog_cache
+from .fastread import FastReadMixin
+from .search import CatalogSearchFilter
+from .filters import FieldLookupFilter
+from .bulk import BulkWriteMixin
+from .export import ExportMixin
+from .exceptions import HashingPoolSaturated
+from .hashing import hash_pool
+from .logs import log_pipeline
+from .replicas import ReplicaReadMixin, replicas
+from .idempotency import IDEMPOTENCY_PARAMETERS, IdempotentCreateMixin
+from .dbpool.base import pool_stats
+from .throttling import load
 import logging  
 
 logger = logging.getLogger(__name__)  
 
 
 # Create your views here.
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(RequestTimingMixin, ReplicaReadMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [RoleBasedAccessPermission]  # allow user signup
+    cursor_ordering_fields = ('id', 'username')  # allowed values for ?ordering= on list
     
-    @swagger_auto_schema(operation_description="🔓 POST: Open for user registration (no authentication required).")
+    @swagger_auto_schema(operation_description="🔓 POST: Open for user registration (no authentication required).", manual_parameters=IDEMPOTENCY_PARAMETERS)
     def create(self, request, *args, **kwargs):
         try:
             with transaction.atomic():
             # This ensures all DB operations in super().create() are atomic
                 response = super().create(request, *args, **kwargs)
-                logger.info("User registered successfully: %s", response.data)
+                logger.info("User registered successfully: ID %s", response.data.get('id'))
             return response
         #return super().create(request, *args, **kwargs)
         except IntegrityError as e:
@@ -38,7 +60,7 @@ class UserViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         try:
            response = super().list(request, *args, **kwargs)
-           logger.info("User list fetched successfully. Count: %d", len(response.data))
+           logger.info("User list fetched successfully. Count: %d", len(response.data['results']))
            return response
         except Exception as e:
             logger.error("Error fetching user list: %s", str(e), exc_info=True)
@@ -49,7 +71,7 @@ class UserViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         try:
            response = super().retrieve(request, *args, **kwargs)
-           logger.info("User fetched successfully.", response.data)
+           logger.info("User fetched successfully: ID %s", kwargs.get('pk'))
            return response
         except Exception as e:
             logger.error("Error fetching user: %s", str(e), exc_info=True)
@@ -61,13 +83,15 @@ class UserViewSet(viewsets.ModelViewSet):
             with transaction.atomic():
             # This ensures all DB operations in super().create() are atomic
                 response = super().update(request, *args, **kwargs)
-                logger.info("User updated successfully. Response: %s", response.data)
+                logger.info("User updated successfully: ID %s", kwargs.get('pk'))
             return response
         except IntegrityError as e:
             logger.error("Integrity error during update: %s", str(e), exc_info=True)
             if 'unique' in str(e).lower():
                 raise ValidationError("A user with this email already exists.")
             raise ValidationError("Failed to update user due to an internal error.")
+        except HashingPoolSaturated:
+            raise  # 503: retry later, not a missing user
         except Exception as e:
             logger.error("Error updating user: %s", str(e), exc_info=True)
             raise NotFound("User to update not found.")
@@ -79,18 +103,30 @@ class UserViewSet(viewsets.ModelViewSet):
             with transaction.atomic():
             # This ensures all DB operations in super().create() are atomic
                 response = super().partial_update(request, *args, **kwargs)
-                logger.info("User partially updated successfully. Response: %s", response.data)
+                logger.info("User partially updated successfully: ID %s", kwargs.get('pk'))
             return response
         except IntegrityError as e:
             logger.error("Integrity error during partial update: %s", str(e), exc_info=True)
             if 'unique' in str(e).lower():
                 raise ValidationError("A user with this email already exists.")
             raise ValidationError("Failed to partially update user due to an internal error.")
+        except HashingPoolSaturated:
+            raise  # 503: retry later, not a missing user
         except Exception as e:
             logger.error("Error partial updating user: %s", str(e), exc_info=True)
             raise NotFound("User to partial update not found.")
        # return super().partial_update(request, *args, **kwargs)
 
+    def perform_update(self, serializer):
+        before = [getattr(serializer.instance, field) for field in TOKEN_USER_FIELDS]
+        user = serializer.save()
+        if before != [getattr(user, field) for field in TOKEN_USER_FIELDS]:
+            revoke_user_tokens(user)  # outstanding access tokens carry the old role
+
+    def perform_destroy(self, instance):
+        revoke_user_tokens(instance)
+        instance.delete()
+
     @swagger_auto_schema(operation_description="🔒 DELETE: Only 'admin' users can delete user accounts.")
     def destroy(self, request, *args, **kwargs):
         try:
@@ -105,28 +141,38 @@ class UserViewSet(viewsets.ModelViewSet):
         #return super().destroy(request, *args, **kwargs)
     
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(RequestTimingMixin, ReplicaReadMixin, IdempotentCreateMixin, CachedReadMixin, FastReadMixin, BulkWriteMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [RoleBasedAccessPermission]
+    cache_namespace = 'book'
+    filter_backends = [FieldLookupFilter, CatalogSearchFilter]  # lookups narrow the search candidates
+    search_trigram_fields = ('title', 'author')  # typo-tolerant matching when pg_trgm is installed
+    query_filter_fields = {'price': ['gte', 'lte'], 'published_date': ['gte', 'lte'], 'author': ['exact']}
+    bulk_serializer_class = BookBulkSerializer
+    bulk_unique_fields = ('title', 'author')
+    bulk_conflict_message = "A book with this title and author already exists."
+    cursor_ordering_fields = ('id', 'price', 'published_date', 'title')  # allowed values for ?ordering= on list
     
-    @swagger_auto_schema(operation_description="🔓 GET: Accessible to all authenticated users.")
+    @swagger_auto_schema(operation_description="🔓 GET: Accessible to all authenticated users. `q` searches title and author.")
     def list(self, request, *args, **kwargs):
         try:
             response = super().list(request, *args, **kwargs)
-            logger.info("Book list fetched successfully. Count: %d", len(response.data))
+            logger.info("Book list fetched successfully. Count: %d", len(response.data['results']))
             return response
+        except APIException:
+            raise  # bad filter values or cursors are client errors (400/404)
         except Exception as e:
             logger.error("Error fetching book list: %s", str(e), exc_info=True)
             raise APIException("Failed to retrieve records.")
 
-    @swagger_auto_schema(operation_description="🔒 POST: Only 'admin' users can create a book.")
+    @swagger_auto_schema(operation_description="🔒 POST: Only 'admin' users can create a book.", manual_parameters=IDEMPOTENCY_PARAMETERS)
     def create(self, request, *args, **kwargs):
         try:
            with transaction.atomic():
             # This ensures all DB operations in super().create() are atomic
                 response = super().create(request, *args, **kwargs)
-                logger.info("Book registered successfully: %s", response.data)
+                logger.info("Book registered successfully: ID %s", response.data.get('id'))
            return response
         except IntegrityError as e:
             if 'unique' in str(e).lower():
@@ -138,7 +184,7 @@ class BookViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         try:
            response = super().retrieve(request, *args, **kwargs)
-           logger.info("Book fetched successfully.", response.data)
+           logger.info("Book fetched successfully: ID %s", kwargs.get('pk'))
            return response
         except Exception as e:
            logger.error("Error fetching book: %s", str(e), exc_info=True)
@@ -150,7 +196,7 @@ class BookViewSet(viewsets.ModelViewSet):
             with transaction.atomic():
                 # This ensures all DB operations in super().create() are atomic
                     response = super().update(request, *args, **kwargs)
-                    logger.info("Book updated successfully: %s", response.data)
+                    logger.info("Book updated successfully: ID %s", kwargs.get('pk'))
             return response
         except IntegrityError as e:
             logger.error("Integrity error during update: %s", str(e), exc_info=True)
@@ -169,7 +215,7 @@ class BookViewSet(viewsets.ModelViewSet):
             with transaction.atomic():
                 # This ensures all DB operations in super().create() are atomic
                     response = super().partial_update(request, *args, **kwargs)
-                    logger.info("Book partial updated successfully: %s", response.data)
+                    logger.info("Book partial updated successfully: ID %s", kwargs.get('pk'))
             return response
         except IntegrityError as e:
             logger.error("Integrity error during partial update: %s", str(e), exc_info=True)
@@ -195,28 +241,39 @@ class BookViewSet(viewsets.ModelViewSet):
         #return super().destroy(request, *args, **kwargs)
     
     
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(RequestTimingMixin, ReplicaReadMixin, IdempotentCreateMixin, CachedReadMixin, FastReadMixin, BulkWriteMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [RoleBasedAccessPermission]
+    cache_namespace = 'product'
+    filter_backends = [FieldLookupFilter, CatalogSearchFilter]  # lookups narrow the search candidates
+    search_trigram_fields = ('name',)  # typo-tolerant matching when pg_trgm is installed
+    query_filter_fields = {'price': ['gte', 'lte'], 'stock': ['gt']}
+    update_actions = ('reserve', 'release', 'adjust')  # POST actions that change existing rows
+    bulk_serializer_class = ProductBulkSerializer
+    bulk_unique_fields = ('sku',)
+    bulk_conflict_message = "A product with this SKU already exists."
+    cursor_ordering_fields = ('id', 'price', 'name', 'stock')  # allowed values for ?ordering= on list
     
-    @swagger_auto_schema(operation_description="🔓 GET: All roles can view products.")
+    @swagger_auto_schema(operation_description="🔓 GET: All roles can view products. `q` searches name and description.")
     def list(self, request, *args, **kwargs):
         try:
             response = super().list(request, *args, **kwargs)
-            logger.info("Product list fetched successfully. Count: %d", len(response.data))
+            logger.info("Product list fetched successfully. Count: %d", len(response.data['results']))
             return response
+        except APIException:
+            raise  # bad filter values or cursors are client errors (400/404)
         except Exception as e:
             logger.error("Error fetching product list: %s", str(e), exc_info=True)
             raise APIException("Failed to retrieve records.")
 
-    @swagger_auto_schema(operation_description="🔒 POST: Only admin can create a product.")
+    @swagger_auto_schema(operation_description="🔒 POST: Only admin can create a product.", manual_parameters=IDEMPOTENCY_PARAMETERS)
     def create(self, request, *args, **kwargs):
         try:
             with transaction.atomic():
                 # This ensures all DB operations in super().create() are atomic
                     response = super().create(request, *args, **kwargs)
-                    logger.info("Product registered successfully: %s", response.data)
+                    logger.info("Product registered successfully: ID %s", response.data.get('id'))
             return response
         except IntegrityError as e:
             if 'unique' in str(e).lower():
@@ -228,7 +285,7 @@ class ProductViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         try:
            response = super().retrieve(request, *args, **kwargs)
-           logger.info("Product fetched successfully.", response.data)
+           logger.info("Product fetched successfully: ID %s", kwargs.get('pk'))
            return response
         except Exception as e:
            logger.error("Error fetching product: %s", str(e), exc_info=True)
@@ -240,7 +297,7 @@ class ProductViewSet(viewsets.ModelViewSet):
             with transaction.atomic():
                 # This ensures all DB operations in super().create() are atomic
                     response = super().update(request, *args, **kwargs)
-                    logger.info("Product updated successfully: %s", response.data)
+                    logger.info("Product updated successfully: ID %s", kwargs.get('pk'))
             return response
         except IntegrityError as e:
             logger.error("Integrity error during update: %s", str(e), exc_info=True)
@@ -258,7 +315,7 @@ class ProductViewSet(viewsets.ModelViewSet):
             with transaction.atomic():
                 # This ensures all DB operations in super().create() are atomic
                     response = super().partial_update(request, *args, **kwargs)
-                    logger.info("Product partial updated successfully: %s", response.data)
+                    logger.info("Product partial updated successfully: ID %s", kwargs.get('pk'))
             return response
         except IntegrityError as e:
             logger.error("Integrity error during partial update: %s", str(e), exc_info=True)
@@ -283,18 +340,68 @@ class ProductViewSet(viewsets.ModelViewSet):
             raise NotFound("Product to delete not found.")
         #return super().destroy(request, *args, **kwargs)
 
+    @swagger_auto_schema(method='post', request_body=StockChangeSerializer, responses={200: StockResponseSerializer()},
+                         operation_description="🔒 POST: Only 'admin' and 'staff' can reserve (decrement) stock for one or more products, all or nothing.")
+    @action(detail=False, methods=['post'])
+    def reserve(self, request):
+        serializer = StockChangeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        stock = apply_stock_deltas(merge_lines(serializer.validated_data['items'], 'quantity', sign=-1))
+        return Response({'stock': stock}, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(method='post', request_body=StockChangeSerializer, responses={200: StockResponseSerializer()},
+                         operation_description="🔒 POST: Only 'admin' and 'staff' can release (increment) previously reserved stock.")
+    @action(detail=False, methods=['post'])
+    def release(self, request):
+        serializer = StockChangeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        stock = apply_stock_deltas(merge_lines(serializer.validated_data['items'], 'quantity'))
+        return Response({'stock': stock}, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(method='post', request_body=StockAdjustSerializer, responses={200: StockResponseSerializer()},
+                         operation_description="🔒 POST: Only 'admin' and 'staff' can apply signed stock deltas (e.g. stock counts, returns).")
+    @action(detail=False, methods=['post'])
+    def adjust(self, request):
+        serializer = StockAdjustSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        stock = apply_stock_deltas(merge_lines(serializer.validated_data['items'], 'delta'))
+        return Response({'stock': stock}, status=status.HTTP_200_OK)
+
 
-class LogoutView(viewsets.ViewSet):
+class LogoutView(RequestTimingMixin, viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     @swagger_auto_schema(
-        operation_description="Logout user by invalidating token",
+        operation_description="Logout user by invalidating token: the refresh token is blacklisted and the access token is revoked.",
+        request_body=LogoutSerializer,
         responses={200: LogoutResponseSerializer()}
     )
     def create(self, request):
-        _ = request 
-        # your logout logic
+        serializer = LogoutSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.validated_data['refresh'].blacklist()
+            revoke_access_token(request.auth)
+        logger.info("User %s logged out.", request.user.pk)
         return Response({"detail": "Successfully logged out."}, status=status.HTTP_200_OK)
- 
- 
 
+
+class TaskMetricsView(APIView):
+    """Prometheus scrape target for the task queue: depth, busy/idle workers, wait/run percentiles, throughput."""
+    permission_classes = [IsMetricsClient]
+    renderer_classes = [PrometheusTextRenderer]
+    swagger_schema = None
+
+    def get(self, request):
+        return Response(render_prometheus(get_backend().depth(), live_worker_stats()))
+
+
+class RequestMetricsView(RequestTimingMixin, APIView):
+    """Per-route timings of sampled requests in this process (see shop_app/perf.py)."""
+    permission_classes = [IsMetricsClient]
+
+    @swagger_auto_schema(operation_description="🔒 GET: Only 'admin' users can view per-route request timings (ms), password-hashing pool stats (s), logging pipeline counters, database pool stats (s), read-replica health, catalog cache hits/misses/invalidations and rate-limit / load-shedding counters of this process.")
+    def get(self, request):
+        return Response({**route_stats.summary(), 'password_hashing': hash_pool.snapshot(), 'logging': log_pipeline.snapshot(),
+                         'database_pool': pool_stats(), 'database_replicas': replicas.snapshot(), 'catalog_cache': catalog_cache.stats(),
+                         'load': load.snapshot()})